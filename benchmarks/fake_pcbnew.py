@@ -0,0 +1,767 @@
+"""
+In-memory stand-in for the parts of KiCad's `pcbnew` SWIG module the plugin
+uses, so the benchmarks run without a KiCad install.
+
+Items behave like the real ones where it matters for timing and
+correctness: Duplicate() deep-copies and assigns a new uuid, Move()
+translates every coordinate (zone fills included), BOARD keeps per-type
+item lists. Every call that crosses the Python/C++ boundary in real pcbnew
+is counted in CALLS.
+
+What is emulated:
+
+- geometry: VECTOR2I, BOX2I, EDA_ANGLE, and Move/Rotate/Flip on every item
+  (layers flip F <-> B);
+- items: PCB_SHAPE (segment, rect, arc, circle, poly), PCB_TEXT, PCB_TRACK,
+  PAD, FOOTPRINT (pads plus graphics such as the courtyard), ZONE,
+  PCB_GROUP, NETINFO_ITEM, each with a KIID;
+- BOARD: Tracks()/Footprints()/Drawings()/Zones(), Add/Remove, GetItem()
+  by uuid, nets by code; layer ids follow KiCad 9 (copper ids are even);
+- SaveBoard() writes a one-line stub, LoadBoard() deep-copies a board
+  registered in BOARDS.
+
+What is not, so results say nothing about it:
+
+- BOARD_COMMIT and undo: the plugin's BatchCommit talks to BOARD directly;
+- zone filling: ZONE_FILLER.Fill() only marks zones filled;
+- polygon clipping: SHAPE_POLY_SET.Inflate() and BooleanSubtract() only
+  count the call, so milled Edge.Cuts keep their input shape;
+- plotting, DRC, the layer stack (always 2 copper layers) and wx.
+"""
+import copy
+import itertools
+import math
+
+IU_PER_MM = 1000000
+
+F_Cu, B_Cu = 0, 2
+B_SilkS, F_SilkS = 5, 7
+B_Mask, F_Mask = 1, 3
+Edge_Cuts = 25
+F_Fab, B_Fab = 35, 33
+F_CrtYd, B_CrtYd = 31, 29
+Dwgs_User = 13
+
+S_SEGMENT, S_RECT, S_ARC, S_CIRCLE, S_POLY, S_BEZIER = range(6)
+DEGREES_T = "deg"
+FLIP_DIRECTION_LEFT_RIGHT, FLIP_DIRECTION_TOP_BOTTOM = range(2)
+PAD_ATTRIB_PTH, PAD_ATTRIB_SMD, PAD_ATTRIB_CONN, PAD_ATTRIB_NPTH = range(4)
+PAD_SHAPE_CIRCLE, PAD_SHAPE_RECT = range(2)
+FP_THROUGH_HOLE, FP_SMD, FP_EXCLUDE_FROM_POS_FILES, FP_EXCLUDE_FROM_BOM, FP_BOARD_ONLY = 1, 2, 4, 8, 16
+
+CALLS = {}
+
+
+def _count(name):
+    CALLS[name] = CALLS.get(name, 0) + 1
+
+
+def FromMM(mm):
+    return int(round(mm * IU_PER_MM))
+
+
+def ToMM(iu):
+    return iu / IU_PER_MM
+
+
+def IsCopperLayer(layer):
+    # KiCad 9 numbering: F_Cu, B_Cu and In*_Cu are the even ids below 64
+    return 0 <= layer < 64 and layer % 2 == 0
+
+
+def Refresh():
+    _count("Refresh")
+
+
+class ActionPlugin(object):
+    def register(self):
+        pass
+
+
+class VECTOR2I(object):
+    __slots__ = ("x", "y")
+
+    def __init__(self, x=0, y=0):
+        self.x = int(x)
+        self.y = int(y)
+
+    def __add__(self, o):
+        return VECTOR2I(self.x + o.x, self.y + o.y)
+
+    def __eq__(self, o):
+        return isinstance(o, VECTOR2I) and self.x == o.x and self.y == o.y
+
+    def __repr__(self):
+        return "VECTOR2I({}, {})".format(self.x, self.y)
+
+
+class BOX2I(object):
+    def __init__(self, pos=None, size=None):
+        pos = pos or VECTOR2I()
+        size = size or VECTOR2I()
+        self.x0, self.y0 = pos.x, pos.y
+        self.x1, self.y1 = pos.x + size.x, pos.y + size.y
+
+    def GetX(self):
+        return self.x0
+
+    def GetY(self):
+        return self.y0
+
+    def GetWidth(self):
+        return self.x1 - self.x0
+
+    def GetHeight(self):
+        return self.y1 - self.y0
+
+    def GetLeft(self):
+        return self.x0
+
+    def GetTop(self):
+        return self.y0
+
+    def GetRight(self):
+        return self.x1
+
+    def GetBottom(self):
+        return self.y1
+
+    def Merge(self, o):
+        self.x0 = min(self.x0, o.x0)
+        self.y0 = min(self.y0, o.y0)
+        self.x1 = max(self.x1, o.x1)
+        self.y1 = max(self.y1, o.y1)
+        return self
+
+    def Inflate(self, d):
+        self.x0 -= d
+        self.y0 -= d
+        self.x1 += d
+        self.y1 += d
+        return self
+
+
+# Layer each side maps to on a bottom-side flip
+_FLIPPED = {F_Cu: B_Cu, B_Cu: F_Cu, F_SilkS: B_SilkS, B_SilkS: F_SilkS,
+            F_Mask: B_Mask, B_Mask: F_Mask, F_Fab: B_Fab, B_Fab: F_Fab,
+            F_CrtYd: B_CrtYd, B_CrtYd: F_CrtYd}
+
+
+def _mapv(v, fn):
+    x, y = fn(v.x, v.y)
+    return VECTOR2I(x, y)
+
+
+def _box(x0, y0, x1, y1):
+    b = BOX2I()
+    b.x0, b.y0, b.x1, b.y1 = min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+    return b
+
+
+class EDA_ANGLE(object):
+    def __init__(self, value=0.0, unit=DEGREES_T):
+        self.value = value
+
+    def AsDegrees(self):
+        return self.value
+
+
+class KIID(object):
+    _ids = itertools.count(1)
+
+    def __init__(self, s=None):
+        self.s = s or "{:08x}".format(next(KIID._ids))
+
+    def AsString(self):
+        return self.s
+
+
+class BOARD_ITEM(object):
+    CLASS = "BOARD_ITEM"
+
+    def __init__(self, parent=None):
+        self.layer = F_Cu
+        self.net = 0
+        self.m_Uuid = KIID()
+
+    def GetClass(self):
+        return self.CLASS
+
+    def Cast(self):
+        return self
+
+    def GetLayer(self):
+        return self.layer
+
+    def SetLayer(self, layer):
+        self.layer = layer
+
+    def GetNetCode(self):
+        return self.net
+
+    def SetNetCode(self, code):
+        self.net = code
+
+    def SetNet(self, net):
+        _count("SetNet")
+        self.net = net.GetNetCode()
+
+    def Duplicate(self):
+        _count("Duplicate")
+        dup = copy.deepcopy(self)
+        dup.m_Uuid = KIID()
+        return dup
+
+    def Move(self, vec):
+        _count("Move")
+        self._move(vec.x, vec.y)
+
+    def Rotate(self, centre, angle):
+        _count("Rotate")
+        a = math.radians(angle.AsDegrees())
+        c, s = math.cos(a), math.sin(a)
+        cx, cy = centre.x, centre.y
+        self._map(lambda x, y: (int(round(cx + (x - cx) * c + (y - cy) * s)),
+                                int(round(cy - (x - cx) * s + (y - cy) * c))))
+
+    def Flip(self, centre, direction):
+        _count("Flip")
+        cx = centre.x
+        self._map(lambda x, y: (2 * cx - x, y))
+        self._flip_layer()
+
+    def _flip_layer(self):
+        self.layer = _FLIPPED.get(self.layer, self.layer)
+
+    def _move(self, dx, dy):
+        self._map(lambda x, y: (x + dx, y + dy))
+
+    def _map(self, fn):
+        pass
+
+    def GetBoundingBox(self):
+        return BOX2I()
+
+
+class PCB_SHAPE(BOARD_ITEM):
+    CLASS = "PCB_SHAPE"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.shape = S_SEGMENT
+        self.start = VECTOR2I()
+        self.end = VECTOR2I()
+        self.mid = VECTOR2I()
+        self.width = FromMM(0.1)
+        self.poly = None
+        self.layer = F_SilkS
+
+    def SetShape(self, s):
+        self.shape = s
+
+    def GetShape(self):
+        return self.shape
+
+    def SetStart(self, p):
+        self.start = VECTOR2I(p.x, p.y)
+
+    def SetEnd(self, p):
+        self.end = VECTOR2I(p.x, p.y)
+
+    def GetStart(self):
+        return VECTOR2I(self.start.x, self.start.y)
+
+    def GetEnd(self):
+        return VECTOR2I(self.end.x, self.end.y)
+
+    def SetWidth(self, w):
+        self.width = w
+
+    def GetWidth(self):
+        return self.width
+
+    def SetCenter(self, p):
+        self.start = VECTOR2I(p.x, p.y)
+
+    def GetCenter(self):
+        if self.shape == S_CIRCLE:
+            return VECTOR2I(self.start.x, self.start.y)
+        return VECTOR2I(self.center.x, self.center.y)
+
+    def SetRadius(self, r):
+        self.end = VECTOR2I(self.start.x + r, self.start.y)
+
+    def GetRadius(self):
+        if self.shape == S_CIRCLE:
+            return int(math.hypot(self.end.x - self.start.x, self.end.y - self.start.y))
+        return int(math.hypot(self.start.x - self.center.x, self.start.y - self.center.y))
+
+    def SetArcGeometry(self, start, mid, end):
+        self.start, self.mid, self.end = start, mid, end
+        ax, ay, bx, by, cx, cy = start.x, start.y, mid.x, mid.y, end.x, end.y
+        d = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+        ux = ((ax * ax + ay * ay) * (by - cy) + (bx * bx + by * by) * (cy - ay) + (cx * cx + cy * cy) * (ay - by)) / d
+        uy = ((ax * ax + ay * ay) * (cx - bx) + (bx * bx + by * by) * (ax - cx) + (cx * cx + cy * cy) * (bx - ax)) / d
+        self.center = VECTOR2I(ux, uy)
+
+    def GetArcMid(self):
+        return VECTOR2I(self.mid.x, self.mid.y)
+
+    def SetPolyShape(self, poly):
+        self.poly = poly
+
+    def SetFilled(self, filled):
+        self.filled = filled
+
+    def GetPolyShape(self):
+        return self.poly
+
+    def _map(self, fn):
+        self.start = _mapv(self.start, fn)
+        self.end = _mapv(self.end, fn)
+        self.mid = _mapv(self.mid, fn)
+        if hasattr(self, "center"):
+            self.center = _mapv(self.center, fn)
+        if self.poly is not None:
+            self.poly.Map(fn)
+
+    def GetBoundingBox(self):
+        if self.shape == S_CIRCLE:
+            r = self.GetRadius()
+            b = _box(self.start.x - r, self.start.y - r, self.start.x + r, self.start.y + r)
+        elif self.shape == S_ARC:
+            r = self.GetRadius()
+            c = self.center
+            b = _box(c.x - r, c.y - r, c.x + r, c.y + r)
+        elif self.shape == S_POLY and self.poly is not None:
+            b = self.poly.BBox()
+        else:
+            b = _box(self.start.x, self.start.y, self.end.x, self.end.y)
+        return b.Inflate(self.width // 2)
+
+
+class PCB_TEXT(BOARD_ITEM):
+    CLASS = "PCB_TEXT"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.text = ""
+        self.pos = VECTOR2I()
+
+    def SetText(self, t):
+        self.text = t
+
+    def SetVisible(self, visible):
+        self.visible = visible
+
+    def GetText(self):
+        return self.text
+
+    def SetTextSize(self, v):
+        self.size = v
+
+    def SetTextThickness(self, t):
+        self.thickness = t
+
+    def SetTextAngle(self, a):
+        self.angle = a
+
+    def SetPosition(self, p):
+        self.pos = VECTOR2I(p.x, p.y)
+
+    def GetPosition(self):
+        return self.pos
+
+    def _map(self, fn):
+        self.pos = _mapv(self.pos, fn)
+
+    def GetBoundingBox(self):
+        return _box(self.pos.x - 500000, self.pos.y - 500000, self.pos.x + 500000, self.pos.y + 500000)
+
+
+class PCB_TRACK(BOARD_ITEM):
+    CLASS = "PCB_TRACK"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.start = VECTOR2I()
+        self.end = VECTOR2I()
+        self.width = FromMM(0.25)
+
+    def SetStart(self, p):
+        self.start = VECTOR2I(p.x, p.y)
+
+    def SetEnd(self, p):
+        self.end = VECTOR2I(p.x, p.y)
+
+    def GetStart(self):
+        return self.start
+
+    def GetEnd(self):
+        return self.end
+
+    def SetWidth(self, w):
+        self.width = w
+
+    def GetWidth(self):
+        return self.width
+
+    def _map(self, fn):
+        self.start = _mapv(self.start, fn)
+        self.end = _mapv(self.end, fn)
+
+    def GetBoundingBox(self):
+        return _box(self.start.x, self.start.y, self.end.x, self.end.y).Inflate(self.width // 2)
+
+
+class PAD(BOARD_ITEM):
+    CLASS = "PAD"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.pos = VECTOR2I()
+        self.size = VECTOR2I(FromMM(1), FromMM(1))
+
+    def SetPosition(self, p):
+        self.pos = VECTOR2I(p.x, p.y)
+
+    def GetPosition(self):
+        return self.pos
+
+    def SetSize(self, s):
+        self.size = s
+
+    def SetAttribute(self, attr):
+        self.attr = attr
+
+    def SetShape(self, shape):
+        self.shape = shape
+
+    def SetDrillSize(self, s):
+        self.drill = s
+
+    def UnplatedHoleMask(self):
+        return "*.Cu *.Mask"
+
+    def SetLayerSet(self, layers):
+        self.layers = layers
+
+    def SetLocalSolderMaskMargin(self, margin):
+        self.mask_margin = margin
+
+    def _map(self, fn):
+        self.pos = _mapv(self.pos, fn)
+
+    def GetBoundingBox(self):
+        hx, hy = self.size.x // 2, self.size.y // 2
+        return _box(self.pos.x - hx, self.pos.y - hy, self.pos.x + hx, self.pos.y + hy)
+
+
+class FOOTPRINT(BOARD_ITEM):
+    CLASS = "FOOTPRINT"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.pos = VECTOR2I()
+        self.pads = []
+        self.graphics = []
+        self.reference = PCB_TEXT()
+        self.attributes = 0
+
+    def Add(self, item):
+        (self.pads if isinstance(item, PAD) else self.graphics).append(item)
+
+    def SetReference(self, ref):
+        self.reference.SetText(ref)
+
+    def Reference(self):
+        return self.reference
+
+    def SetAttributes(self, attrs):
+        self.attributes = attrs
+
+    def Pads(self):
+        return list(self.pads)
+
+    def GraphicalItems(self):
+        return list(self.graphics)
+
+    def SetPosition(self, p):
+        dx, dy = p.x - self.pos.x, p.y - self.pos.y
+        self._move(dx, dy)
+
+    def GetPosition(self):
+        return self.pos
+
+    def _map(self, fn):
+        self.pos = _mapv(self.pos, fn)
+        for p in self.pads + self.graphics:
+            p._map(fn)
+
+    def _flip_layer(self):
+        BOARD_ITEM._flip_layer(self)
+        for p in self.pads + self.graphics:
+            p._flip_layer()
+
+    def GetBoundingBox(self):
+        b = _box(self.pos.x, self.pos.y, self.pos.x, self.pos.y)
+        for p in self.pads + self.graphics:
+            b.Merge(p.GetBoundingBox())
+        return b
+
+
+class LSET(object):
+    def __init__(self):
+        self.layers = set()
+
+    def AddLayer(self, layer):
+        self.layers.add(layer)
+        return self
+
+
+class SHAPE_LINE_CHAIN(object):
+    def __init__(self):
+        self.pts = []
+
+    def PointCount(self):
+        return len(self.pts)
+
+    def CPoint(self, i):
+        return self.pts[i]
+
+    def Append(self, x, y=None):
+        if y is None:
+            self.pts.append(VECTOR2I(x.x, x.y))
+        else:
+            self.pts.append(VECTOR2I(x, y))
+
+
+class SHAPE_POLY_SET(object):
+    def __init__(self, other=None):
+        self.polys = copy.deepcopy(other.polys) if other is not None else []  # list of [outline, hole, hole...]
+
+    def NewOutline(self):
+        self.polys.append([SHAPE_LINE_CHAIN()])
+        return len(self.polys) - 1
+
+    def NewHole(self, outline=-1):
+        self.polys[outline].append(SHAPE_LINE_CHAIN())
+        return len(self.polys[outline]) - 2
+
+    def Append(self, x, y, outline=-1, hole=-1):
+        poly = self.polys[outline]
+        chain = poly[-1] if hole == -1 else poly[hole + 1]
+        chain.Append(int(x), int(y))
+
+    def AddOutline(self, chain):
+        self.polys.append([chain])
+        return len(self.polys) - 1
+
+    def OutlineCount(self):
+        return len(self.polys)
+
+    def Outline(self, i):
+        return self.polys[i][0]
+
+    def HoleCount(self, i):
+        return len(self.polys[i]) - 1
+
+    def Hole(self, i, j):
+        return self.polys[i][j + 1]
+
+    def TotalVertices(self):
+        return sum(c.PointCount() for p in self.polys for c in p)
+
+    def Move(self, v):
+        self.Map(lambda x, y: (x + v.x, y + v.y))
+
+    def Map(self, fn):
+        for p in self.polys:
+            for c in p:
+                c.pts = [_mapv(q, fn) for q in c.pts]
+
+    def Simplify(self):
+        pass
+
+    # No clipping here; only the calls are counted
+    def Inflate(self, amount, *args):
+        _count("Inflate")
+
+    def BooleanSubtract(self, other, *args):
+        _count("BooleanSubtract")
+
+    def BBox(self):
+        b = None
+        for p in self.polys:
+            for q in p[0].pts:
+                pb = _box(q.x, q.y, q.x, q.y)
+                b = pb if b is None else b.Merge(pb)
+        return b or BOX2I()
+
+
+class ZONE(BOARD_ITEM):
+    CLASS = "ZONE"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.outline = SHAPE_POLY_SET()
+        self.filled = False
+
+    def Outline(self):
+        return self.outline
+
+    def _map(self, fn):
+        self.outline.Map(fn)
+
+    def GetBoundingBox(self):
+        return self.outline.BBox()
+
+    def IsFilled(self):
+        return self.filled
+
+    def SetIsFilled(self, f):
+        self.filled = f
+
+    def SetNeedRefill(self, need):
+        pass
+
+    def GetZoneName(self):
+        return ""
+
+    def GetNetname(self):
+        return "GND"
+
+
+class PCB_GROUP(BOARD_ITEM):
+    CLASS = "PCB_GROUP"
+
+    def __init__(self, parent=None):
+        BOARD_ITEM.__init__(self, parent)
+        self.members = []
+
+    def AddItem(self, item):
+        _count("AddItem")
+        self.members.append(item)
+
+    def RemoveAll(self):
+        self.members = []
+
+    def Move(self, vec):
+        _count("Move")
+        for m in self.members:
+            m._move(vec.x, vec.y)
+
+    def Rotate(self, centre, angle):
+        _count("Rotate")
+        for m in self.members:
+            BOARD_ITEM.Rotate(m, centre, angle)
+        CALLS["Rotate"] -= len(self.members)
+
+    def Flip(self, centre, direction):
+        _count("Flip")
+        for m in self.members:
+            BOARD_ITEM.Flip(m, centre, direction)
+        CALLS["Flip"] -= len(self.members)
+
+
+class NETINFO_ITEM(object):
+    def __init__(self, board, name, code=-1):
+        self.name = name
+        self.code = code
+
+    def GetNetname(self):
+        return self.name
+
+    def GetNetCode(self):
+        return self.code
+
+
+class BOARD(object):
+    def __init__(self):
+        self.nets = {0: NETINFO_ITEM(self, "", 0)}
+        self.tracks = []
+        self.footprints = []
+        self.drawings = []
+        self.zones = []
+        self.filename = ""
+        self.by_id = {}     # uuid -> item, like KiCad's item cache
+
+    def Tracks(self):
+        return list(self.tracks)
+
+    def Footprints(self):
+        return list(self.footprints)
+
+    def Drawings(self):
+        return list(self.drawings)
+
+    def Zones(self):
+        return list(self.zones)
+
+    def GetFileName(self):
+        return self.filename
+
+    def _bucket(self, item):
+        if isinstance(item, PCB_TRACK):
+            return self.tracks
+        if isinstance(item, FOOTPRINT):
+            return self.footprints
+        if isinstance(item, ZONE):
+            return self.zones
+        return self.drawings
+
+    def GetCopperLayerCount(self):
+        return 2
+
+    def GetNetsByNetcode(self):
+        return dict(self.nets)
+
+    def Add(self, item):
+        _count("board.Add")
+        if isinstance(item, NETINFO_ITEM):
+            if item.code < 0:
+                item.code = max(self.nets) + 1
+            self.nets[item.code] = item
+            return
+        self._bucket(item).append(item)
+        self.by_id[item.m_Uuid.AsString()] = item
+
+    def Remove(self, item):
+        _count("board.Remove")
+        if isinstance(item, NETINFO_ITEM):
+            self.nets.pop(item.code, None)
+            return
+        self._bucket(item).remove(item)
+        self.by_id.pop(item.m_Uuid.AsString(), None)
+
+    def GetItem(self, kiid):
+        _count("GetItem")
+        return self.by_id.get(kiid.AsString())
+
+
+class ZONE_FILLER(object):
+    def __init__(self, board):
+        self.board = board
+
+    def Fill(self, zones):
+        _count("ZONE_FILLER.Fill")
+        for z in zones:
+            z.filled = True
+        return True
+
+
+def SaveBoard(path, board):
+    _count("SaveBoard")
+    board.filename = path
+    with open(path, "w") as f:
+        f.write("(kicad_pcb (fake {} {} {} {}))\n".format(
+            len(board.tracks), len(board.footprints), len(board.drawings), len(board.zones)))
+
+
+# Boards registered by path for LoadBoard(); the benchmarks fill this in.
+BOARDS = {}
+
+
+def LoadBoard(path):
+    return copy.deepcopy(BOARDS[path]) if path in BOARDS else BOARD()
+
@@ -0,0 +1,306 @@
+"""
+Benchmarks for the panelizer on the in-memory pcbnew stand-in.
+
+    python benchmarks/run.py [-o results.json] [--repeat N] [--quick]
+
+Measures how panelize, extract_poly, V-Cut generation and clearance
+queries scale with grid size and item count, and what importing the
+plugin package costs at pcbnew startup, and prints one JSON document (or writes it to -o) so
+runs can be compared over time. Absolute numbers are only comparable
+between runs on the same machine; the pcbnew call counts are exact.
+
+Boards come from synthetic.make_board() and run on fake_pcbnew, so the
+times leave out everything the fake does not emulate (see its docstring).
+--only runs a single benchmark; --quick keeps the small cases.
+
+The JSON document has `revision` (git HEAD), `timestamp`, `platform`,
+`python` and `results`, one entry per case:
+
+    benchmark     -- panelize, extract_poly, vcuts, clearance or import
+    params        -- the case (grid, item counts, outline segments, ...)
+    repeat        -- runs of the case
+    best_s/mean_s -- fastest and mean wall-clock seconds
+    pcbnew_calls  -- fake_pcbnew.CALLS for one run
+    a throughput  -- items_per_s, edges_per_s or queries_per_s
+
+plus per-benchmark extras (items_created, outlines, hits, modules).
+Compare best_s across revisions, and pcbnew_calls to see where a change
+moved work across the SWIG boundary.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+import fake_pcbnew
+sys.modules["pcbnew"] = fake_pcbnew
+
+# The package __init__ registers the action plugin, which needs wx; that
+# failure is logged and harmless here.
+logging.disable(logging.CRITICAL)
+from panelizer_plugin import core, plan as plan_mod, utils, spatial
+from panelizer_plugin.snapshot import BoardSnapshot
+from panelizer_plugin.applier import add_cuts
+logging.disable(logging.NOTSET)
+
+import synthetic
+
+GRIDS = [(2, 2), (5, 5), (10, 10), (20, 20)]
+ITEM_SCALES = [
+    dict(tracks=50, footprints=10, zones=1),
+    dict(tracks=500, footprints=100, zones=2),
+    dict(tracks=2000, footprints=400, zones=4),
+]
+OUTLINE_SEGMENTS = [16, 128, 1024, 4096]
+VCUT_GRIDS = [(2, 2), (10, 10), (40, 40), (100, 100)]
+# (items scale, cols x rows) for clearance queries
+CLEARANCE_CASES = [(ITEM_SCALES[1], (5, 5)), (ITEM_SCALES[2], (10, 10)), (ITEM_SCALES[2], (20, 20))]
+CLEARANCE_QUERIES = 2000
+
+QUICK_GRIDS = [(2, 2), (5, 5)]
+QUICK_SCALES = ITEM_SCALES[:2]
+QUICK_SEGMENTS = [16, 128]
+QUICK_VCUT_GRIDS = [(2, 2), (10, 10)]
+QUICK_CLEARANCE_CASES = CLEARANCE_CASES[:1]
+
+BOARD_W, BOARD_H, GAP = 50.0, 30.0, 2.0
+
+# Skip panelize cases that would duplicate more than this many items
+MAX_COPIES = 200000
+
+
+def settings_for(cols, rows, method="V-Cut"):
+    """
+    Panel settings just large enough for a cols x rows grid.
+    """
+    return {
+        "cols": cols,
+        "rows": rows,
+        "gap_mm": GAP,
+        "method": method,
+        "panel_w_mm": cols * (BOARD_W + GAP) + 2 * GAP + 20,
+        "panel_h_mm": rows * (BOARD_H + GAP) + 2 * GAP + 20,
+    }
+
+
+def measure(fn, setup, repeat):
+    """
+    Runs fn(setup()) `repeat` times; only fn is timed. Returns
+    (best seconds, mean seconds, last result, pcbnew calls of the last run).
+    """
+    times = []
+    result = calls = None
+    for _ in range(repeat):
+        arg = setup()
+        fake_pcbnew.CALLS.clear()
+        t0 = time.perf_counter()
+        result = fn(arg)
+        times.append(time.perf_counter() - t0)
+        calls = dict(fake_pcbnew.CALLS)
+    return min(times), sum(times) / len(times), result, calls
+
+
+def record(name, params, best, mean, repeat, calls, **extra):
+    r = {
+        "benchmark": name,
+        "params": params,
+        "best_s": best,
+        "mean_s": mean,
+        "repeat": repeat,
+        "pcbnew_calls": calls,
+    }
+    r.update(extra)
+    return r
+
+
+def bench_panelize(grids, scales, repeat):
+    results = []
+    for scale in scales:
+        per_cell = scale["tracks"] + scale["footprints"] + scale["zones"]
+        for cols, rows in grids:
+            if per_cell * (cols * rows - 1) > MAX_COPIES:
+                continue
+            settings = settings_for(cols, rows)
+
+            def setup():
+                plan_mod._plan.cache_clear()
+                return synthetic.make_board(w=BOARD_W, h=BOARD_H, **scale)
+
+            def run(board):
+                return core.panelize_board(board, settings)
+
+            best, mean, session, calls = measure(run, setup, repeat)
+            created = sum(len(items) for items in session.cells.values()) + len(session.decorations)
+            results.append(record(
+                "panelize", dict(scale, cols=cols, rows=rows), best, mean, repeat, calls,
+                items_created=created,
+                items_per_s=created / best if best else None,
+            ))
+    return results
+
+
+def bench_extract_poly(segments, repeat):
+    results = []
+    for n in segments:
+        def setup():
+            return synthetic.make_board(tracks=0, footprints=0, zones=0, w=BOARD_W, h=BOARD_H,
+                                        outline="complex", outline_segments=n, slots=max(1, n // 64))
+
+        best, mean, poly, calls = measure(utils.extract_poly, setup, repeat)
+        edges = n + 7 + 4 * max(1, n // 64)
+        results.append(record(
+            "extract_poly", dict(outline_segments=n, edges=edges), best, mean, repeat, calls,
+            outlines=poly.OutlineCount() if poly is not None else 0,
+            edges_per_s=edges / best if best else None,
+        ))
+    return results
+
+
+def bench_vcuts(grids, repeat):
+    results = []
+    board_rect = plan_mod.Rect(0, 0, plan_mod.from_mm(BOARD_W), plan_mod.from_mm(BOARD_H))
+    for cols, rows in grids:
+        settings = settings_for(cols, rows)
+
+        def setup():
+            plan_mod._plan.cache_clear()
+            return fake_pcbnew.BOARD()
+
+        def run(board):
+            plan = plan_mod.plan_panel(board_rect, settings)
+            return add_cuts(board, plan)
+
+        best, mean, items, calls = measure(run, setup, repeat)
+        results.append(record(
+            "vcuts", dict(cols=cols, rows=rows), best, mean, repeat, calls,
+            items_created=len(items),
+            items_per_s=len(items) / best if best else None,
+        ))
+    return results
+
+
+def bench_clearance(cases, repeat):
+    """
+    Builds the source CopperIndex once, then answers 1 mm clearance queries
+    at random points of the whole panel through a PanelIndex.
+    """
+    results = []
+    for scale, (cols, rows) in cases:
+        settings = settings_for(cols, rows, "Mousebites")
+        board = synthetic.make_board(w=BOARD_W, h=BOARD_H, **scale)
+        snapshot = BoardSnapshot(board)
+        plan = plan_mod.plan_panel(snapshot.board_rect, settings)
+        a = plan.array
+        rng = random.Random(0)
+        queries = []
+        for _ in range(CLEARANCE_QUERIES):
+            x, y = rng.uniform(a.x, a.x + a.w), rng.uniform(a.y, a.y + a.h)
+            queries.append((x, y, x + plan_mod.from_mm(1), y + plan_mod.from_mm(1)))
+
+        def run(_):
+            index = spatial.PanelIndex(plan, spatial.CopperIndex(snapshot))
+            clearance = plan_mod.from_mm(0.5)
+            return sum(1 for q in queries if index.hits(q, clearance))
+
+        best, mean, hits, calls = measure(run, lambda: None, repeat)
+        results.append(record(
+            "clearance", dict(scale, cols=cols, rows=rows, queries=CLEARANCE_QUERIES), best, mean, repeat, calls,
+            hits=hits,
+            queries_per_s=CLEARANCE_QUERIES / best if best else None,
+        ))
+    return results
+
+
+# Run in a fresh interpreter per sample: what pcbnew pays at startup when it
+# imports the plugin package and registers the action
+IMPORT_SCRIPT = """
+import sys, time
+sys.path[:0] = [{here!r}, {root!r}]
+import fake_pcbnew
+sys.modules["pcbnew"] = fake_pcbnew
+t = time.perf_counter()
+import panelizer_plugin
+t = time.perf_counter() - t
+print(t)
+print(" ".join(sorted(m for m in sys.modules if m.startswith("panelizer_plugin."))))
+print(" ".join(m for m in ("wx", "numpy") if m in sys.modules))
+"""
+
+
+def bench_import(repeat):
+    """
+    Wall time of `import panelizer_plugin` in a fresh interpreter, and the
+    plugin modules and heavy dependencies it loaded.
+    """
+    script = IMPORT_SCRIPT.format(here=HERE, root=os.path.dirname(HERE))
+    times = []
+    for _ in range(max(1, repeat)):
+        out = subprocess.check_output([sys.executable, "-c", script]).decode().splitlines()
+        times.append(float(out[0]))
+    modules = out[1].split() if len(out) > 1 else []
+    heavy = out[2].split() if len(out) > 2 else []
+    return [record("import", {}, min(times), sum(times) / len(times), len(times), {},
+                   modules=modules, heavy_modules=heavy)]
+
+
+def git_revision():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                      cwd=HERE, stderr=subprocess.DEVNULL)
+        return out.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the panelizer benchmarks.")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is reported)")
+    parser.add_argument("--quick", action="store_true", help="small cases only")
+    parser.add_argument("--only", choices=["panelize", "extract_poly", "vcuts", "clearance", "import"],
+                        help="run a single benchmark")
+    args = parser.parse_args(argv)
+
+    grids, scales, segments, vcut_grids, clearance_cases = (
+        (QUICK_GRIDS, QUICK_SCALES, QUICK_SEGMENTS, QUICK_VCUT_GRIDS, QUICK_CLEARANCE_CASES) if args.quick
+        else (GRIDS, ITEM_SCALES, OUTLINE_SEGMENTS, VCUT_GRIDS, CLEARANCE_CASES))
+
+    results = []
+    if args.only in (None, "panelize"):
+        results.extend(bench_panelize(grids, scales, args.repeat))
+    if args.only in (None, "extract_poly"):
+        results.extend(bench_extract_poly(segments, args.repeat))
+    if args.only in (None, "vcuts"):
+        results.extend(bench_vcuts(vcut_grids, args.repeat))
+    if args.only in (None, "clearance"):
+        results.extend(bench_clearance(clearance_cases, args.repeat))
+    if args.only in (None, "import"):
+        results.extend(bench_import(args.repeat))
+
+    doc = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Synthetic board generators for the benchmarks.
+
+Every generator is deterministic for a given seed. Boards are built from the
+fake pcbnew module, so `pcbnew` must already resolve to it (run.py takes care
+of that).
+"""
+import math
+import random
+
+import pcbnew
+
+MM = pcbnew.FromMM
+# Net codes 1..8, as used by the tracks, pads and zones below
+NET_NAMES = ("GND", "+3V3", "/SDA", "/SCL", "/MOSI", "/MISO", "/SCK", "/RESET")
+
+
+def _vec(x_mm, y_mm):
+    return pcbnew.VECTOR2I(MM(x_mm), MM(y_mm))
+
+
+def _edge_segment(board, a, b):
+    s = pcbnew.PCB_SHAPE(board)
+    s.SetShape(pcbnew.S_SEGMENT)
+    s.SetLayer(pcbnew.Edge_Cuts)
+    s.SetStart(_vec(*a))
+    s.SetEnd(_vec(*b))
+    return s
+
+
+def _edge_arc(board, a, m, b):
+    s = pcbnew.PCB_SHAPE(board)
+    s.SetShape(pcbnew.S_ARC)
+    s.SetLayer(pcbnew.Edge_Cuts)
+    s.SetArcGeometry(_vec(*a), _vec(*m), _vec(*b))
+    return s
+
+
+def rect_outline(board, w, h):
+    pts = [(0, 0), (w, 0), (w, h), (0, h)]
+    return [_edge_segment(board, pts[i], pts[(i + 1) % 4]) for i in range(4)]
+
+
+def complex_outline(board, w, h, segments, corner_r=3.0, slots=0, rng=None):
+    """
+    Rounded rectangle whose top edge is a zig-zag of `segments` pieces, plus
+    `slots` rectangular cutouts. Edges are shuffled and some reversed so the
+    chainer cannot rely on drawing order.
+    """
+    rng = rng or random.Random(0)
+    r = corner_r
+    items = []
+
+    # Top edge: zig-zag between the two top corner arcs
+    n = max(1, segments)
+    xs = [r + (w - 2 * r) * i / n for i in range(n + 1)]
+    top = [(x, (0.4 if i % 2 else 0.0)) for i, x in enumerate(xs)]
+    top[0] = (r, 0.0)
+    top[-1] = (w - r, 0.0)
+    for a, b in zip(top, top[1:]):
+        items.append(_edge_segment(board, a, b))
+
+    k = r * (1 - math.sqrt(0.5))
+    items.append(_edge_arc(board, (w - r, 0), (w - k, k), (w, r)))
+    items.append(_edge_segment(board, (w, r), (w, h - r)))
+    items.append(_edge_arc(board, (w, h - r), (w - k, h - k), (w - r, h)))
+    items.append(_edge_segment(board, (w - r, h), (r, h)))
+    items.append(_edge_arc(board, (r, h), (k, h - k), (0, h - r)))
+    items.append(_edge_segment(board, (0, h - r), (0, r)))
+    items.append(_edge_arc(board, (0, r), (k, k), (r, 0)))
+
+    for i in range(slots):
+        sx = 5 + (w - 12) * (i + 0.5) / slots
+        pts = [(sx, h * 0.4), (sx + 1.2, h * 0.4), (sx + 1.2, h * 0.6), (sx, h * 0.6)]
+        for j in range(4):
+            items.append(_edge_segment(board, pts[j], pts[(j + 1) % 4]))
+
+    for s in items:
+        if s.GetShape() == pcbnew.S_SEGMENT and rng.random() < 0.5:
+            start, end = s.GetStart(), s.GetEnd()
+            s.SetStart(end)
+            s.SetEnd(start)
+    rng.shuffle(items)
+    return items
+
+
+def make_board(tracks=100, footprints=20, pads=4, zones=1, w=50.0, h=30.0,
+               outline="rect", outline_segments=16, slots=0, seed=0):
+    """
+    A w x h mm board with the requested item counts spread over its area.
+    """
+    rng = random.Random(seed)
+    board = pcbnew.BOARD()
+
+    if outline == "rect":
+        edges = rect_outline(board, w, h)
+    else:
+        edges = complex_outline(board, w, h, outline_segments, slots=slots, rng=rng)
+    for e in edges:
+        board.Add(e)
+
+    for name in NET_NAMES:
+        board.Add(pcbnew.NETINFO_ITEM(board, name))
+
+    for i in range(tracks):
+        t = pcbnew.PCB_TRACK(board)
+        x, y = rng.uniform(2, w - 8), rng.uniform(2, h - 2)
+        t.SetStart(_vec(x, y))
+        t.SetEnd(_vec(x + rng.uniform(1, 6), y))
+        t.SetLayer(pcbnew.F_Cu if i % 2 else pcbnew.B_Cu)
+        t.SetNetCode(1 + i % 8)
+        board.Add(t)
+
+    for i in range(footprints):
+        fp = pcbnew.FOOTPRINT(board)
+        for p in range(pads):
+            pad = pcbnew.PAD(fp)
+            pad.SetPosition(_vec(p * 1.0, 0))
+            pad.SetNetCode(1 + (i + p) % 8)
+            fp.Add(pad)
+        crtyd = pcbnew.PCB_SHAPE(fp)
+        crtyd.SetShape(pcbnew.S_RECT)
+        crtyd.SetLayer(pcbnew.F_CrtYd)
+        crtyd.SetStart(_vec(-0.75, -0.75))
+        crtyd.SetEnd(_vec(pads - 0.25, 0.75))
+        crtyd.SetWidth(MM(0.05))
+        fp.Add(crtyd)
+        fp.SetPosition(_vec(rng.uniform(3, w - 3 - pads), rng.uniform(3, h - 3)))
+        board.Add(fp)
+
+    for i in range(zones):
+        z = pcbnew.ZONE(board)
+        z.SetLayer(pcbnew.F_Cu if i % 2 == 0 else pcbnew.B_Cu)
+        z.SetNetCode(1)
+        z.Outline().NewOutline()
+        for x, y in ((1, 1), (w - 1, 1), (w - 1, h - 1), (1, h - 1)):
+            z.Outline().Append(MM(x), MM(y))
+        board.Add(z)
+
+    return board
@@ -0,0 +1,431 @@
+"""
+Writes a PanelPlan (see plan.py) to a pcbnew board.
+
+This is the only place the panel geometry turns into SWIG calls; everything
+it draws has already been computed by the planner. Every function takes an
+`add` callable (board.Add by default, or a commit's Add) and returns the
+items it created so a PanelSession can track them.
+"""
+import time
+
+import numpy as np
+import pcbnew
+from .utils import add_rect_edge_cuts
+from .profiling import NULL_PROFILE
+from . import mousebites, outline_tabs
+from .fixtures import FIDUCIAL_MASK_MM
+
+VCUT_LAYER = pcbnew.F_Fab
+
+
+def make_angle(degrees):
+    """
+    EDA_ANGLE constructor differs between KiCad versions.
+    """
+    try:
+        return pcbnew.EDA_ANGLE(degrees, pcbnew.DEGREES_T)
+    except AttributeError:
+        try:
+            return pcbnew.EDA_ANGLE(degrees, pcbnew.DEGREES)
+        except Exception:
+            return pcbnew.EDA_ANGLE(int(degrees * 10))
+
+
+def apply_plan(board, plan, source_items, add=None, profile=NULL_PROFILE):
+    """
+    Replicates `source_items` into every copy cell of `plan`, then draws the
+    frame and V-Cuts. The source board itself is cell plan.source and is left
+    where it is. Returns ({(row, col): [items]}, [frame and cut items]).
+    """
+    cells = replicate(board, plan.copies(), source_items, add, profile, plan.board)
+    return cells, add_decorations(board, plan, add, profile)
+
+
+def flip_direction():
+    """
+    Left-right flip argument; KiCad 9 takes an enum, older versions a bool.
+    """
+    return getattr(pcbnew, "FLIP_DIRECTION_LEFT_RIGHT", True)
+
+
+def transform_items(board, items, cell, source_rect):
+    """
+    Applies a rotated or flipped cell's transform (plan.cell_matrix()) to
+    freshly duplicated `items` in one go: they are gathered in a temporary
+    PCB_GROUP, which flips, rotates and moves all its members on the C++
+    side, so the SWIG calls per cell do not grow with the item count beyond
+    one AddItem() each.
+    """
+    x, y, w, h = source_rect
+    centre = pcbnew.VECTOR2I(int(x + w // 2), int(y + h // 2))
+    pw, ph = (w, h) if cell.rotation % 180 == 0 else (h, w)
+    group = pcbnew.PCB_GROUP(board)
+    for item in items:
+        group.AddItem(item)
+    if cell.flip:
+        group.Flip(centre, flip_direction())
+    if cell.rotation:
+        group.Rotate(centre, make_angle(cell.rotation))
+    group.Move(pcbnew.VECTOR2I(int(x + cell.dx + pw // 2) - centre.x,
+                               int(y + cell.dy + ph // 2) - centre.y))
+    group.RemoveAll()
+
+
+def replicate_cell(board, cell, source_items, add=None, profile=NULL_PROFILE, source_rect=None):
+    """
+    Duplicates `source_items` into `cell`. Plain cells move every duplicate;
+    rotated or flipped cells need `source_rect` (the board's x, y, w, h) and
+    go through transform_items().
+    """
+    add = add or board.Add
+    transformed = bool(cell.rotation or cell.flip)
+    vec = pcbnew.VECTOR2I(int(cell.dx), int(cell.dy))
+    dups = []
+    if not profile.enabled:
+        if transformed:
+            dups = [item.Duplicate() for item in source_items]
+            transform_items(board, dups, cell, source_rect)
+            for dup in dups:
+                add(dup)
+            return dups
+        for item in source_items:
+            dup = item.Duplicate()
+            dup.Move(vec)
+            add(dup)
+            dups.append(dup)
+        return dups
+
+    # Same loops, timing Duplicate/Move apart from adding to the board
+    clock = time.perf_counter
+    t_dup = t_add = 0.0
+    if transformed:
+        t0 = clock()
+        dups = [item.Duplicate() for item in source_items]
+        transform_items(board, dups, cell, source_rect)
+        t1 = clock()
+        for dup in dups:
+            add(dup)
+        t_add = clock() - t1
+        t_dup = t1 - t0
+        profile.count("PCB_GROUP transform")
+    else:
+        for item in source_items:
+            t0 = clock()
+            dup = item.Duplicate()
+            dup.Move(vec)
+            t1 = clock()
+            add(dup)
+            t_add += clock() - t1
+            t_dup += t1 - t0
+            dups.append(dup)
+        profile.count("Move", len(dups))
+    n = len(dups)
+    profile.add_time("duplicate", t_dup)
+    profile.add_time("board.Add", t_add)
+    profile.count("Duplicate", n)
+    profile.count("Add", n)
+    profile.created(n)
+    return dups
+
+
+def replicate_steps(board, cells, source_items, add=None, profile=NULL_PROFILE, source_rect=None):
+    """
+    Replicates one cell at a time, yielding (cell, items) after each so the
+    caller can report progress, hand the items on and drop them.
+    """
+    for cell in cells:
+        yield cell, replicate_cell(board, cell, source_items, add, profile, source_rect)
+
+
+def replicate(board, cells, source_items, add=None, profile=NULL_PROFILE, source_rect=None):
+    return dict(((cell.row, cell.col), items)
+                for cell, items in replicate_steps(board, cells, source_items, add, profile, source_rect))
+
+
+def add_decorations(board, plan, add=None, profile=NULL_PROFILE):
+    """
+    Frame plus V-Cuts, mousebites or routed tabs; everything in the panel that is not a
+    cell copy.
+    """
+    f = plan.frame
+    if plan.routing is not None:
+        # The routed outline includes the frame
+        with profile.phase("routing"):
+            items = add_routing(board, plan, add)
+    else:
+        with profile.phase("frame"):
+            items = add_rect_edge_cuts(board, f.x, f.y, f.w, f.h, width=plan.frame_width, add=add)
+    with profile.phase("vcuts"):
+        items.extend(add_cuts(board, plan, add))
+    profile.count("PCB_SHAPE", len(items) - len(plan.labels))
+    profile.count("PCB_TEXT", len(plan.labels))
+    if plan.tabs or plan.outline_tabs is not None:
+        with profile.phase("mousebites"):
+            tabs = add_mousebites(board, plan, add)
+        profile.count("FOOTPRINT", len(tabs))
+        items.extend(tabs)
+    if plan.thieving is not None:
+        with profile.phase("thieving"):
+            fill = add_thieving(board, plan, add)
+        profile.count("PCB_SHAPE", len(fill))
+        items.extend(fill)
+    if plan.fixtures:
+        with profile.phase("fixtures"):
+            fixtures = add_fixtures(board, plan, add)
+        profile.count("FOOTPRINT", len(fixtures))
+        items.extend(fixtures)
+    profile.count("Add", len(items))
+    profile.created(len(items))
+    return items
+
+
+def add_cuts(board, plan, add=None):
+    add = add or board.Add
+    items = []
+    for cut in plan.cuts:
+        seg = pcbnew.PCB_SHAPE(board)
+        seg.SetShape(pcbnew.S_SEGMENT)
+        seg.SetStart(pcbnew.VECTOR2I(int(cut.x1), int(cut.y1)))
+        seg.SetEnd(pcbnew.VECTOR2I(int(cut.x2), int(cut.y2)))
+        seg.SetLayer(VCUT_LAYER)
+        seg.SetWidth(int(cut.width))   # Thickness = Gap
+        add(seg)
+        items.append(seg)
+
+    for label in plan.labels:
+        txt = pcbnew.PCB_TEXT(board)
+        txt.SetText(label.text)
+        txt.SetLayer(VCUT_LAYER)
+        txt.SetTextSize(pcbnew.VECTOR2I(pcbnew.FromMM(1), pcbnew.FromMM(1)))
+        txt.SetTextThickness(pcbnew.FromMM(0.25))
+        txt.SetTextAngle(make_angle(label.angle))
+        txt.SetPosition(pcbnew.VECTOR2I(int(label.x), int(label.y)))
+        add(txt)
+        items.append(txt)
+    return items
+
+
+def _hole_pad(footprint, drill, size):
+    pad = pcbnew.PAD(footprint)
+    pad.SetAttribute(pcbnew.PAD_ATTRIB_NPTH)
+    pad.SetShape(pcbnew.PAD_SHAPE_CIRCLE)
+    pad.SetSize(pcbnew.VECTOR2I(int(size), int(size)))
+    pad.SetDrillSize(pcbnew.VECTOR2I(int(drill), int(drill)))
+    pad.SetLayerSet(pad.UnplatedHoleMask())
+    return pad
+
+
+def _mousebite_footprint(board, position, positions, drills, sizes, masters):
+    fp = pcbnew.FOOTPRINT(board)
+    fp.SetReference("MB")
+    fp.Reference().SetVisible(False)
+    fp.SetAttributes(pcbnew.FP_BOARD_ONLY | pcbnew.FP_EXCLUDE_FROM_POS_FILES | pcbnew.FP_EXCLUDE_FROM_BOM)
+    fp.SetPosition(pcbnew.VECTOR2I(int(position[0]), int(position[1])))
+    for (hx, hy), drill, size in zip(positions.tolist(), drills.tolist(), sizes.tolist()):
+        master = masters.get((drill, size))
+        if master is None:
+            master = masters[(drill, size)] = _hole_pad(fp, drill, size)
+        pad = master.Duplicate()
+        pad.SetPosition(pcbnew.VECTOR2I(hx, hy))
+        fp.Add(pad)
+    return fp
+
+
+def add_mousebites(board, plan, add=None):
+    """
+    One board-only footprint per tabbed cell side, holding the holes of all
+    its tabs, or per cell when the tabs follow the outline. Every hole is a
+    Duplicate() of one pad per drill size.
+    """
+    add = add or board.Add
+    masters = {}
+    items = []
+    tabs = plan.outline_tabs
+    if tabs is not None:
+        if not len(tabs.holes):
+            return items
+        per_cell = outline_tabs.cell_holes(plan, tabs)
+        for positions in per_cell:
+            fp = _mousebite_footprint(board, positions[0], positions, tabs.drills, tabs.sizes, masters)
+            add(fp)
+            items.append(fp)
+        return items
+
+    template = mousebites.load_template(plan.gap)
+    for edge in plan.tabs:
+        positions, drills, sizes = mousebites.hole_positions(template, edge)
+        fp = _mousebite_footprint(board, edge.points[0], positions, drills, sizes, masters)
+        add(fp)
+        items.append(fp)
+    return items
+
+
+def _fiducial_pad(footprint, size, mask):
+    pad = pcbnew.PAD(footprint)
+    pad.SetAttribute(pcbnew.PAD_ATTRIB_SMD)
+    pad.SetShape(pcbnew.PAD_SHAPE_CIRCLE)
+    pad.SetSize(pcbnew.VECTOR2I(int(size), int(size)))
+    layers = pcbnew.LSET()
+    layers.AddLayer(pcbnew.F_Cu)
+    layers.AddLayer(pcbnew.F_Mask)
+    pad.SetLayerSet(layers)
+    pad.SetLocalSolderMaskMargin(int((mask - size) / 2))
+    return pad
+
+
+def add_fixtures(board, plan, add=None):
+    """
+    One board-only footprint per fiducial ("FID<n>", a bare copper dot in
+    a solder mask opening) and tooling hole ("H<n>", an NPTH).
+    """
+    add = add or board.Add
+    items = []
+    counts = {}
+    for fixture in plan.fixtures:
+        n = counts[fixture.kind] = counts.get(fixture.kind, 0) + 1
+        fp = pcbnew.FOOTPRINT(board)
+        fp.SetReference("{}{}".format("FID" if fixture.kind == "fiducial" else "H", n))
+        fp.Reference().SetVisible(False)
+        fp.SetAttributes(pcbnew.FP_BOARD_ONLY | pcbnew.FP_EXCLUDE_FROM_POS_FILES | pcbnew.FP_EXCLUDE_FROM_BOM)
+        if fixture.kind == "fiducial":
+            pad = _fiducial_pad(fp, fixture.size, max(fixture.size, pcbnew.FromMM(FIDUCIAL_MASK_MM)))
+        else:
+            pad = _hole_pad(fp, fixture.size, fixture.size)
+        fp.Add(pad)
+        fp.SetPosition(pcbnew.VECTOR2I(int(fixture.x), int(fixture.y)))
+        add(fp)
+        items.append(fp)
+    return items
+
+
+def copper_layers(board):
+    n = board.GetCopperLayerCount()
+    return [pcbnew.F_Cu] + [getattr(pcbnew, "In{}_Cu".format(i)) for i in range(1, n - 1)] + [pcbnew.B_Cu]
+
+
+def _simplify(poly):
+    """
+    SHAPE_POLY_SET.Simplify() lost its mode argument in KiCad 9.
+    """
+    try:
+        poly.Simplify()
+    except TypeError:
+        poly.Simplify(pcbnew.SHAPE_POLY_SET.PM_FAST)
+
+
+def add_thieving(board, plan, add=None):
+    """
+    The rail thieving of `plan` as one filled polygon per copper layer:
+    every rectangle of the pattern goes into a single SHAPE_POLY_SET, which
+    is merged once, so the item count does not grow with the pattern.
+    """
+    add = add or board.Add
+    rects = plan.thieving.rects
+    if not len(rects):
+        return []
+    poly = pcbnew.SHAPE_POLY_SET()
+    for x0, y0, x1, y1 in rects.round().astype(int).tolist():
+        idx = poly.NewOutline()
+        poly.Append(x0, y0, idx)
+        poly.Append(x1, y0, idx)
+        poly.Append(x1, y1, idx)
+        poly.Append(x0, y1, idx)
+    _simplify(poly)
+
+    items = []
+    for layer in copper_layers(board):
+        shape = pcbnew.PCB_SHAPE(board)
+        shape.SetShape(pcbnew.S_POLY)
+        shape.SetPolyShape(poly)
+        shape.SetFilled(True)
+        shape.SetWidth(0)
+        shape.SetLayer(layer)
+        add(shape)
+        items.append(shape)
+    return items
+
+
+def _inflate(poly, amount, max_error):
+    """
+    SHAPE_POLY_SET.Inflate() takes a corner strategy since KiCad 8 and a
+    segment count before.
+    """
+    try:
+        poly.Inflate(amount, pcbnew.CORNER_STRATEGY_ROUND_ALL_CORNERS, max_error)
+    except (AttributeError, TypeError):
+        poly.Inflate(amount, 16)
+
+
+def _subtract(poly, other):
+    """
+    SHAPE_POLY_SET.BooleanSubtract() lost its mode argument in KiCad 9.
+    """
+    try:
+        poly.BooleanSubtract(other)
+    except TypeError:
+        poly.BooleanSubtract(other, pcbnew.SHAPE_POLY_SET.PM_FAST)
+
+
+def _poly_set(rings):
+    """
+    One outline per ring of `rings` (any iterable of N x 2 arrays).
+    """
+    poly = pcbnew.SHAPE_POLY_SET()
+    for ring in rings:
+        idx = poly.NewOutline()
+        for x, y in ring.round().astype(int).tolist():
+            poly.Append(x, y, idx)
+    return poly
+
+
+def _edge_poly(board, chain, width, add):
+    shape = pcbnew.PCB_SHAPE(board)
+    shape.SetShape(pcbnew.S_POLY)
+    shape.SetPolyShape(_poly_set([chain]))
+    shape.SetFilled(False)
+    shape.SetWidth(int(width))
+    shape.SetLayer(pcbnew.Edge_Cuts)
+    add(shape)
+    return shape
+
+
+def _chain_points(chain):
+    return np.array([(p.x, p.y) for p in (chain.CPoint(i) for i in range(chain.PointCount()))],
+                    dtype=np.float64).reshape(-1, 2)
+
+
+def add_routing(board, plan, add=None):
+    """
+    The Edge.Cuts of a milled panel (see routing.py), built from whole-panel
+    polygon sets so the boolean work does not grow with the cell count:
+    every cell outline goes into one set, which is inflated by the slot
+    width once; the cells and tabs are taken out of that in one subtract,
+    and the result out of the frame in another. Every chain of the result,
+    and every cutout of every cell, becomes one S_POLY outline.
+    """
+    add = add or board.Add
+    r = plan.routing
+    f = plan.frame
+    cells = _poly_set(ring for rings in r.rings for ring in rings)
+    milled = pcbnew.SHAPE_POLY_SET(cells)
+    _inflate(milled, int(r.width), pcbnew.FromMM(0.005))
+    for tab in r.tabs.reshape(-1, 4, 2):
+        idx = cells.NewOutline()
+        for x, y in tab.round().astype(int).tolist():
+            cells.Append(x, y, idx)
+    _simplify(cells)
+    _subtract(milled, cells)
+
+    panel = _poly_set([np.array(((f.x, f.y), (f.x + f.w, f.y), (f.x + f.w, f.y + f.h), (f.x, f.y + f.h)))])
+    _subtract(panel, milled)
+
+    width = pcbnew.FromMM(0.1)
+    items = []
+    for i in range(panel.OutlineCount()):
+        items.append(_edge_poly(board, _chain_points(panel.Outline(i)), width, add))
+        for j in range(panel.HoleCount(i)):
+            items.append(_edge_poly(board, _chain_points(panel.Hole(i, j)), width, add))
+    for holes in r.holes:
+        for ring in holes:
+            items.append(_edge_poly(board, ring, width, add))
+    return items
@@ -0,0 +1,216 @@
+"""
+Auto-fit: how many boards fit on a panel, and how to arrange them.
+
+best_layouts() searches every grid size for both orientations (the board as
+drawn, and turned by 90 degrees) plus two-block layouts that put a grid of one
+orientation beside or below a grid of the other, and ranks the candidates by
+the number of boards. Each family of candidates is scored as NumPy arrays and
+only the winners are turned into Layouts; results are memoized per board
+size, panel size and gap.
+
+The board's Edge.Cuts bbox is what gets packed, into the panel less the
+frame: the frame stroke is `gap` wide and centred on the panel edge, so half
+of it lies inside on every side. Mousebite and routed panels mill a slot
+around every board, so the slot width comes off every side as well, or the
+slot would cut the array off the rails. layout_settings() turns a Layout
+into settings for plan_panel(). Coordinates are KiCad internal units (nm).
+"""
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from .plan import plan_panel, frame_sides, from_mm, to_mm
+from .routing import slot_width
+
+# A grid of `cols` x `rows` boards turned by `rotation` degrees, whose top
+# left corner sits at (x, y) relative to the array origin.
+Block = namedtuple("Block", "x y cols rows rotation")
+
+# count         -- boards on the panel
+# utilization   -- board area / panel area
+# width, height -- extent of the whole arrangement
+Layout = namedtuple("Layout", "count utilization width height blocks")
+
+
+def _capacity(length, size, gap):
+    """
+    How many items of `size` fit in `length` with `gap` between them.
+    """
+    if size <= 0:
+        return 0
+    return max(0, int((length + gap) // (size + gap)))
+
+
+def _extent(n, size, gap):
+    return n * size + np.maximum(n - 1, 0) * gap
+
+
+class _Family(object):
+    """
+    A batch of candidates as parallel arrays. `blocks(i)` builds the Block
+    tuple of candidate i; it is only called for the ones that are returned.
+    """
+    def __init__(self, counts, widths, heights, nblocks, blocks):
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.widths = np.asarray(widths, dtype=np.int64)
+        self.heights = np.asarray(heights, dtype=np.int64)
+        self.nblocks = np.full(len(self.counts), nblocks, dtype=np.int64)
+        self.blocks = blocks
+
+
+def _grids(o, panel_w, panel_h, gap):
+    """
+    Every cols x rows grid of orientation `o` = (w, h, rotation) that fits.
+    """
+    w, h, rot = o
+    max_c = _capacity(panel_w, w, gap)
+    max_r = _capacity(panel_h, h, gap)
+    if not max_c or not max_r:
+        return None
+    cols, rows = np.meshgrid(np.arange(1, max_c + 1), np.arange(1, max_r + 1))
+    cols, rows = cols.ravel(), rows.ravel()
+    return _Family(cols * rows, _extent(cols, w, gap), _extent(rows, h, gap), 1,
+                   lambda i: (Block(0, 0, int(cols[i]), int(rows[i]), rot),))
+
+
+def _side_by_side(a, b, panel_w, panel_h, gap):
+    """
+    n full-height columns of orientation `a` on the left, the remaining width
+    filled with full-height columns of orientation `b`, for every n where
+    both blocks get boards.
+    """
+    aw, ah, arot = a
+    bw, bh, brot = b
+    max_a = _capacity(panel_w, aw, gap)
+    rows_a = _capacity(panel_h, ah, gap)
+    rows_b = _capacity(panel_h, bh, gap)
+    if not max_a or not rows_a or not rows_b:
+        return None
+    na = np.arange(1, max_a + 1)
+    x_b = na * (aw + gap)
+    nb = np.maximum(0, (panel_w - x_b + gap) // (bw + gap))
+    keep = nb > 0
+    na, nb, x_b = na[keep], nb[keep], x_b[keep]
+    if not len(na):
+        return None
+    height = max(_extent(rows_a, ah, gap), _extent(rows_b, bh, gap))
+    return _Family(na * rows_a + nb * rows_b, x_b + _extent(nb, bw, gap), np.full(len(na), height), 2,
+                   lambda i: (Block(0, 0, int(na[i]), rows_a, arot),
+                              Block(int(x_b[i]), 0, int(nb[i]), rows_b, brot)))
+
+
+def _stacked(a, b, panel_w, panel_h, gap):
+    """
+    _side_by_side() on the transposed panel: full-width rows of `a` on top,
+    `b` below.
+    """
+    t = _side_by_side((a[1], a[0], a[2]), (b[1], b[0], b[2]), panel_h, panel_w, gap)
+    if t is None:
+        return None
+    return _Family(t.counts, t.heights, t.widths, 2,
+                   lambda i: tuple(Block(bl.y, bl.x, bl.rows, bl.cols, bl.rotation) for bl in t.blocks(i)))
+
+
+@functools.lru_cache(maxsize=32)
+def best_layouts(board_w, board_h, panel_w, panel_h, gap, allow_rotation=True, limit=10, rail=0):
+    """
+    Layouts for a board_w x board_h board on a panel_w x panel_h panel, best
+    first: most boards, then the smallest arrangement, then the fewest
+    blocks. `rail` is kept clear on every side between the array and the
+    frame stroke (see slot_width()). Returns a tuple of at most `limit`
+    Layouts.
+    """
+    # PanelPlan.frame_width is the gap; two half strokes come off each axis
+    inner_w, inner_h = panel_w - gap - 2 * rail, panel_h - gap - 2 * rail
+    upright = (board_w, board_h, 0)
+    families = [_grids(upright, inner_w, inner_h, gap)]
+    if allow_rotation and board_w != board_h:
+        turned = (board_h, board_w, 90)
+        families.append(_grids(turned, inner_w, inner_h, gap))
+        for a, b in ((upright, turned), (turned, upright)):
+            families.append(_side_by_side(a, b, inner_w, inner_h, gap))
+            families.append(_stacked(a, b, inner_w, inner_h, gap))
+    families = [f for f in families if f is not None]
+    if not families:
+        return ()
+
+    counts = np.concatenate([f.counts for f in families])
+    widths = np.concatenate([f.widths for f in families])
+    heights = np.concatenate([f.heights for f in families])
+    nblocks = np.concatenate([f.nblocks for f in families])
+    owner = np.concatenate([np.full(len(f.counts), k) for k, f in enumerate(families)])
+    index = np.concatenate([np.arange(len(f.counts)) for f in families])
+
+    # lexsort sorts by the last key first
+    order = np.lexsort((nblocks, widths.astype(np.float64) * heights, -counts))
+
+    scale = float(board_w) * board_h / (float(panel_w) * panel_h)
+    layouts = []
+    seen = set()
+    for i in order:
+        key = (counts[i], widths[i], heights[i])
+        if key in seen:
+            continue
+        seen.add(key)
+        blocks = families[owner[i]].blocks(index[i])
+        layouts.append(Layout(int(counts[i]), counts[i] * scale, int(widths[i]), int(heights[i]), blocks))
+        if len(layouts) >= limit:
+            break
+    return tuple(layouts)
+
+
+def layout_settings(layout, settings):
+    """
+    `settings` rewritten to build `layout`: plain cols/rows for an upright
+    single grid, explicit "blocks" otherwise.
+    """
+    settings = dict(settings)
+    settings.pop("blocks", None)
+    if len(layout.blocks) == 1 and layout.blocks[0].rotation == 0:
+        block = layout.blocks[0]
+        settings.update(cols=block.cols, rows=block.rows, alternate="none")
+        return settings
+    settings["blocks"] = [dict(x_mm=to_mm(b.x), y_mm=to_mm(b.y), cols=b.cols, rows=b.rows, rotation=b.rotation)
+                          for b in layout.blocks]
+    return settings
+
+
+def buildable(plan, settings):
+    """
+    True if `plan` fits and can be built with the method in `settings`: no
+    plan problems, and on a milled panel at least one board side with room
+    for a tab to the rails.
+    """
+    if not plan.fits or plan.problems:
+        return False
+    slot = slot_width(settings)
+    return not slot or bool(frame_sides(plan, slot=slot))
+
+
+def fit_settings(board_rect, settings, allow_rotation=True):
+    """
+    `settings` rewritten for the layout that puts the most boards on the
+    panel and can actually be built with the chosen method (V-Cuts rule out
+    most mixed layouts). If nothing fits the settings are returned
+    unchanged and check_plan() or validation reports the problem.
+    """
+    layouts = best_layouts(
+        int(board_rect[2]), int(board_rect[3]),
+        from_mm(settings["panel_w_mm"]), from_mm(settings["panel_h_mm"]),
+        from_mm(settings["gap_mm"]), allow_rotation, rail=slot_width(settings))
+    for layout in layouts:
+        candidate = layout_settings(layout, settings)
+        if buildable(plan_panel(board_rect, candidate), candidate):
+            return candidate
+    return settings
+
+
+def describe(layout):
+    """
+    One line for the dialog, e.g. "12 boards: 4 x 3, 78% of panel".
+    """
+    grids = " + ".join("{} x {}{}".format(b.cols, b.rows, " rotated" if b.rotation else "")
+                       for b in layout.blocks)
+    return "{} boards: {}, {:.0f}% of panel ({:.1f} x {:.1f} mm)".format(
+        layout.count, grids, layout.utilization * 100, to_mm(layout.width), to_mm(layout.height))
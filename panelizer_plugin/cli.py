@@ -0,0 +1,247 @@
+"""
+Headless batch panelization.
+
+    python -m panelizer_plugin.cli settings.json boards/ -o panels/ -j 4
+
+`settings.json` holds the same keys the dialog produces (see
+PanelizerDialog.GetSettings()), or is a panel recipe (see recipe.py). Every
+`.kicad_pcb` given on the command line, or found in a given directory, is
+panelized in its own worker process and saved as `<name>_panel.kicad_pcb` in
+the output directory.
+
+`--engine sexpr` rewrites the board file text directly instead of going
+through pcbnew (see streaming.py); it is much faster on large arrays and does
+not need KiCad installed.
+
+`--fab` also writes `<name>_panel_fab.zip` with every fab layer, the drill
+files and a V-score drawing of each panel (see fab_export.py).
+
+`--engine gerber` does not build the panel at all: the board is plotted once
+and written as step-and-repeat Gerber and drill files into
+`<name>_panel_gerber/` (see gerber_sr.py).
+
+Outputs are cached by a hash of the settings and the board file (see
+recipe.OutputCache): a board that did not change since the last run is
+copied out of the cache instead of being panelized again. `--no-cache`
+turns this off, `--cache-dir` moves the cache.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+from .fab_export import fab_zip_path
+from .recipe import OutputCache, load_recipe
+
+REQUIRED_SETTINGS = ("cols", "rows", "gap_mm", "panel_w_mm", "panel_h_mm")
+PANEL_SUFFIX = "_panel"
+ENGINES = ("pcbnew", "sexpr", "gerber")
+GERBER_SUFFIX = "_panel_gerber"
+
+
+def load_settings(path, autofit=False):
+    """
+    Reads a settings JSON file or recipe and checks it carries everything
+    panelize needs. With `autofit` (or "autofit" in the file) cols/rows may
+    be left out.
+    """
+    settings = load_recipe(path)
+    if autofit:
+        settings["autofit"] = True
+    if settings.get("autofit"):
+        settings.setdefault("cols", 1)
+        settings.setdefault("rows", 1)
+
+    missing = [k for k in REQUIRED_SETTINGS if k not in settings]
+    if missing:
+        raise ValueError("{}: missing settings {}".format(path, ", ".join(missing)))
+
+    settings["cols"] = int(settings["cols"])
+    settings["rows"] = int(settings["rows"])
+    settings["gap_mm"] = float(settings["gap_mm"])
+    settings["panel_w_mm"] = float(settings["panel_w_mm"])
+    settings["panel_h_mm"] = float(settings["panel_h_mm"])
+    settings.setdefault("method", "V-Cut")
+    return settings
+
+
+def collect_boards(paths):
+    """
+    Expands directories into the `.kicad_pcb` files they contain, skipping
+    panels written by an earlier run.
+    """
+    boards = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                stem, ext = os.path.splitext(name)
+                if ext == ".kicad_pcb" and not stem.endswith(PANEL_SUFFIX):
+                    boards.append(os.path.join(path, name))
+        else:
+            boards.append(path)
+    return boards
+
+
+def output_path(board_path, out_dir, engine="pcbnew"):
+    stem = os.path.splitext(os.path.basename(board_path))[0]
+    if engine == "gerber":
+        return os.path.join(out_dir or os.path.dirname(board_path), stem + GERBER_SUFFIX)
+    return os.path.join(out_dir or os.path.dirname(board_path), stem + PANEL_SUFFIX + ".kicad_pcb")
+
+
+def panelize_file(job):
+    """
+    Worker entry point: loads one board, panelizes it and saves the result
+    (or, for the gerber engine, writes the panel's fab files).
+    Returns (source, destination, error message or None).
+    """
+    src, dst, settings, engine = job
+    try:
+        if engine == "sexpr":
+            from .streaming import panelize_file as stream_panelize
+            stream_panelize(src, dst, settings)
+        elif engine == "gerber":
+            import pcbnew
+            from .gerber_sr import export_panel
+
+            export_panel(pcbnew.LoadBoard(src), settings, dst)
+        else:
+            import pcbnew
+            from .core import panelize_board, write_profile
+
+            board = pcbnew.LoadBoard(src)
+            session = panelize_board(board, settings)
+            with session.profile.phase("save"):
+                pcbnew.SaveBoard(dst, board)
+            write_profile(session, board, dict(settings, profile_dir=settings.get("profile_dir") or os.path.dirname(dst)))
+    except Exception as e:
+        return (src, dst, "{}: {}".format(type(e).__name__, e))
+    return (src, dst, None)
+
+
+def run(settings, boards, out_dir=None, jobs=None, engine="pcbnew"):
+    """
+    Panelizes every board in `boards`, one board per worker process.
+    Returns the list of (source, destination, error) results in input order.
+    """
+    if out_dir and not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    work = [(src, output_path(src, out_dir, engine), settings, engine) for src in boards]
+    jobs = min(jobs or os.cpu_count() or 1, len(work))
+    if jobs <= 1:
+        return [panelize_file(job) for job in work]
+
+    # pcbnew keeps global state per loaded board, so every board gets a fresh
+    # process instead of sharing a long-lived worker.
+    pool = multiprocessing.Pool(processes=jobs, maxtasksperchild=1)
+    try:
+        return pool.map(panelize_file, work, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def from_cache(cache, settings, boards, out_dir=None, engine="pcbnew", fab=False):
+    """
+    Splits `boards` into (board, destination, key, fab restored) restored
+    from `cache` and (board, key) that still have to be built. A board whose
+    panel is cached but whose fab zip is not counts as restored; the caller
+    writes its fab zip from the restored panel.
+    """
+    restored, pending = [], []
+    for src in boards:
+        dst = output_path(src, out_dir, engine)
+        key = cache.key(settings, engine, src)
+        if cache.restore(key, "panel", dst):
+            has_fab = fab and engine != "gerber" and cache.restore(key, "fab", fab_zip_path(dst))
+            restored.append((src, dst, key, has_fab))
+        else:
+            pending.append((src, key))
+    return restored, pending
+
+
+def export_fab_file(panel_path, jobs=None):
+    """
+    Writes the fab zip of a saved panel. Runs in the main process, after the
+    panelize pool is done, because it starts plot workers of its own.
+    Returns an error message or None.
+    """
+    from .fab_export import export_fab
+    try:
+        export_fab(panel_path, jobs=jobs)
+    except Exception as e:
+        return "{}: {}".format(type(e).__name__, e)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="panelizer_plugin.cli", description="Panelize KiCad boards headlessly.")
+    parser.add_argument("settings", help="settings JSON (same keys as the dialog) or panel recipe")
+    parser.add_argument("boards", nargs="+", help=".kicad_pcb files or directories containing them")
+    parser.add_argument("-o", "--out-dir", help="output directory (default: next to each board)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--engine", choices=ENGINES, default="pcbnew",
+                        help="pcbnew (default), sexpr to stream the board file without pcbnew, "
+                             "or gerber for step-and-repeat fab files instead of a panel board")
+    parser.add_argument("--autofit", action="store_true",
+                        help="ignore cols/rows and fit as many boards as the panel holds")
+    parser.add_argument("--fab", action="store_true",
+                        help="also write <name>_panel_fab.zip with Gerbers, drill files and V-scores")
+    parser.add_argument("--profile", action="store_true",
+                        help="write <name>_panelize_profile.json/.log next to each panel (pcbnew engine)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="like --profile, and also trace peak Python memory (slows the timed phases)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always panelize, even when the board and settings did not change")
+    parser.add_argument("--cache-dir", default=None,
+                        help="output cache directory (default: $PANELIZER_CACHE or the user cache)")
+    args = parser.parse_args(argv)
+
+    settings = load_settings(args.settings, args.autofit)
+    if args.profile:
+        settings["profile"] = True
+    if args.profile_memory:
+        settings["profile_memory"] = True
+    boards = collect_boards(args.boards)
+    if not boards:
+        parser.error("no .kicad_pcb files found")
+
+    fab = args.fab and args.engine != "gerber"
+    cache = None if args.no_cache else OutputCache(args.cache_dir)
+    restored, keys = [], {}
+    if cache is not None:
+        restored, pending = from_cache(cache, settings, boards, args.out_dir, args.engine, fab)
+        keys = dict(pending)
+        boards = [src for src, _ in pending]
+
+    failed = 0
+    for src, dst, key, has_fab in restored:
+        error = None
+        if fab and not has_fab:
+            error = export_fab_file(dst, args.jobs)
+            if not error:
+                cache.store(key, "fab", fab_zip_path(dst))
+        if error:
+            failed += 1
+            print("FAILED {}: {}".format(src, error), file=sys.stderr)
+        else:
+            print("{} -> {} (cached)".format(src, dst))
+
+    for src, dst, error in run(settings, boards, args.out_dir, args.jobs, args.engine) if boards else ():
+        if not error and fab:
+            error = export_fab_file(dst, args.jobs)
+        if error:
+            failed += 1
+            print("FAILED {}: {}".format(src, error), file=sys.stderr)
+            continue
+        if cache is not None:
+            cache.store(keys[src], "panel", dst)
+            if fab:
+                cache.store(keys[src], "fab", fab_zip_path(dst))
+        print("{} -> {}".format(src, dst))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import os
+
+from .plan import PanelizerError, PanelizerCancelled
+from .profiling import PanelizeProfile
+from .session import PanelSession
+from .autofit import fit_settings
+
+
+def panelize_board(board, settings, session=None, progress=None):
+    """
+    Panelizes `board` in place according to `settings` (see GetSettings()).
+    Raises PanelizerError if the panel cannot be built. Returns the
+    PanelSession, whose update() re-panelizes with new settings by only
+    touching the cells that changed; pass it back as `session` to reuse it.
+
+    With settings["profile"] set, the run is instrumented and the session's
+    `profile` is left running so the caller can time its own tail (refresh,
+    save) before calling write_profile(). settings["profile_memory"] also
+    traces peak Python memory, at the cost of slower phase times.
+
+    With settings["autofit"] set, cols/rows are replaced by the layout that
+    puts the most boards on the panel, which may mix rotated and upright
+    blocks (see autofit.py).
+
+    `progress(done, total)` is called after every replicated cell; if it
+    returns False the run is rolled back and PanelizerCancelled is raised.
+    """
+    profile = PanelizeProfile(enabled=bool(settings.get("profile") or settings.get("profile_memory")),
+                              trace_memory=bool(settings.get("profile_memory")))
+    profile.start()
+    try:
+        with profile.phase("collect"):
+            if session is None:
+                session = PanelSession(board)
+        if settings.get("autofit"):
+            settings = fit_settings(session.board_rect, settings)
+        steps = session.update_steps(settings, profile=profile)
+        for done, total in steps:
+            if progress is not None and not progress(done, total):
+                steps.close()
+                raise PanelizerCancelled()
+    except Exception:
+        profile.stop()
+        raise
+    session.profile = profile
+    return session
+
+
+def write_profile(session, board, settings):
+    """
+    Stops the session's profile and writes its JSON report and log next to
+    the board (or into settings["profile_dir"]). Returns the paths, or None
+    if profiling was off.
+    """
+    profile = getattr(session, "profile", None)
+    if profile is None or not profile.enabled:
+        return None
+    profile.stop()
+    filename = board.GetFileName()
+    directory = settings.get("profile_dir") or os.path.dirname(filename) or os.getcwd()
+    stem = os.path.splitext(os.path.basename(filename))[0] or "board"
+    return profile.write(directory, stem)
@@ -0,0 +1,174 @@
+"""
+Fabrication output for a saved panel.
+
+    python -m panelizer_plugin.fab_export panel.kicad_pcb [-o panel_fab.zip] [-j 4]
+
+Writes a Gerber per enabled copper and technical layer, the drill files and a
+V-score drawing (the V-Cut layer as PDF, plus an X2 V-score Gerber when the
+PanelPlan is known), and bundles them into one zip.
+
+Plotting is the slow part on large panels, so the layers are spread over
+worker processes. Each worker loads the saved panel itself (pcbnew boards
+cannot be pickled) and plots its share; the drill files are one more job.
+Inside KiCad the workers need a Python interpreter next to the KiCad
+executable; without one the jobs run one after another in-process.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import zipfile
+
+FAB_SUFFIX = "_fab"
+
+# Canonical names of the layers that go to the fab, besides copper
+FAB_LAYERS = ("F.Paste", "B.Paste", "F.SilkS", "B.SilkS", "F.Mask", "B.Mask", "Edge.Cuts")
+VSCORE_LAYER = "F.Fab"
+
+_LAYER_RE = re.compile(r'^\s*\(\d+\s+"([^"]+)"')
+
+
+def board_layers(path):
+    """
+    Canonical names of the enabled layers of a .kicad_pcb, read from its
+    (layers ...) section without loading the board.
+    """
+    names = []
+    inside = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not inside:
+                inside = line.strip().startswith("(layers")
+                continue
+            m = _LAYER_RE.match(line)
+            if m:
+                names.append(m.group(1))
+            elif line.strip() == ")":
+                break
+    return names
+
+
+def fab_layers(path):
+    return [n for n in board_layers(path) if n.endswith(".Cu") or n in FAB_LAYERS]
+
+
+def _plot_job(job):
+    """
+    Worker entry point: ("plot", board path, out dir, layer names, format) or
+    ("drill", board path, out dir). Returns (paths, error message or None).
+    """
+    kind, src, out_dir = job[:3]
+    try:
+        import pcbnew
+        from .gerber_sr import plot_layers, drill_source
+
+        board = pcbnew.LoadBoard(src)
+        if kind == "drill":
+            return [p for p in drill_source(board, out_dir) if os.path.exists(p)], None
+        names, fmt = job[3], job[4]
+        fmt = getattr(pcbnew, fmt)
+        layers = [board.GetLayerID(n) for n in names]
+        return list(plot_layers(board, out_dir, layers, fmt).values()), None
+    except Exception as e:
+        return [], "{}: {}".format(type(e).__name__, e)
+
+
+def python_executable():
+    """
+    An interpreter for worker processes, or None. Inside KiCad
+    sys.executable is KiCad itself; the bundled python sits next to it.
+    """
+    exe = sys.executable or ""
+    if os.path.basename(exe).lower().startswith("python"):
+        return exe
+    for name in ("python.exe", "python3", "python"):
+        candidate = os.path.join(os.path.dirname(exe), name)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def plan_jobs(src, out_dir, jobs):
+    """
+    Splits the layers of `src` into at most `jobs` plot jobs, round robin so
+    copper and technical layers spread evenly, plus the drill and V-score jobs.
+    """
+    layers = fab_layers(src)
+    n = max(1, min(jobs, len(layers)))
+    work = [("plot", src, out_dir, layers[i::n], "PLOT_FORMAT_GERBER") for i in range(n) if layers[i::n]]
+    work.append(("drill", src, out_dir))
+    work.append(("plot", src, out_dir, [VSCORE_LAYER], "PLOT_FORMAT_PDF"))
+    return work
+
+
+def run_jobs(work, jobs):
+    exe = python_executable() if jobs > 1 else None
+    if exe is None:
+        return [_plot_job(job) for job in work]
+    ctx = multiprocessing.get_context("spawn")
+    ctx.set_executable(exe)
+    # One board per process, as in cli.run()
+    pool = ctx.Pool(processes=min(jobs, len(work)), maxtasksperchild=1)
+    try:
+        return pool.map(_plot_job, work, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def fab_zip_path(board_path):
+    stem = os.path.splitext(board_path)[0]
+    return stem + FAB_SUFFIX + ".zip"
+
+
+def export_fab(board_path, zip_path=None, jobs=None, plan=None):
+    """
+    Plots every fab layer, the drill files and the V-score drawing of the
+    saved panel at `board_path` and writes them into one zip. `plan` is the
+    panel's PanelPlan, if known, for the X2 V-score Gerber. Raises
+    PanelizerError if any job failed. Returns the zip path.
+    """
+    from .plan import PanelizerError
+
+    zip_path = zip_path or fab_zip_path(board_path)
+    jobs = jobs or os.cpu_count() or 1
+    out_dir = tempfile.mkdtemp(prefix="panel_fab_")
+    try:
+        results = run_jobs(plan_jobs(board_path, out_dir, jobs), jobs)
+        errors = [e for _, e in results if e]
+        if errors:
+            raise PanelizerError("Fab output failed:\n\n" + "\n".join(errors), "Fab Output")
+        paths = [p for ps, _ in results for p in ps]
+
+        if plan is not None and plan.cuts:
+            from .gerber_sr import vcut_gerber
+            stem = os.path.splitext(os.path.basename(board_path))[0]
+            path = os.path.join(out_dir, stem + "-VScore.gbr")
+            with open(path, "w") as f:
+                f.write(vcut_gerber(plan))
+            paths.append(path)
+
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+            for path in sorted(set(paths)):
+                z.write(path, os.path.basename(path))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return zip_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="panelizer_plugin.fab_export",
+                                     description="Write the fab output of a saved panel as one zip.")
+    parser.add_argument("board", help="panel .kicad_pcb")
+    parser.add_argument("-o", "--output", help="zip to write (default: <board>_fab.zip)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    print(export_fab(args.board, args.output, args.jobs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
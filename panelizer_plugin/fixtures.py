@@ -0,0 +1,145 @@
+"""
+Fiducials and tooling holes on the panel frame, and clearance for tabs.
+
+Fixtures go into the corners of the rails between the frame and the array.
+Each one starts at its corner and slides along the rails towards the middle
+until it is off every cell, clear of copper by its keep-out and clear of the
+fixtures already placed. Copper queries go through a spatial.PanelIndex, so
+a candidate costs the few buckets around it, not a scan of the panel.
+
+settings keys:
+    fiducials        -- number of fiducials, 0 to 4 (default 0)
+    tooling_holes    -- number of tooling holes, 0 to 4 (default 0)
+    fiducial_mm      -- copper dot diameter
+    tooling_hole_mm  -- NPTH drill diameter
+    tab_clearance_mm -- copper clearance of mousebite tabs
+
+Tabs that follow the board outline (tab_mode "outline") are placed here too,
+see outline_tabs.py.
+"""
+import copy
+
+from .plan import Fixture, PanelizerError, from_mm, to_mm
+from .spatial import PanelIndex
+from . import mousebites, outline_tabs
+
+FIDUCIAL_MM = 1.0
+FIDUCIAL_MASK_MM = 2.0          # solder mask opening around the dot
+FIDUCIAL_KEEPOUT_MM = 1.5       # copper-free ring beyond the mask opening
+TOOLING_HOLE_MM = 3.0
+TOOLING_KEEPOUT_MM = 1.0
+TAB_CLEARANCE_MM = 0.5
+
+# Corner order: tooling holes and fiducials fill them in this order, so
+# three of either make an asymmetric pattern
+CORNERS = ("top left", "top right", "bottom left", "bottom right")
+
+
+def requested(settings):
+    return bool(int(settings.get("fiducials", 0) or 0) or int(settings.get("tooling_holes", 0) or 0))
+
+
+def _candidates(plan, corner, radius):
+    """
+    Centres for a fixture of `radius` at `corner`, nearest the corner first,
+    alternating along the horizontal and the vertical rail.
+    """
+    f = plan.frame
+    inset = plan.frame_width + radius
+    right, bottom = corner in ("top right", "bottom right"), corner in ("bottom left", "bottom right")
+    x0 = f.x + f.w - inset if right else f.x + inset
+    y0 = f.y + f.h - inset if bottom else f.y + inset
+    sx = -1 if right else 1
+    sy = -1 if bottom else 1
+    step = max(radius, 1)
+    reach = min(f.w, f.h) / 3.0
+    yield x0, y0
+    k = 1
+    while k * step <= reach:
+        yield x0 + sx * k * step, y0
+        yield x0, y0 + sy * k * step
+        k += 1
+
+
+def _place(plan, index, kind, corner, size, outer, keepout, placed):
+    """
+    First free centre for one fixture whose footprint reaches `outer` (IU)
+    from its centre, or None.
+    """
+    f = plan.frame
+    margin = plan.frame_width / 2.0 + outer
+    for x, y in _candidates(plan, corner, outer):
+        if not (f.x + margin <= x <= f.x + f.w - margin and f.y + margin <= y <= f.y + f.h - margin):
+            continue
+        rect = (x - outer, y - outer, x + outer, y + outer)
+        if index.on_board(rect, plan.gap / 2.0):
+            continue
+        if any(abs(x - p[0].x) < outer + p[1] + keepout and abs(y - p[0].y) < outer + p[1] + keepout
+               for p in placed):
+            continue
+        if index.hits(rect, keepout):
+            continue
+        return Fixture(kind, x, y, size)
+    return None
+
+
+def place_fixtures(plan, index, settings):
+    """
+    Tooling holes, then fiducials, for `plan`. Returns (Fixtures, report
+    lines for the ones that found no room).
+    """
+    n_tooling = max(0, min(4, int(settings.get("tooling_holes", 0) or 0)))
+    n_fiducials = max(0, min(4, int(settings.get("fiducials", 0) or 0)))
+    hole = from_mm(settings.get("tooling_hole_mm", TOOLING_HOLE_MM))
+    dot = from_mm(settings.get("fiducial_mm", FIDUCIAL_MM))
+    mask = max(dot, from_mm(FIDUCIAL_MASK_MM))
+
+    wanted = [("tooling", c, hole, hole / 2.0, from_mm(TOOLING_KEEPOUT_MM)) for c in CORNERS[:n_tooling]]
+    wanted += [("fiducial", c, dot, mask / 2.0, from_mm(FIDUCIAL_KEEPOUT_MM)) for c in CORNERS[:n_fiducials]]
+
+    placed, report = [], []
+    for kind, corner, size, outer, keepout in wanted:
+        fixture = _place(plan, index, kind, corner, size, outer, keepout, placed)
+        if fixture is None:
+            report.append("No room for the {} {} on the frame; widen the panel margins".format(
+                corner, "tooling hole" if kind == "tooling" else "fiducial"))
+            continue
+        placed.append((fixture, outer))
+    return tuple(p[0] for p in placed), report
+
+
+def place(plan, copper, settings, outline=None):
+    """
+    `plan` with its mousebite tabs moved clear of copper and its fixtures
+    placed, using `copper` (a spatial.CopperIndex, or a callable returning
+    one, so it is only built when needed). `outline` is the source board's
+    outline.Outline, needed when tabs follow it. The cached plan is not
+    modified; a copy is returned when anything changes. Returns (plan,
+    report lines).
+    """
+    follow = outline_tabs.wanted(settings, plan)
+    if not plan.tabs and not requested(settings) and not follow:
+        return plan, []
+    if callable(copper):
+        copper = copper()
+    index = PanelIndex(plan, copper)
+    placed = copy.copy(plan)
+    report = []
+    clearance = from_mm(settings.get("tab_clearance_mm", TAB_CLEARANCE_MM))
+
+    if follow:
+        if not outline:
+            raise PanelizerError("Tabs can only follow a closed Edge.Cuts outline.", "Mousebites")
+        template = mousebites.load_template(plan.gap)
+        placed.tabs = ()
+        placed.outline_tabs = outline_tabs.for_outline(outline, template, plan, settings, copper, clearance)
+        report.extend("No straight, copper-free spot for the mousebite tab near ({:.2f}, {:.2f}) mm".format(
+            to_mm(x), to_mm(y)) for x, y in placed.outline_tabs.blocked)
+    elif plan.tabs:
+        placed.tabs, blocked = mousebites.clear_tabs(plan, index, clearance)
+        report.extend("Mousebite tab at ({:.2f}, {:.2f}) mm has copper within {:g} mm".format(
+            to_mm(x), to_mm(y), to_mm(clearance)) for x, y in blocked)
+    if requested(settings):
+        placed.fixtures, missing = place_fixtures(plan, index, settings)
+        report.extend(missing)
+    return placed, report
@@ -0,0 +1,382 @@
+"""
+Fab output for a panel without building it.
+
+The source board is plotted once through pcbnew's PLOT_CONTROLLER and drilled
+once through EXCELLON_WRITER. Each file is then rewritten so the fab house
+repeats it: Gerber layers get one Gerber X2 step-and-repeat block (%SR%)
+around the board's graphics, drill files get one Excellon pattern
+(M25/M01, one M02 offset per copy) per tool. The panel frame, the V-score
+lines come from the PanelPlan and are written once, outside the repeated
+blocks. Mousebite and routed panels need their outline milled around the
+tabs, which takes polygon booleans, so they are rejected.
+
+The output is the size of one board plus the frame, whatever the cell count.
+%SR% can only express a regular grid of upright copies, so rotated, flipped
+or irregular layouts are rejected; use the pcbnew engine and plot the panel
+board instead.
+
+Coordinates in the plan are KiCad internal units (nm, y down); Gerber and
+Excellon files from KiCad have y up.
+"""
+import os
+import re
+from collections import namedtuple
+
+import pcbnew
+from .plan import plan_panel, check_plan, PanelizerError, to_mm
+from .autofit import fit_settings
+from .utils import get_board_bbox
+from .snapshot import BoardSnapshot
+from .spatial import CopperIndex
+from . import fixtures, routing, thieving, validate
+
+# Technical layers plotted besides the enabled copper layers
+TECH_LAYERS = ("F_Paste", "B_Paste", "F_SilkS", "B_SilkS", "F_Mask", "B_Mask", "Edge_Cuts")
+
+# Regular grid of copies. `x`, `y` is the offset (IU) of the bottom left cell
+# from the source cell, the one %SR% starts from; steps are IU.
+StepRepeat = namedtuple("StepRepeat", "x y cols rows step_x step_y")
+
+_FS_RE = re.compile(r"^%FS[LT]AX(\d)(\d)Y(\d)(\d)\*%$")
+_COORD_RE = re.compile(r"([XY])([+-]?\d+)")
+_APERTURE_RE = re.compile(r"^%ADD(\d+)")
+_TOOL_RE = re.compile(r"^T(\d+)$")
+
+
+def step_repeat(plan):
+    """
+    The StepRepeat of `plan`. Raises PanelizerError if its cells are not a
+    full grid of upright copies.
+    """
+    if plan.transformed:
+        raise PanelizerError("Step-and-repeat output cannot rotate or flip cells; "
+                             "use the pcbnew engine for this layout.", "Unsupported")
+    xs = sorted(set(int(c.dx) for c in plan.cells))
+    ys = sorted(set(int(c.dy) for c in plan.cells))
+    step_x = xs[1] - xs[0] if len(xs) > 1 else 0
+    step_y = ys[1] - ys[0] if len(ys) > 1 else 0
+    grid = set((xs[0] + i * step_x, ys[0] + j * step_y) for i in range(len(xs)) for j in range(len(ys)))
+    if grid != set((int(c.dx), int(c.dy)) for c in plan.cells):
+        raise PanelizerError("Step-and-repeat output needs a regular grid of boards; "
+                             "use the pcbnew engine for this layout.", "Unsupported")
+    return StepRepeat(xs[0], ys[-1], len(xs), len(ys), step_x, step_y)
+
+
+def copy_offsets(plan):
+    """
+    (dx, dy) in IU of every copy relative to the source cell.
+    """
+    return [(int(c.dx), int(c.dy)) for c in plan.copies()]
+
+
+class GerberFormat(object):
+    """
+    Coordinate format of a Gerber file, from its %FS% and %MO% commands.
+    """
+    def __init__(self, decimals=6, inch=False):
+        self.decimals = decimals
+        self.inch = inch
+
+    @classmethod
+    def read(cls, lines):
+        fmt = cls()
+        for line in lines:
+            m = _FS_RE.match(line)
+            if m:
+                fmt.decimals = int(m.group(2))
+            elif line.startswith("%MOIN"):
+                fmt.inch = True
+        return fmt
+
+    def unit(self, iu):
+        """
+        IU as a decimal in the file's unit (for %SR% steps and apertures).
+        """
+        mm = to_mm(iu)
+        return mm / 25.4 if self.inch else mm
+
+    def coord(self, iu):
+        return int(round(self.unit(iu) * 10 ** self.decimals))
+
+    def xy(self, x, y):
+        # y flips: Gerber y points up
+        return "X{}Y{}".format(self.coord(x), self.coord(-y))
+
+
+def shift_coords(line, dx, dy):
+    """
+    Moves the X/Y words of one Gerber command by dx, dy file units. Arc
+    centre offsets (I/J) are relative and stay as they are.
+    """
+    if not line or line[0] in "%G" and not line.startswith(("G01X", "G02X", "G03X", "G01Y", "G02Y", "G03Y")):
+        return line
+
+    def sub(m):
+        d = dx if m.group(1) == "X" else dy
+        return "{}{}".format(m.group(1), int(m.group(2)) + d)
+    return _COORD_RE.sub(sub, line)
+
+
+def _split_gerber(lines):
+    """
+    (header, body, footer) of a plotted Gerber: the aperture list ends the
+    header, M02 is the footer.
+    """
+    end = len(lines)
+    while end and lines[end - 1].strip() in ("", "M02*"):
+        end -= 1
+    start = None
+    for i, line in enumerate(lines[:end]):
+        if line.startswith("G04 APERTURE END LIST"):
+            start = i + 1
+            break
+    if start is None:
+        start = next((i for i, line in enumerate(lines[:end]) if re.match(r"^D\d+\*$", line)), end)
+    return lines[:start], lines[start:end], lines[end:] or ["M02*"]
+
+
+def _segments(fmt, aperture, segments):
+    out = ["D{}*".format(aperture)]
+    for x1, y1, x2, y2 in segments:
+        out.append("{}D02*".format(fmt.xy(x1, y1)))
+        out.append("{}D01*".format(fmt.xy(x2, y2)))
+    return out
+
+
+def _frame_segments(plan):
+    f = plan.frame
+    corners = [(f.x, f.y), (f.x + f.w, f.y), (f.x + f.w, f.y + f.h), (f.x, f.y + f.h)]
+    return [corners[i] + corners[(i + 1) % 4] for i in range(4)]
+
+
+def step_repeat_gerber(text, sr, repeat=True, frame=None):
+    """
+    Rewrites a plotted single-board Gerber as a panel: the board's graphics
+    in one %SR% block (or dropped, with `repeat` False), then `frame` =
+    (width, segments) in IU drawn once.
+    """
+    lines = text.splitlines()
+    header, body, footer = _split_gerber(lines)
+    fmt = GerberFormat.read(header)
+    out = list(header)
+
+    aperture = None
+    if frame is not None:
+        used = [int(m.group(1)) for m in (_APERTURE_RE.match(line) for line in lines) if m]
+        aperture = max(used + [9]) + 1
+        out.append("%TA.AperFunction,Profile*%")
+        out.append("%ADD{}C,{:.6f}*%".format(aperture, fmt.unit(frame[0])))
+        out.append("%TD*%")
+
+    if repeat and body:
+        # %SR% steps towards +x/+y from the first copy, so the graphics move
+        # to the bottom left cell first
+        dx, dy = fmt.coord(sr.x), fmt.coord(-sr.y)
+        out.append("%SRX{}Y{}I{:.6f}J{:.6f}*%".format(
+            sr.cols, sr.rows, fmt.unit(sr.step_x), fmt.unit(sr.step_y)))
+        out.extend(shift_coords(line, dx, dy) for line in body)
+        out.append("%TD*%")
+        out.append("%SR*%")
+
+    if frame is not None:
+        out.append("%LPD*%")
+        out.extend(_segments(fmt, aperture, frame[1]))
+    out.extend(footer)
+    return "\n".join(out) + "\n"
+
+
+def vcut_gerber(plan):
+    """
+    The plan's V-score lines as a Gerber X2 file of their own.
+    """
+    fmt = GerberFormat()
+    out = [
+        "%TF.GenerationSoftware,PCB Panelizer*%",
+        "%TF.FileFunction,Vcut*%",
+        "%TF.FilePolarity,Positive*%",
+        "%FSLAX46Y46*%",
+        "%MOMM*%",
+        "%LPD*%",
+        "G01*",
+    ]
+    apertures = {}
+    for cut in plan.cuts:
+        apertures.setdefault(int(cut.width), 10 + len(apertures))
+    for width, d in sorted(apertures.items(), key=lambda a: a[1]):
+        out.append("%ADD{}C,{:.6f}*%".format(d, fmt.unit(width)))
+    for width, d in sorted(apertures.items(), key=lambda a: a[1]):
+        cuts = [(c.x1, c.y1, c.x2, c.y2) for c in plan.cuts if int(c.width) == width]
+        out.extend(_segments(fmt, d, cuts))
+    out.append("M02*")
+    return "\n".join(out) + "\n"
+
+
+def _excellon_coord(iu):
+    return "{:.3f}".format(to_mm(iu))
+
+
+def step_repeat_excellon(text, offsets):
+    """
+    Rewrites a KiCad drill file (metric, decimal) so every tool's hits are
+    one Excellon pattern repeated at `offsets` ((dx, dy) IU from the source).
+    """
+    lines = text.splitlines()
+    try:
+        end_header = lines.index("%")
+    except ValueError:
+        raise PanelizerError("Unexpected drill file format (no header end).", "Fab Output")
+    header, body = lines[:end_header], lines[end_header + 1:]
+
+    preamble, sections, tool = [], [], None
+    for line in body:
+        if line.strip() == "M30":
+            break
+        m = _TOOL_RE.match(line)
+        if m:
+            tool = [line]
+            sections.append(tool)
+        elif tool is None:
+            preamble.append(line)
+        else:
+            tool.append(line)
+
+    repeats = ["M02X{}Y{}".format(_excellon_coord(dx), _excellon_coord(-dy)) for dx, dy in offsets]
+    out = header + ["%"] + preamble
+    for section in sections:
+        out.append(section[0])
+        if len(section) > 1 and repeats:
+            out.append("M25")
+            out.extend(section[1:])
+            out.append("M01")
+            out.extend(repeats)
+            out.append("M08")
+        else:
+            out.extend(section[1:])
+    out.append("M30")
+    return "\n".join(out) + "\n"
+
+
+def plot_controller(board, out_dir):
+    """
+    A PLOT_CONTROLLER set up for X2 Gerbers of `board` into `out_dir`.
+    """
+    pctl = pcbnew.PLOT_CONTROLLER(board)
+    popt = pctl.GetPlotOptions()
+    popt.SetOutputDirectory(out_dir)
+    popt.SetPlotFrameRef(False)
+    popt.SetUseGerberX2format(True)
+    popt.SetUseGerberProtelExtensions(False)
+    popt.SetCreateGerberJobFile(False)
+    popt.SetUseAuxOrigin(False)
+    popt.SetGerberPrecision(6)
+    return pctl
+
+
+def plot_layers(board, out_dir, layers, fmt=None):
+    """
+    Plots each enabled layer of `layers` to its own file. Returns
+    {layer id: path}.
+    """
+    fmt = pcbnew.PLOT_FORMAT_GERBER if fmt is None else fmt
+    pctl = plot_controller(board, out_dir)
+    paths = {}
+    try:
+        for layer in layers:
+            if not board.IsLayerEnabled(layer):
+                continue
+            pctl.SetLayer(layer)
+            pctl.OpenPlotfile(board.GetLayerName(layer).replace(".", "_"), fmt, board.GetLayerName(layer))
+            pctl.PlotLayer()
+            paths[layer] = pctl.GetPlotFileName()
+    finally:
+        pctl.ClosePlot()
+    return paths
+
+
+def plot_source(board, out_dir):
+    """
+    Plots the enabled copper and technical layers of `board` once. Returns
+    {layer id: Gerber path}.
+    """
+    layers = list(board.GetEnabledLayers().CuStack())
+    layers.extend(getattr(pcbnew, name) for name in TECH_LAYERS)
+    return plot_layers(board, out_dir, layers)
+
+
+def drill_source(board, out_dir):
+    """
+    Writes the PTH and NPTH drill files of `board`. Returns their paths.
+    """
+    writer = pcbnew.EXCELLON_WRITER(board)
+    writer.SetOptions(False, False, pcbnew.VECTOR2I(0, 0), False)
+    writer.SetFormat(True, pcbnew.EXCELLON_WRITER.DECIMAL_FORMAT, 3, 3)
+    writer.SetRouteModeForOvalHoles(False)
+    writer.CreateDrillandMapFilesSet(out_dir, True, False)
+    stem = os.path.splitext(os.path.basename(board.GetFileName()))[0]
+    return os.path.join(out_dir, stem + "-PTH.drl"), os.path.join(out_dir, stem + "-NPTH.drl")
+
+
+def _rewrite(path, fn):
+    with open(path, "r") as f:
+        text = f.read()
+    with open(path, "w") as f:
+        f.write(fn(text))
+
+
+def export_panel(board, settings, out_dir):
+    """
+    Writes step-and-repeat Gerber and drill files for panelizing `board`
+    with `settings` into `out_dir`, without touching the board. Raises
+    PanelizerError if the panel cannot be built or is not a regular grid.
+    Returns the list of files written.
+    """
+    bbox = get_board_bbox(board)
+    if bbox is None:
+        raise PanelizerError("No Edge.Cuts found!", "Error")
+    board_rect = (bbox.GetX(), bbox.GetY(), bbox.GetWidth(), bbox.GetHeight())
+    if settings.get("autofit"):
+        settings = fit_settings(board_rect, settings, allow_rotation=False)
+    if fixtures.requested(settings):
+        raise PanelizerError("Step-and-repeat output cannot place fiducials or tooling holes; "
+                             "use the pcbnew engine.", "Unsupported")
+    if thieving.requested(settings):
+        raise PanelizerError("Step-and-repeat output cannot add rail thieving; "
+                             "use the pcbnew engine.", "Unsupported")
+    plan = plan_panel(board_rect, settings)
+    check_plan(plan)
+    if routing.wanted(plan):
+        raise PanelizerError("Step-and-repeat output cannot mill tabbed panel outlines "
+                             "(mousebites, routed tabs); "
+                             "use the pcbnew engine.", "Unsupported")
+    sr = step_repeat(plan)
+    snapshot = BoardSnapshot(board)
+    copper = CopperIndex(snapshot)
+    plan, _ = fixtures.place(plan, copper, settings, snapshot.outline())
+    validate.check(plan, settings, copper, snapshot.outline())
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    written = []
+    for layer, path in plot_source(board, out_dir).items():
+        if layer == pcbnew.Edge_Cuts:
+            # Only V-Cut panels get here: the board outlines give way to the frame
+            frame = (plan.frame_width, _frame_segments(plan))
+            _rewrite(path, lambda t: step_repeat_gerber(t, sr, False, frame))
+        else:
+            _rewrite(path, lambda t: step_repeat_gerber(t, sr))
+        written.append(path)
+
+    if plan.cuts:
+        stem = os.path.splitext(os.path.basename(board.GetFileName()))[0] or "board"
+        path = os.path.join(out_dir, stem + "-VScore.gbr")
+        with open(path, "w") as f:
+            f.write(vcut_gerber(plan))
+        written.append(path)
+
+    offsets = copy_offsets(plan)
+    pth, npth = drill_source(board, out_dir)
+    for path in (pth, npth):
+        if os.path.exists(path):
+            _rewrite(path, lambda t: step_repeat_excellon(t, offsets))
+            written.append(path)
+    return written
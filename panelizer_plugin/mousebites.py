@@ -0,0 +1,224 @@
+"""
+Mousebite tabs from the footprints in mousebite_libs/.
+
+Each .kicad_mod is parsed once into a MousebiteTemplate (its NPTH holes as
+arrays) and kept in an LRU cache keyed by gap, so a panel with hundreds of
+tabs reads at most one file. The holes for every tab on a cell side are
+placed in one NumPy pass; the applier then stamps them as copies of a single
+pad instead of loading a footprint per tab.
+
+The library mixes two drawings: the "-slot" footprints with Edge.Cuts lines
+are drawn for a vertical gap (Edge.Cuts at x = +/- gap / 2, one column of
+holes along y), the others for a horizontal gap (rows of holes at +/- y).
+parse_template() turns the vertical ones by 90 degrees, so every template
+is held for a horizontal gap (cells above and below, the tab crossing it
+along y) and rotated again for vertical gaps. Only the holes are used; the
+templates' silkscreen and marker graphics are not copied. Coordinates are
+KiCad internal units (nm).
+"""
+import functools
+import math
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+from .plan import PanelizerError, to_mm
+from .sexpr import parse, unquote, to_iu
+
+LIB_DIR = os.path.join(os.path.dirname(__file__), "mousebite_libs")
+
+_NAME_RE = re.compile(r"^mouse-bite-(\d+(?:\.\d+)?)mm-slot\.kicad_mod$")
+
+# holes  -- M x 2 array of hole centres relative to the tab centre
+# drills -- M drill diameters; sizes -- M pad diameters
+MousebiteTemplate = namedtuple("MousebiteTemplate", "name holes drills sizes")
+
+
+@functools.lru_cache(maxsize=1)
+def library():
+    """
+    {gap in IU: file path} for the shipped footprints. Where two files cover
+    the same gap ("2mm" and "2.0mm") the one whose holes all sit inside the
+    gap wins, then the shorter name.
+    """
+    found = {}
+    for name in sorted(os.listdir(LIB_DIR)):
+        m = _NAME_RE.match(name)
+        if m:
+            found.setdefault(to_iu(m.group(1)), []).append(os.path.join(LIB_DIR, name))
+    return dict((gap, paths[0] if len(paths) == 1 else min(paths, key=lambda p: (not _in_gap(p, gap), len(p))))
+                for gap, paths in found.items())
+
+
+def _in_gap(path, gap):
+    with open(path, "r", encoding="utf-8") as f:
+        holes = parse_template(f.read()).holes
+    return bool(np.all(np.abs(holes[:, 1]) <= gap / 2.0))
+
+
+def template_path(gap):
+    lib = library()
+    path = lib.get(int(gap))
+    if path is None:
+        raise PanelizerError(
+            "No mousebite footprint for a {:g} mm gap.\n\nAvailable: {} mm".format(
+                to_mm(gap), ", ".join("{:g}".format(to_mm(g)) for g in sorted(lib))),
+            "Mousebites")
+    return path
+
+
+def _drawn_vertical(root, holes):
+    """
+    True if a template is drawn for a vertical gap: its Edge.Cuts lines run
+    along y or, without any, its holes have fewer distinct x than y.
+    """
+    lines = []
+    for line in root.find_all("fp_line"):
+        layer = line.find("layer")
+        if layer is not None and unquote(layer.atoms()[0]) == "Edge.Cuts":
+            start, end = line.find("start").atoms(), line.find("end").atoms()
+            lines.append((abs(float(end[0]) - float(start[0])), abs(float(end[1]) - float(start[1]))))
+    if lines:
+        return all(dx < dy for dx, dy in lines)
+    if not len(holes):
+        return False
+    return len(np.unique(holes[:, 0])) < len(np.unique(holes[:, 1]))
+
+
+def parse_template(text, name=""):
+    """
+    Reads the NPTH holes of a footprint file's text, turned to the
+    horizontal-gap frame.
+    """
+    root = parse(text)
+    holes, drills, sizes = [], [], []
+    for pad in root.find_all("pad"):
+        atoms = pad.atoms()
+        if len(atoms) < 2 or atoms[1] != "np_thru_hole":
+            continue
+        at = pad.find("at").atoms()
+        drill = [a for a in pad.find("drill").atoms() if a != "oval"]
+        size = pad.find("size")
+        holes.append((to_iu(at[0]), to_iu(at[1])))
+        drills.append(to_iu(drill[0]))
+        sizes.append(to_iu(size.atoms()[0]) if size is not None else drills[-1])
+    if not name:
+        atoms = root.atoms()
+        name = unquote(atoms[0]) if atoms else ""
+    holes = np.array(holes, dtype=np.float64).reshape(-1, 2)
+    if _drawn_vertical(root, holes):
+        holes = np.column_stack((holes[:, 1], -holes[:, 0]))
+    return MousebiteTemplate(
+        name,
+        holes,
+        np.array(drills, dtype=np.int64),
+        np.array(sizes, dtype=np.int64),
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def load_template(gap):
+    """
+    The parsed template for a gap of `gap` IU. Raises PanelizerError if no
+    footprint matches.
+    """
+    path = template_path(gap)
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_template(f.read(), os.path.splitext(os.path.basename(path))[0])
+
+
+def hole_positions(template, edge):
+    """
+    Hole centres for every tab of a TabEdge in one pass. Returns (N*M x 2
+    positions, N*M drills, N*M pad sizes), tab by tab.
+    """
+    points = np.asarray(edge.points, dtype=np.float64).reshape(-1, 2)
+    a = math.radians(edge.angle)
+    c, s = math.cos(a), math.sin(a)
+    # KiCad rotation, y pointing down
+    rot = np.array([[c, -s], [s, c]])
+    holes = template.holes.dot(rot)
+    pos = (points[:, None, :] + holes[None, :, :]).reshape(-1, 2)
+    n = len(points)
+    return np.rint(pos).astype(np.int64), np.tile(template.drills, n), np.tile(template.sizes, n)
+
+
+def plan_holes(plan):
+    """
+    Every mousebite hole of `plan` as (positions, drills, sizes) arrays.
+    """
+    tabs = plan.outline_tabs
+    if tabs is not None:
+        from .outline_tabs import cell_holes
+        n = len(plan.cells)
+        return (cell_holes(plan, tabs).reshape(-1, 2),
+                np.tile(tabs.drills, n), np.tile(tabs.sizes, n))
+    if not plan.tabs:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    template = load_template(plan.gap)
+    parts = [hole_positions(template, edge) for edge in plan.tabs]
+    return tuple(np.concatenate(p) for p in zip(*parts))
+
+
+def tab_extent(template):
+    """
+    Half width and half height of a tab's holes, for a horizontal gap.
+    """
+    if not len(template.holes):
+        return 0.0, 0.0
+    r = template.sizes / 2.0
+    return (float(np.max(np.abs(template.holes[:, 0]) + r)),
+            float(np.max(np.abs(template.holes[:, 1]) + r)))
+
+
+def _slide_offsets(step, lo, hi):
+    """
+    0, +step, -step, +2 step, ... while inside [lo, hi].
+    """
+    yield 0.0
+    if step <= 0:
+        return
+    k = 1
+    while k * step <= max(hi, -lo):
+        for off in (k * step, -k * step):
+            if lo <= off <= hi:
+                yield off
+        k += 1
+
+
+def clear_tabs(plan, index, clearance):
+    """
+    Slides every tab of `plan` along its gap until its holes keep
+    `clearance` from the copper of the cells on either side, using a
+    spatial.PanelIndex. Tabs stay between their neighbours and inside the
+    shared stretch of the two cell sides. Returns (TabEdges, the (x, y)
+    of tabs with no clear spot, left where the planner put them).
+    """
+    if not plan.tabs:
+        return (), []
+    hx, hy = tab_extent(load_template(plan.gap))
+    tabs, blocked = [], []
+    for edge in plan.tabs:
+        axis = 0 if edge.angle == 0.0 else 1
+        ex, ey = (hx, hy) if axis == 0 else (hy, hx)
+        points = list(edge.points)
+        for k, p in enumerate(points):
+            # Clear of the (possibly moved) previous tab, short of halfway
+            # to the next one
+            lo, hi = edge.start + hx, edge.end - hx
+            if k:
+                lo = max(lo, points[k - 1][axis] + 2 * hx)
+            if k + 1 < len(points):
+                hi = min(hi, (p[axis] + points[k + 1][axis]) / 2.0)
+            lo, hi = lo - p[axis], hi - p[axis]
+            for off in _slide_offsets(hx, lo, hi):
+                x, y = (p[0] + off, p[1]) if axis == 0 else (p[0], p[1] + off)
+                if not index.hits((x - ex, y - ey, x + ex, y + ey), clearance):
+                    points[k] = (x, y)
+                    break
+            else:
+                blocked.append(p)
+        tabs.append(edge._replace(points=tuple(points)))
+    return tuple(tabs), blocked
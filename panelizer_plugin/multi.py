@@ -0,0 +1,314 @@
+"""
+Panels that mix several designs.
+
+    python -m panelizer_plugin.multi recipe.json [-o panel.kicad_pcb]
+
+settings["designs"] lists the source boards and how many of each go on the
+panel:
+
+    "designs": [{"path": "sensor.kicad_pcb", "qty": 6},
+                {"path": "main.kicad_pcb", "qty": 2}]
+
+Relative paths are taken from the recipe's directory (or, in the dialog,
+the open board's).
+
+Every file is loaded once into a DesignCache: the board, its BoardSnapshot
+(items, Edge.Cuts bbox, outline) and the net codes of its items. The
+instances are then packed by pack_shelves(), first-fit decreasing height:
+tallest first, each board goes on the first shelf with room left, and a new
+shelf opens below the last one when none has. Boards keep `gap` to each
+other and to the frame.
+
+Each instance is stamped with applier.replicate_cell(), the same
+Duplicate/Move path as a regular panel, from its design's cached items, so
+a design placed 20 times is read from disk and walked once. Nets are
+matched to the panel board by name, one table per design.
+
+settings keys (besides gap_mm, panel_w_mm and panel_h_mm):
+    designs         -- [{"path": ..., "qty": n}, ...]
+    allow_rotation  -- lay boards on their long side when that fits
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import pcbnew
+from .applier import replicate_cell
+from .plan import Cell, PanelizerCancelled, PanelizerError, Rect, from_mm, to_mm
+from .profiling import NULL_PROFILE
+from .snapshot import BoardSnapshot
+from .utils import add_rect_edge_cuts
+from . import nets
+
+ORIGIN_MM = 20.0             # top left of the frame on the sheet
+
+# design -- index into MixedPlan.designs; cell -- where its copy goes
+Instance = namedtuple("Instance", "design cell")
+
+
+class Design(object):
+    """
+    One source board, loaded once: `board`, `snapshot`, `rect` (Edge.Cuts
+    bbox), `items` to stamp and their net `codes`.
+    """
+    def __init__(self, path, stamp=None):
+        self.path = path
+        self.stamp = stamp
+        self.board = pcbnew.LoadBoard(path)
+        self.snapshot = BoardSnapshot(self.board)
+        if self.snapshot.bbox is None:
+            raise PanelizerError("{}: no Edge.Cuts found!".format(path), "Mixed Panel")
+        self.rect = Rect(*self.snapshot.board_rect)
+        self.items = self.snapshot.source_items()
+        self.codes = nets.source_codes(self.items)
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    def outline(self):
+        return self.snapshot.outline()
+
+
+class DesignCache(object):
+    """
+    Loaded Designs by absolute path. A file is loaded again only when its
+    modification time or size changed.
+    """
+    def __init__(self):
+        self.designs = {}
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise PanelizerError("Design not found: {}".format(path), "Mixed Panel")
+        stamp = (st.st_mtime, st.st_size)
+        design = self.designs.get(path)
+        if design is None or design.stamp != stamp:
+            design = self.designs[path] = Design(path, stamp)
+        return design
+
+
+def wanted(settings):
+    return bool(settings.get("designs"))
+
+
+def design_list(settings, base_dir=None):
+    """
+    [(path, qty)] from settings["designs"], paths made absolute against
+    `base_dir`.
+    """
+    out = []
+    for entry in settings.get("designs") or ():
+        path = entry["path"]
+        if base_dir and not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        qty = int(entry.get("qty", 1))
+        if qty > 0:
+            out.append((os.path.abspath(path), qty))
+    return out
+
+
+def pack_shelves(sizes, width, height, gap, allow_rotation=False):
+    """
+    First-fit decreasing height shelf packing of `sizes` [(w, h)] into a
+    `width` x `height` area with `gap` between items. Returns one (x, y,
+    rotated) per item, or None for items that did not fit.
+    """
+    dims = []
+    for w, h in sizes:
+        # Lying on the long side keeps shelves low
+        rotated = allow_rotation and h > w and h <= width
+        dims.append((h, w, True) if rotated else (w, h, False))
+    order = sorted(range(len(dims)), key=lambda i: (-dims[i][1], -dims[i][0], i))
+
+    placed = [None] * len(dims)
+    shelves = []             # [y, height, next free x]
+    for i in order:
+        w, h, rotated = dims[i]
+        for shelf in shelves:
+            if h <= shelf[1] and shelf[2] + w <= width:
+                placed[i] = (shelf[2], shelf[0], rotated)
+                shelf[2] += w + gap
+                break
+        else:
+            y = shelves[-1][0] + shelves[-1][1] + gap if shelves else 0
+            if w > width or y + h > height:
+                continue
+            shelves.append([y, h, w + gap])
+            placed[i] = (0, y, rotated)
+    return placed
+
+
+class MixedPlan(object):
+    """
+    Where every instance of every design goes. `designs` are the source
+    Rects; cells are numbered (0, n) in packing order.
+    """
+    def __init__(self, designs, gap, panel_w, panel_h):
+        self.designs = designs
+        self.gap = gap
+        self.panel_w = panel_w
+        self.panel_h = panel_h
+        self.frame = Rect(from_mm(ORIGIN_MM), from_mm(ORIGIN_MM), panel_w, panel_h)
+        self.frame_width = gap
+        self.instances = []
+        self.unplaced = []       # design index of every board that did not fit
+
+    def cell_rect(self, instance):
+        b = self.designs[instance.design]
+        cell = instance.cell
+        w, h = (b.w, b.h) if cell.rotation % 180 == 0 else (b.h, b.w)
+        return Rect(b.x + cell.dx, b.y + cell.dy, w, h)
+
+
+def plan_mixed(rects, counts, gap, panel_w, panel_h, allow_rotation=False):
+    """
+    Packs `counts[i]` copies of each design bbox `rects[i]` onto the panel.
+    The packed boards are centred in the frame.
+    """
+    plan = MixedPlan([Rect(*r) for r in rects], gap, panel_w, panel_h)
+    which = [i for i, n in enumerate(counts) for _ in range(n)]
+    sizes = [(plan.designs[i].w, plan.designs[i].h) for i in which]
+    spots = pack_shelves(sizes, panel_w - 2 * gap, panel_h - 2 * gap, gap, allow_rotation)
+
+    boxes = []
+    for i, (w, h), spot in zip(which, sizes, spots):
+        if spot is None:
+            plan.unplaced.append(i)
+            continue
+        x, y, rotated = spot
+        boxes.append((i, x, y, rotated, (h, w) if rotated else (w, h)))
+    if not boxes:
+        return plan
+
+    used_w = max(x + size[0] for _, x, _, _, size in boxes)
+    used_h = max(y + size[1] for _, _, y, _, size in boxes)
+    f = plan.frame
+    ox = f.x + (panel_w - used_w) // 2
+    oy = f.y + (panel_h - used_h) // 2
+    for n, (i, x, y, rotated, _) in enumerate(boxes):
+        b = plan.designs[i]
+        cell = Cell(0, n, ox + x - b.x, oy + y - b.y, 90 if rotated else 0, False)
+        plan.instances.append(Instance(i, cell))
+    return plan
+
+
+def check_mixed(plan, names):
+    if plan.unplaced:
+        missing = {}
+        for i in plan.unplaced:
+            missing[names[i]] = missing.get(names[i], 0) + 1
+        raise PanelizerError("Not every board fits on the {:.1f} x {:.1f} mm panel. Left over:\n\n{}".format(
+            to_mm(plan.panel_w), to_mm(plan.panel_h),
+            "\n".join("{} x {}".format(n, name) for name, n in sorted(missing.items()))), "Panel Too Small")
+
+
+def net_table(board, design):
+    """
+    Source net code of `design` -> net of the same name on `board`, created
+    when missing.
+    """
+    existing = dict((net.GetNetname(), net) for net in board.GetNetsByNetcode().values())
+    by_code = design.board.GetNetsByNetcode()
+    table = {}
+    for code, net in by_code.items():
+        if not code:
+            continue
+        name = net.GetNetname()
+        target = existing.get(name)
+        if target is None:
+            target = existing[name] = pcbnew.NETINFO_ITEM(board, name)
+            board.Add(target)
+        table[code] = target
+    return table
+
+
+def panelize_mixed(board, settings, cache=None, base_dir=None, add=None, profile=NULL_PROFILE, progress=None):
+    """
+    Builds the mixed panel of settings["designs"] on `board`, which should
+    be empty. Returns (MixedPlan, created items). `progress(done, total)` is
+    called after every board; if it returns False PanelizerCancelled is
+    raised, and items already handed to `add` are the caller's to revert.
+    """
+    cache = cache or DesignCache()
+    entries = design_list(settings, base_dir)
+    if not entries:
+        raise PanelizerError("The recipe lists no designs.", "Mixed Panel")
+    with profile.phase("load"):
+        designs = [cache.get(path) for path, _ in entries]
+    gap = from_mm(settings["gap_mm"])
+    plan = plan_mixed([d.rect for d in designs], [n for _, n in entries], gap,
+                      from_mm(settings["panel_w_mm"]), from_mm(settings["panel_h_mm"]),
+                      bool(settings.get("allow_rotation")))
+    check_mixed(plan, [d.name for d in designs])
+
+    layers = max(d.board.GetCopperLayerCount() for d in designs)
+    if layers > board.GetCopperLayerCount():
+        board.SetCopperLayerCount(layers)
+    with profile.phase("nets"):
+        tables = [net_table(board, d) for d in designs]
+
+    add = add or board.Add
+    items = []
+    for n, inst in enumerate(plan.instances):
+        d = designs[inst.design]
+        dups = replicate_cell(board, inst.cell, d.items, add, profile, d.rect)
+        with profile.phase("nets"):
+            profile.count("SetNet", nets.assign(dups, d.codes, tables[inst.design]))
+        items.extend(dups)
+        if progress is not None and not progress(n + 1, len(plan.instances)):
+            raise PanelizerCancelled()
+    f = plan.frame
+    with profile.phase("frame"):
+        items.extend(add_rect_edge_cuts(board, f.x, f.y, f.w, f.h, width=plan.frame_width, add=add))
+    return plan, items
+
+
+def new_board():
+    """
+    An empty board to build a panel on; CreateEmptyBoard() sets up the
+    project KiCad 7+ expects.
+    """
+    create = getattr(pcbnew, "CreateEmptyBoard", None)
+    return create() if create is not None else pcbnew.BOARD()
+
+
+def main(argv=None):
+    from .recipe import RECIPE_SUFFIX, OutputCache, load_recipe
+
+    parser = argparse.ArgumentParser(prog="panelizer_plugin.multi", description="Build a panel of mixed designs.")
+    parser.add_argument("recipe", help="recipe or settings JSON with a \"designs\" list")
+    parser.add_argument("-o", "--output", help="panel file (default: <recipe>_panel.kicad_pcb)")
+    parser.add_argument("--no-cache", action="store_true", help="always build, even when nothing changed")
+    parser.add_argument("--cache-dir", default=None, help="output cache directory")
+    args = parser.parse_args(argv)
+
+    settings = load_recipe(args.recipe)
+    base_dir = os.path.dirname(os.path.abspath(args.recipe))
+    stem = args.recipe[:-len(RECIPE_SUFFIX)] if args.recipe.endswith(RECIPE_SUFFIX) else os.path.splitext(args.recipe)[0]
+    dst = args.output or stem + "_panel.kicad_pcb"
+    try:
+        paths = [p for p, _ in design_list(settings, base_dir)]
+        cache = None if args.no_cache else OutputCache(args.cache_dir)
+        key = cache.key(settings, "mixed", *paths) if cache is not None and paths else None
+        if key is not None and cache.restore(key, "panel", dst):
+            print("{} -> {} (cached)".format(args.recipe, dst))
+            return 0
+        board = new_board()
+        plan, _ = panelize_mixed(board, settings, base_dir=base_dir)
+        pcbnew.SaveBoard(dst, board)
+        if key is not None:
+            cache.store(key, "panel", dst)
+    except (PanelizerError, OSError, KeyError, ValueError) as e:
+        print("FAILED {}: {}".format(args.recipe, e), file=sys.stderr)
+        return 1
+    print("{} -> {} ({} boards)".format(args.recipe, dst, len(plan.instances)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
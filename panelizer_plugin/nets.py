@@ -0,0 +1,120 @@
+"""
+Per-cell nets: every copy gets its own set of nets instead of sharing the
+source board's.
+
+Duplicate() keeps the source net of every track, pad and zone, so without
+this the GND of every cell on the panel is one net, and connectivity,
+ratsnest and DRC work on panel-sized nets. With net_mode "per_cell" each
+source net `name` becomes `Board_r<row>c<col>/name` in every copy.
+
+The work is split so nothing per item touches a string:
+
+- source_codes() reads the net codes of the source items once, in item
+  order (a tuple of pad codes for footprints).
+- NetRemap creates all nets of a cell in one go, the first time the cell is
+  built, and keeps a source code -> NETINFO_ITEM table per cell. The nets
+  go through the same `add` (a commit's Add) as the cell's items, so a
+  cancel or undo takes them off the board with the copies.
+- assign() walks the duplicates of a cell next to the code list and sets
+  each net by table lookup.
+
+The source cell keeps the original nets. Nets of cells that leave the
+panel stay on the board (unused) and are reused if the cell comes back.
+"""
+import pcbnew
+
+NET_MODES = ("shared", "per_cell")
+NET_NAME = "Board_r{row}c{col}/{name}"
+
+
+def wanted(settings):
+    return settings.get("net_mode", "shared") == "per_cell"
+
+
+def cell_net_name(key, name):
+    row, col = key
+    if name.startswith("/"):
+        name = name[1:]
+    return NET_NAME.format(row=row + 1, col=col + 1, name=name)
+
+
+def source_codes(items):
+    """
+    Net code of every item in `items` (None for items without a net, a
+    tuple of pad codes for footprints), in the same order.
+    """
+    codes = []
+    for item in items:
+        cls = item.GetClass()
+        if cls == "FOOTPRINT":
+            pads = tuple(p.GetNetCode() for p in item.Pads())
+            codes.append(pads if any(pads) else None)
+        elif cls in ("PCB_TRACK", "PCB_VIA", "PCB_ARC", "ZONE"):
+            codes.append(item.GetNetCode() or None)
+        else:
+            codes.append(None)
+    return codes
+
+
+class NetRemap(object):
+    """
+    Source net code -> per-cell NETINFO_ITEM, one table per cell.
+    """
+    def __init__(self, board, codes):
+        self.board = board
+        used = set()
+        for c in codes:
+            if isinstance(c, tuple):
+                used.update(c)
+            elif c:
+                used.add(c)
+        used.discard(0)
+        by_code = board.GetNetsByNetcode()
+        self.names = dict((code, by_code[code].GetNetname()) for code in sorted(used) if code in by_code)
+        # Nets left on the board by an earlier run, by name
+        self.existing = dict((net.GetNetname(), net) for net in by_code.values())
+        self.tables = {}
+
+    def table(self, key, add=None):
+        """
+        The code -> net table of cell `key` = (row, col), creating the
+        cell's nets with `add` (board.Add by default) on first use. Nets
+        already on the board (from an earlier run) are reused.
+        """
+        table = self.tables.get(key)
+        if table is not None:
+            return table
+        add = add or self.board.Add
+        table = {}
+        for code, name in self.names.items():
+            net_name = cell_net_name(key, name)
+            net = self.existing.get(net_name)
+            if net is None:
+                net = pcbnew.NETINFO_ITEM(self.board, net_name)
+                add(net)
+            table[code] = net
+        self.tables[key] = table
+        return table
+
+
+def assign(items, codes, table):
+    """
+    Moves the duplicates `items` (in source order, see source_codes())
+    onto the nets of `table`. Returns the number of nets set.
+    """
+    n = 0
+    for item, code in zip(items, codes):
+        if code is None:
+            continue
+        if isinstance(code, tuple):
+            for pad, c in zip(item.Pads(), code):
+                net = table.get(c)
+                if net is not None:
+                    pad.SetNet(net)
+                    n += 1
+        else:
+            net = table.get(code)
+            if net is not None:
+                item.SetNet(net)
+                n += 1
+    return n
@@ -0,0 +1,331 @@
+"""
+Edge.Cuts outline engine.
+
+Turns a bag of outline primitives (segments, arcs, circles, rectangles,
+polygons, beziers) into closed loops, and sorts the loops into board outlines
+and the cutouts inside them. Nothing here touches pcbnew; utils.py converts
+PCB_SHAPEs into primitives and the result back into a SHAPE_POLY_SET.
+
+- Endpoints are snapped to a `tolerance` grid and looked up through a hash
+  index, so chaining is linear in the number of primitives.
+- Arcs, circles and beziers are discretized so no chord deviates from the
+  true curve by more than `max_error`.
+
+Coordinates are KiCad internal units (nm).
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_TOLERANCE = 100      # nm, endpoint snapping
+DEFAULT_MAX_ERROR = 5000     # nm, chord error (KiCad's ARC_HIGH_DEF)
+MAX_ARC_SEGMENTS = 3600
+
+Segment = namedtuple("Segment", "start end")
+Arc = namedtuple("Arc", "start mid end")
+Circle = namedtuple("Circle", "center radius")
+RectShape = namedtuple("RectShape", "start end")
+Polygon = namedtuple("Polygon", "points")
+Bezier = namedtuple("Bezier", "start c1 c2 end")
+
+# A board outline (N x 2 array) and the holes inside it.
+OutlineLoop = namedtuple("OutlineLoop", "outline holes")
+
+
+class Outline(object):
+    """
+    Result of extract_loops().
+
+    loops       -- OutlineLoop per board outline, largest first.
+    open_chains -- number of chains that did not close; > 0 means the
+                   Edge.Cuts drawing is broken.
+    cache       -- results derived from this outline (e.g. outline tabs),
+                   keyed by their parameters.
+    """
+    def __init__(self, loops, open_chains):
+        self.loops = loops
+        self.open_chains = open_chains
+        self.cache = {}
+
+    def __bool__(self):
+        return bool(self.loops)
+
+    def __iter__(self):
+        return iter(self.loops)
+
+
+# ----------------------------------------------------------------------
+# Discretization
+# ----------------------------------------------------------------------
+
+def segments_for_arc(radius, sweep, max_error=DEFAULT_MAX_ERROR):
+    """
+    Number of chords needed so an arc of `radius` and `sweep` (radians) never
+    deviates more than `max_error` from its chords.
+    """
+    if radius <= max_error:
+        return max(1, int(math.ceil(abs(sweep) / (math.pi / 2))))
+    step = 2.0 * math.acos(1.0 - max_error / radius)
+    return min(MAX_ARC_SEGMENTS, max(1, int(math.ceil(abs(sweep) / step))))
+
+
+def arc_center(start, mid, end):
+    """
+    Center of the circle through three points, or None if they are collinear.
+    """
+    ax, ay = start
+    bx, by = mid
+    cx, cy = end
+    d = 2.0 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if d == 0:
+        return None
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    return ((a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d,
+            (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d)
+
+
+def arc_sweep(start, mid, end, center):
+    """
+    Start angle and signed sweep (radians) of the arc start -> mid -> end.
+    """
+    a0 = math.atan2(start[1] - center[1], start[0] - center[0])
+    am = (math.atan2(mid[1] - center[1], mid[0] - center[0]) - a0) % (2 * math.pi)
+    ae = (math.atan2(end[1] - center[1], end[0] - center[0]) - a0) % (2 * math.pi)
+    if ae == 0:
+        ae = 2 * math.pi
+    if am < ae:
+        return a0, ae
+    return a0, ae - 2 * math.pi
+
+
+def arc_points(start, mid, end, max_error=DEFAULT_MAX_ERROR):
+    """
+    Vertices from `start` to `end` (both included) along the arc through `mid`.
+    """
+    center = arc_center(start, mid, end)
+    if center is None:
+        return np.array([start, end], dtype=float)
+    radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    a0, sweep = arc_sweep(start, mid, end, center)
+    n = segments_for_arc(radius, sweep, max_error)
+    angles = a0 + sweep * np.linspace(0.0, 1.0, n + 1)
+    pts = np.column_stack((center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)))
+    # Keep the exact endpoints so chaining still matches
+    pts[0] = start
+    pts[-1] = end
+    return pts
+
+
+def circle_points(center, radius, max_error=DEFAULT_MAX_ERROR):
+    """
+    Closed ring of vertices (last vertex not repeated).
+    """
+    n = max(8, segments_for_arc(radius, 2 * math.pi, max_error))
+    angles = np.linspace(0.0, 2 * math.pi, n, endpoint=False)
+    return np.column_stack((center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)))
+
+
+def bezier_points(start, c1, c2, end, max_error=DEFAULT_MAX_ERROR):
+    ctrl = np.array([start, c1, c2, end], dtype=float)
+    # Control polygon length bounds the curve length; chord error of a cubic
+    # shrinks with the square of the step, so this is conservative.
+    length = np.hypot(*np.diff(ctrl, axis=0).T).sum()
+    n = max(2, min(MAX_ARC_SEGMENTS, int(math.ceil(math.sqrt(length / max(max_error, 1)))) * 2))
+    t = np.linspace(0.0, 1.0, n + 1)[:, None]
+    u = 1.0 - t
+    pts = u ** 3 * ctrl[0] + 3 * u * u * t * ctrl[1] + 3 * u * t * t * ctrl[2] + t ** 3 * ctrl[3]
+    pts[0] = start
+    pts[-1] = end
+    return pts
+
+
+def primitive_points(prim, max_error=DEFAULT_MAX_ERROR):
+    """
+    Open vertex run (start to end) of a chainable primitive.
+    """
+    if isinstance(prim, Segment):
+        return np.array([prim.start, prim.end], dtype=float)
+    if isinstance(prim, Arc):
+        return arc_points(prim.start, prim.mid, prim.end, max_error)
+    if isinstance(prim, Bezier):
+        return bezier_points(prim.start, prim.c1, prim.c2, prim.end, max_error)
+    raise TypeError("Not a chainable primitive: {!r}".format(prim))
+
+
+def closed_points(prim, max_error=DEFAULT_MAX_ERROR):
+    """
+    Vertex ring of a primitive that is a loop on its own.
+    """
+    if isinstance(prim, Circle):
+        return circle_points(prim.center, prim.radius, max_error)
+    if isinstance(prim, RectShape):
+        (x0, y0), (x1, y1) = prim.start, prim.end
+        return np.array([(x0, y0), (x1, y0), (x1, y1), (x0, y1)], dtype=float)
+    if isinstance(prim, Polygon):
+        return np.asarray(prim.points, dtype=float)
+    raise TypeError("Not a closed primitive: {!r}".format(prim))
+
+
+# ----------------------------------------------------------------------
+# Chaining
+# ----------------------------------------------------------------------
+
+class _EndpointIndex(object):
+    """
+    Hash index of primitive endpoints on a `tolerance` grid. Lookups also
+    probe the 8 neighbouring cells, so two points closer than `tolerance`
+    always meet even when they round into different cells.
+    """
+    def __init__(self, tolerance):
+        self.tol = float(max(tolerance, 1))
+        self.cells = {}
+
+    def key(self, pt):
+        return (int(round(pt[0] / self.tol)), int(round(pt[1] / self.tol)))
+
+    def add(self, pt, entry):
+        self.cells.setdefault(self.key(pt), []).append((pt, entry))
+
+    def find(self, pt, used):
+        kx, ky = self.key(pt)
+        tol2 = self.tol * self.tol
+        for dx in (0, -1, 1):
+            for dy in (0, -1, 1):
+                for q, entry in self.cells.get((kx + dx, ky + dy), ()):
+                    if entry[0] in used:
+                        continue
+                    if (q[0] - pt[0]) ** 2 + (q[1] - pt[1]) ** 2 <= tol2:
+                        return entry
+        return None
+
+
+def _close_enough(a, b, tol):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 <= tol * tol
+
+
+def chain(primitives, tolerance=DEFAULT_TOLERANCE, max_error=DEFAULT_MAX_ERROR):
+    """
+    Chains primitives into vertex rings. Returns (loops, open_chain_count);
+    each loop is an N x 2 array without the closing vertex repeated.
+    """
+    loops = []
+    runs = []
+    index = _EndpointIndex(tolerance)
+
+    for prim in primitives:
+        if isinstance(prim, (Circle, RectShape, Polygon)):
+            pts = closed_points(prim, max_error)
+            if len(pts) >= 3:
+                loops.append(pts)
+            continue
+        i = len(runs)
+        runs.append(prim)
+        index.add(prim.start, (i, False))
+        index.add(prim.end, (i, True))
+
+    open_chains = 0
+    used = set()
+    for i, prim in enumerate(runs):
+        if i in used:
+            continue
+        used.add(i)
+        first = prim.start
+        parts = [primitive_points(prim, max_error)]
+        cursor = prim.end
+
+        while not _close_enough(cursor, first, tolerance):
+            hit = index.find(cursor, used)
+            if hit is None:
+                break
+            j, at_end = hit
+            used.add(j)
+            pts = primitive_points(runs[j], max_error)
+            if at_end:
+                # Matched the neighbour's end point: walk it backwards
+                pts = pts[::-1]
+                cursor = runs[j].start
+            else:
+                cursor = runs[j].end
+            parts.append(pts[1:])
+
+        if not _close_enough(cursor, first, tolerance):
+            open_chains += 1
+            continue
+        ring = np.concatenate(parts)[:-1]
+        if len(ring) >= 3:
+            loops.append(ring)
+
+    return loops, open_chains
+
+
+# ----------------------------------------------------------------------
+# Loop classification
+# ----------------------------------------------------------------------
+
+def signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def points_in_ring(points, ring):
+    """
+    Even-odd test of every row of `points` against `ring`, vectorized over
+    the ring's edges.
+    """
+    points = np.atleast_2d(points)
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    px = points[:, 0:1]
+    py = points[:, 1:2]
+    crosses = (y1 > py) != (y2 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xint = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+    inside = crosses & (px < xint)
+    return np.count_nonzero(inside, axis=1) % 2 == 1
+
+
+def classify(loops):
+    """
+    Groups rings into OutlineLoops. A ring nested inside an even number of
+    other rings is a board outline, an odd number makes it a cutout of its
+    innermost enclosing outline. Outlines are returned counter-clockwise (in
+    KiCad's Y-down frame, positive area), holes the other way round.
+    """
+    if not loops:
+        return []
+    areas = [abs(signed_area(r)) for r in loops]
+    order = sorted(range(len(loops)), key=lambda i: -areas[i])
+
+    parent = {}
+    depth = {}
+    for pos, i in enumerate(order):
+        probe = loops[i][0]
+        enclosing = None
+        # Only larger rings can enclose this one; the innermost is the last hit
+        for j in order[:pos]:
+            if points_in_ring(probe, loops[j])[0]:
+                enclosing = j
+        parent[i] = enclosing
+        depth[i] = 0 if enclosing is None else depth[enclosing] + 1
+
+    result = {}
+    for i in order:
+        ring = loops[i]
+        if depth[i] % 2 == 0:
+            if signed_area(ring) < 0:
+                ring = ring[::-1]
+            result[i] = OutlineLoop(ring, [])
+        else:
+            if signed_area(ring) > 0:
+                ring = ring[::-1]
+            result[parent[i]].holes.append(ring)
+    return [result[i] for i in order if i in result]
+
+
+def extract_loops(primitives, tolerance=DEFAULT_TOLERANCE, max_error=DEFAULT_MAX_ERROR):
+    """
+    Chains and classifies outline primitives. Returns an Outline.
+    """
+    loops, open_chains = chain(primitives, tolerance, max_error)
+    return Outline(classify(loops), open_chains)
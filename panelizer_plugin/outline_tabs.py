@@ -0,0 +1,252 @@
+"""
+Mousebite tabs along the board outline instead of between grid cells.
+
+The chained Edge.Cuts outline (outline.py, arcs already discretized) is
+parameterized by arc length. Tabs go evenly around it, one per
+`tab_spacing_mm` of outline, or at user anchors. Each tab then moves to the
+nearest spot where the outline is straight enough over the tab's length,
+outside every keep-out rectangle and clear of the board's copper. Its holes
+follow the outline: a template hole `along` the edge and `out` into the gap
+lands at arc length s + along, offset along the outward normal.
+
+All of this runs once per source outline, in source coordinates, and is
+memoized on the Outline. cell_holes() then moves the holes into every cell
+with one NumPy pass over the cell transforms.
+
+settings keys:
+    tab_mode          -- "edges" (tabs between facing cells, the default) or
+                         "outline"
+    tab_anchors       -- [[x_mm, y_mm], ...] on the source board; tabs go at
+                         the nearest outline point instead of evenly
+    tab_keepouts      -- [[x0_mm, y0_mm, x1_mm, y1_mm], ...] on the source
+                         board where no tab may go
+    tab_max_turn_deg  -- how much the outline may turn under one tab
+
+Coordinates are KiCad internal units (nm).
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .outline import signed_area
+from .plan import from_mm
+
+TAB_MODES = ("edges", "outline")
+MAX_TURN_DEG = 15.0
+SAMPLE_MM = 0.25             # spacing of candidate tab centres
+MAX_SAMPLES = 20000
+
+# points, normals -- N x 2 tab centres on the outline and outward normals
+# holes           -- N*M x 2 hole centres, tab by tab; drills, sizes -- N*M
+# blocked         -- (x, y) of the tabs that found no clear spot
+OutlineTabs = namedtuple("OutlineTabs", "points normals holes drills sizes blocked")
+
+
+def wanted(settings, plan):
+    return settings.get("tab_mode", "edges") == "outline" and plan.method == "Mousebites"
+
+
+class _Ring(object):
+    """
+    A closed outline ring parameterized by arc length.
+    """
+    def __init__(self, ring):
+        a = np.asarray(ring, dtype=np.float64)
+        b = np.roll(a, -1, axis=0)
+        length = np.hypot(b[:, 0] - a[:, 0], b[:, 1] - a[:, 1])
+        keep = length > 0
+        self.a = a[keep]
+        self.length = length[keep]
+        self.unit = (np.roll(a, -1, axis=0)[keep] - self.a) / self.length[:, None]
+        self.start = np.concatenate(([0.0], np.cumsum(self.length)))
+        self.perimeter = float(self.start[-1])
+        # Outward normal: (uy, -ux) for a positive signed area
+        side = 1.0 if signed_area(self.a) > 0 else -1.0
+        self.normal = side * np.column_stack((self.unit[:, 1], -self.unit[:, 0]))
+
+        # Turning angle at the start of every segment
+        prev = np.roll(self.unit, 1, axis=0)
+        cross = prev[:, 0] * self.unit[:, 1] - prev[:, 1] * self.unit[:, 0]
+        dot = np.einsum("ij,ij->i", prev, self.unit)
+        turns = np.abs(np.arctan2(cross, dot))
+        # Three laps, so windows can wrap around the start
+        p = self.perimeter
+        starts = self.start[:-1]
+        self._turn_at = np.concatenate((starts - p, starts, starts + p))
+        self._turn_sum = np.concatenate(([0.0], np.cumsum(np.tile(turns, 3))))
+
+    def segment(self, s):
+        s = np.mod(s, self.perimeter)
+        i = np.searchsorted(self.start, s, side="right") - 1
+        return np.clip(i, 0, len(self.length) - 1), s
+
+    def at(self, s):
+        """
+        Points and outward normals at arc lengths `s`.
+        """
+        i, s = self.segment(np.asarray(s, dtype=np.float64))
+        t = (s - self.start[i])[..., None]
+        return self.a[i] + t * self.unit[i], self.normal[i]
+
+    def turning(self, s, half):
+        """
+        Total turning of the outline within `half` of every arc length `s`.
+        """
+        lo = np.searchsorted(self._turn_at, s - half, side="right")
+        hi = np.searchsorted(self._turn_at, s + half, side="left")
+        return self._turn_sum[hi] - self._turn_sum[lo]
+
+    def project(self, point):
+        """
+        Arc length of the outline point nearest `point`.
+        """
+        d = np.asarray(point, dtype=np.float64) - self.a
+        t = np.clip(np.einsum("ij,ij->i", d, self.unit), 0, self.length)
+        gap = d - t[:, None] * self.unit
+        i = int(np.argmin(np.einsum("ij,ij->i", gap, gap)))
+        return float(self.start[i] + t[i])
+
+
+def template_row(template, gap):
+    """
+    One side of a mousebite template as (along, out, drills, sizes): the
+    holes next to the board above a horizontal gap, measured along its edge
+    and out into the gap. Templates drawn for a vertical gap are already
+    turned by mousebites.parse_template(); a single row on the gap's centre
+    line is taken whole, at out = gap / 2.
+    """
+    holes = template.holes
+    side = holes[:, 1] <= 0
+    if not side.any():
+        side = np.ones(len(holes), dtype=bool)
+    along = holes[side, 0]
+    out = gap / 2.0 - np.abs(holes[side, 1])
+    return along, out, template.drills[side], template.sizes[side]
+
+
+def _circular(a, b, perimeter):
+    d = np.abs(a - b) % perimeter
+    return np.minimum(d, perimeter - d)
+
+
+def place_on_ring(ring, row, spacing, anchors=(), keepouts=(), copper=None, clearance=0,
+                  max_turn=math.radians(MAX_TURN_DEG)):
+    """
+    Tabs on one closed `ring` (N x 2). `row` is template_row(). Returns
+    (the ring's _Ring, tab centres as arc lengths, blocked (x, y) points).
+    Copper is checked without zones, whose fill keeps its own edge
+    clearance.
+    """
+    along, out, _, sizes = row
+    r = _Ring(ring)
+    p = r.perimeter
+    half = float(np.max(np.abs(along) + sizes / 2.0)) if len(along) else 0.0
+    reach = float(np.max(out + sizes / 2.0)) if len(out) else 0.0
+    radius = float(np.max(sizes)) / 2.0 if len(sizes) else 0.0
+
+    step = max(from_mm(SAMPLE_MM), p / MAX_SAMPLES)
+    samples = np.arange(0.0, p, step)
+    ok = r.turning(samples, half) <= max_turn
+    if len(keepouts):
+        pts, _ = r.at(samples)
+        k = np.asarray(keepouts, dtype=np.float64)
+        d = half + reach
+        inside = ((pts[:, None, 0] >= k[None, :, 0] - d) & (pts[:, None, 0] <= k[None, :, 2] + d) &
+                  (pts[:, None, 1] >= k[None, :, 1] - d) & (pts[:, None, 1] <= k[None, :, 3] + d))
+        ok &= ~inside.any(axis=1)
+    valid = samples[ok]
+
+    if len(anchors):
+        targets = [r.project(a) for a in anchors]
+        window = p / 2.0 if spacing <= 0 else spacing / 2.0
+    else:
+        n = max(1, int(round(p / spacing))) if spacing > 0 else 1
+        targets = [p * (i + 0.5) / n for i in range(n)]
+        window = p / (2.0 * n)
+
+    chosen, blocked = [], []
+    for target in targets:
+        near = valid[_circular(valid, target, p) <= window]
+        near = near[np.argsort(_circular(near, target, p), kind="stable")]
+        for s in near:
+            if chosen and np.min(_circular(np.array(chosen), s, p)) < 2 * half:
+                continue
+            if copper is not None:
+                pts, normals = r.at(s + along)
+                holes = pts + out[:, None] * normals
+                rect = (holes[:, 0].min() - radius, holes[:, 1].min() - radius,
+                        holes[:, 0].max() + radius, holes[:, 1].max() + radius)
+                if copper.hits(rect, clearance, zones=False):
+                    continue
+            chosen.append(float(s))
+            break
+        else:
+            pt, _ = r.at(target)
+            blocked.append((float(pt[0]), float(pt[1])))
+    return r, np.array(sorted(chosen)), blocked
+
+
+def place_tabs(rings, template, gap, spacing, anchors=(), keepouts=(), copper=None, clearance=0,
+               max_turn=math.radians(MAX_TURN_DEG)):
+    """
+    OutlineTabs for the outer `rings` of the source outline. Anchors go to
+    the ring they are nearest to.
+    """
+    row = template_row(template, gap)
+    along, out, drills, sizes = row
+    by_ring = [[] for _ in rings]
+    for anchor in anchors:
+        d = [np.min(np.hypot(ring[:, 0] - anchor[0], ring[:, 1] - anchor[1])) for ring in rings]
+        by_ring[int(np.argmin(d))].append(anchor)
+
+    points, normals, holes, blocked = [], [], [], []
+    for ring, ring_anchors in zip(rings, by_ring):
+        if anchors and not ring_anchors:
+            continue
+        r, centres, missed = place_on_ring(ring, row, spacing, ring_anchors, keepouts, copper, clearance, max_turn)
+        blocked.extend(missed)
+        if not len(centres):
+            continue
+        pts, nrm = r.at(centres)
+        points.append(pts)
+        normals.append(nrm)
+        # Every hole of every tab at once: N x M arc lengths
+        hp, hn = r.at(centres[:, None] + along[None, :])
+        holes.append((hp + out[None, :, None] * hn).reshape(-1, 2))
+
+    n = sum(len(p) for p in points)
+    if not n:
+        empty = np.zeros((0, 2))
+        return OutlineTabs(empty, empty, empty, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), blocked)
+    return OutlineTabs(np.concatenate(points), np.concatenate(normals), np.concatenate(holes),
+                       np.tile(drills, n), np.tile(sizes, n), blocked)
+
+
+def for_outline(outline, template, plan, settings, copper=None, clearance=0):
+    """
+    place_tabs() for the outer loops of an outline.Outline with the tab
+    settings, memoized on the Outline: the copper index is assumed to
+    belong to the same board.
+    """
+    anchors = tuple((from_mm(x), from_mm(y)) for x, y in settings.get("tab_anchors") or ())
+    keepouts = tuple(tuple(from_mm(v) for v in k) for k in settings.get("tab_keepouts") or ())
+    max_turn = math.radians(float(settings.get("tab_max_turn_deg", MAX_TURN_DEG)))
+    key = ("tabs", plan.gap, plan.tab_spacing, anchors, keepouts, max_turn, clearance, copper is not None)
+    if key not in outline.cache:
+        rings = [loop.outline for loop in outline.loops]
+        outline.cache[key] = place_tabs(rings, template, plan.gap, plan.tab_spacing, anchors, keepouts,
+                                        copper, clearance, max_turn)
+    return outline.cache[key]
+
+
+def cell_holes(plan, tabs):
+    """
+    The source holes of `tabs` moved into every cell of `plan`: a
+    cells x holes x 2 integer array, in plan.cells order.
+    """
+    m = np.array([plan.matrix(c) for c in plan.cells], dtype=np.float64).reshape(-1, 6)
+    x, y = tabs.holes[:, 0][None, :], tabs.holes[:, 1][None, :]
+    px = m[:, 0:1] * x + m[:, 1:2] * y + m[:, 4:5]
+    py = m[:, 2:3] * x + m[:, 3:4] * y + m[:, 5:6]
+    return np.rint(np.stack((px, py), axis=-1)).astype(np.int64)
@@ -1,20 +1,205 @@
+import numpy as np
 import wx
 import pcbnew
+from .plan import plan_panel, from_mm, to_mm, PanelizerError
+from . import fixtures, mousebites, routing, thieving
+from .autofit import best_layouts, buildable, describe, layout_settings
+
+# Milliseconds of quiet after the last edit before the preview recomputes
+PREVIEW_DELAY_MS = 150
+
+# (label, settings["alternate"])
+ALTERNATE_CHOICES = [
+    ("None", "none"),
+    ("Every other row", "rows"),
+    ("Every other column", "columns"),
+    ("Checkerboard", "checker"),
+]
+# settings["zone_fill"] by choice index
+ZONE_MODES = ("refill", "replicate")
+# (label, settings["tab_mode"])
+TAB_CHOICES = [("Between cells", "edges"), ("Along outline", "outline")]
+# (label, settings["thieving"])
+THIEVING_CHOICES = [("None", "none"), ("Dots", "dots"), ("Hatch", "hatch")]
+# (label, settings["fiducials"] / settings["tooling_holes"])
+FIXTURE_COUNTS = [("None", 0), ("3", 3), ("4", 4)]
+# (label, settings["alternate_rotation"], settings["alternate_flip"])
+TURN_CHOICES = [
+    ("Rotated 180", 180, False),
+    ("Rotated 90", 90, False),
+    ("Rotated 270", 270, False),
+    ("Flipped to bottom", 0, True),
+    ("Rotated 180 and flipped", 180, True),
+]
+
+
+class PanelPreview(wx.Panel):
+    """
+    Draws a PanelPlan: frame, cells (the source cell highlighted, rotated or
+    flipped cells tinted), milled slots and their tabs, V-Cuts, mousebite
+    holes (between cells or along the outline), fixtures and rail thieving.
+    Works from the plan alone and never touches the board.
+    """
+    MARGIN = 12
+
+    def __init__(self, parent):
+        super(PanelPreview, self).__init__(parent, size=(360, 300))
+        self.SetMinSize((360, 300))
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.plan = None
+        self.holes = None
+        self.message = ""
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_SIZE, self.on_size)
+
+    def set_plan(self, plan, message=""):
+        if plan is self.plan and message == self.message:
+            return
+        self.plan = plan
+        self.message = message
+        self.holes = None
+        if plan is not None and (plan.tabs or plan.outline_tabs is not None):
+            try:
+                self.holes = mousebites.plan_holes(plan)[0]
+            except PanelizerError as e:
+                self.message = str(e).split("\n")[0]
+        self.Refresh()
+
+    def on_size(self, event):
+        self.Refresh()
+        event.Skip()
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(32, 32, 32)))
+        dc.Clear()
+        plan = self.plan
+        if plan is not None:
+            self.draw_plan(dc, plan)
+        if self.message:
+            dc.SetTextForeground(wx.Colour(255, 96, 96))
+            dc.DrawText(self.message, 6, 6)
+
+    def draw_plan(self, dc, plan):
+        f, a = plan.frame, plan.array
+        x0 = min(f.x, a.x) - plan.frame_width
+        y0 = min(f.y, a.y) - plan.frame_width
+        x1 = max(f.x + f.w, a.x + a.w) + plan.frame_width
+        y1 = max(f.y + f.h, a.y + a.h) + plan.frame_width
+        w, h = self.GetClientSize()
+        scale = min((w - 2 * self.MARGIN) / float(max(x1 - x0, 1)),
+                    (h - 2 * self.MARGIN) / float(max(y1 - y0, 1)))
+        if scale <= 0:
+            return
+
+        def pt(x, y):
+            return int(self.MARGIN + (x - x0) * scale), int(self.MARGIN + (y - y0) * scale)
+
+        def rect(x, y, rw, rh):
+            px, py = pt(x, y)
+            return px, py, max(1, int(rw * scale)), max(1, int(rh * scale))
+
+        r = plan.routing
+        # A milled panel is solid between its slots
+        dc.SetBrush(wx.TRANSPARENT_BRUSH if r is None else wx.Brush(wx.Colour(44, 56, 44)))
+        dc.SetPen(wx.Pen(wx.Colour(230, 200, 60) if plan.fits else wx.Colour(255, 80, 80),
+                         max(1, int(plan.frame_width * scale))))
+        dc.DrawRectangle(*rect(f.x, f.y, f.w, f.h))
+
+        if plan.thieving is not None and len(plan.thieving.rects):
+            # Many rects share a pixel at preview scale: draw each pixel once
+            t = plan.thieving.rects
+            px = np.rint(self.MARGIN + (t[:, [0, 2]] - x0) * scale).astype(int)
+            py = np.rint(self.MARGIN + (t[:, [1, 3]] - y0) * scale).astype(int)
+            pix = np.unique(np.column_stack((px[:, 0], py[:, 0], np.maximum(1, px[:, 1] - px[:, 0]),
+                                             np.maximum(1, py[:, 1] - py[:, 0]))), axis=0)
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(wx.Brush(wx.Colour(150, 110, 50)))
+            dc.DrawRectangleList(pix.tolist())
+
+        if r is not None:
+            # The slot reaches r.width out of every outline, bridged by the
+            # tabs; the cells are drawn over its inner half
+            dc.SetBrush(wx.TRANSPARENT_BRUSH)
+            dc.SetPen(wx.Pen(wx.Colour(20, 20, 20), max(1, int(2 * r.width * scale))))
+            for rings in r.rings:
+                for ring in rings.tolist():
+                    dc.DrawPolygon([pt(x, y) for x, y in ring])
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(wx.Brush(wx.Colour(44, 56, 44)))
+            for tab in r.tabs.reshape(-1, 4, 2).tolist():
+                dc.DrawPolygon([pt(x, y) for x, y in tab])
+
+        dc.SetPen(wx.Pen(wx.Colour(90, 160, 90)))
+        for i, cell in enumerate(plan.cells):
+            if (cell.row, cell.col) == plan.source:
+                colour = wx.Colour(60, 130, 60)
+            elif cell.flip:
+                colour = wx.Colour(40, 60, 100)
+            elif cell.rotation:
+                colour = wx.Colour(70, 90, 40)
+            else:
+                colour = wx.Colour(40, 80, 40)
+            dc.SetBrush(wx.Brush(colour))
+            if r is None:
+                dc.DrawRectangle(*rect(*plan.cell_rect(cell)))
+            else:
+                for rings in r.rings:
+                    dc.DrawPolygon([pt(x, y) for x, y in rings[i].tolist()])
+
+        if plan.cuts:
+            dc.SetPen(wx.Pen(wx.Colour(220, 80, 220), 1, wx.PENSTYLE_SHORT_DASH))
+            for cut in plan.cuts:
+                dc.DrawLine(*(pt(cut.x1, cut.y1) + pt(cut.x2, cut.y2)))
+
+        if self.holes is not None and len(self.holes):
+            dc.SetPen(wx.Pen(wx.Colour(240, 240, 240)))
+            dc.SetBrush(wx.Brush(wx.Colour(240, 240, 240)))
+            for x, y in self.holes.tolist():
+                px, py = pt(x, y)
+                dc.DrawCircle(px, py, 1)
+
+        if plan.fixtures:
+            dc.SetPen(wx.Pen(wx.Colour(240, 240, 240)))
+            for fixture in plan.fixtures:
+                if fixture.kind == "fiducial":
+                    dc.SetBrush(wx.Brush(wx.Colour(200, 160, 60)))
+                else:
+                    dc.SetBrush(wx.TRANSPARENT_BRUSH)
+                px, py = pt(fixture.x, fixture.y)
+                dc.DrawCircle(px, py, max(2, int(fixture.size * scale / 2.0)))
 
 
 class PanelizerDialog(wx.Dialog):
-    def __init__(self, parent=None):
+    """
+    `board_rect` is the source board's Edge.Cuts bbox (x, y, w, h in IU);
+    with it the dialog shows a live preview of the panel. `outline` and
+    `copper` are callables returning the source board's outline.Outline and
+    spatial.CopperIndex; with them the preview also places tabs, fixtures,
+    milled outlines and thieving the way the build will.
+    """
+    def __init__(self, parent=None, board_rect=None, outline=None, copper=None):
         super(PanelizerDialog, self).__init__(
             parent,
             title="PCB Panelizer",
             style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER,
         )
         self.Bind(wx.EVT_CLOSE, self.on_close)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+        self.board_rect = board_rect
+        self.outline = outline
+        self.copper = copper
+        self._preview_timer = None
+        # Mixed-orientation layout chosen by Auto-fit; dropped as soon as
+        # the grid fields are edited
+        self.blocks = None
+        self._autofitting = False
 
         panel = wx.Panel(self)
+        hbox = wx.BoxSizer(wx.HORIZONTAL)
         vbox = wx.BoxSizer(wx.VERTICAL)
 
-        grid = wx.FlexGridSizer(rows=5, cols=2, vgap=10, hgap=10)
+        grid = wx.FlexGridSizer(rows=0, cols=2, vgap=10, hgap=10)
 
         # --- Array size ---
         grid.Add(wx.StaticText(panel, label="Columns (X):"), 0, wx.ALIGN_CENTER_VERTICAL)
@@ -27,7 +212,7 @@ class PanelizerDialog(wx.Dialog):
 
         # --- Method ---
         grid.Add(wx.StaticText(panel, label="Method:"), 0, wx.ALIGN_CENTER_VERTICAL)
-        self.cb_method = wx.Choice(panel, choices=["V-Cut", "Mousebites"])
+        self.cb_method = wx.Choice(panel, choices=["V-Cut", "Mousebites", "Routed Tabs"])
         self.cb_method.SetSelection(0)
         grid.Add(self.cb_method, 1, wx.EXPAND)
 
@@ -37,6 +222,11 @@ class PanelizerDialog(wx.Dialog):
         self.cb_gap.SetSelection(2)  # default 2.0 mm
         grid.Add(self.cb_gap, 1, wx.EXPAND)
 
+        grid.Add(wx.StaticText(panel, label="Mousebite tabs:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_tabs = wx.Choice(panel, choices=[label for label, _ in TAB_CHOICES])
+        self.cb_tabs.SetSelection(0)
+        grid.Add(self.cb_tabs, 1, wx.EXPAND)
+
         # --- Panel size ---
         grid.Add(wx.StaticText(panel, label="Panel Width (mm):"), 0, wx.ALIGN_CENTER_VERTICAL)
         self.txt_width = wx.TextCtrl(panel, value="100")
@@ -46,11 +236,77 @@ class PanelizerDialog(wx.Dialog):
         self.txt_height = wx.TextCtrl(panel, value="100")
         grid.Add(self.txt_height, 1, wx.EXPAND)
 
+        # --- Alternating cells ---
+        grid.Add(wx.StaticText(panel, label="Alternate:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_alternate = wx.Choice(panel, choices=[label for label, _ in ALTERNATE_CHOICES])
+        self.cb_alternate.SetSelection(0)
+        grid.Add(self.cb_alternate, 1, wx.EXPAND)
+
+        grid.Add(wx.StaticText(panel, label="Alternate cells:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_turn = wx.Choice(panel, choices=[label for label, _, _ in TURN_CHOICES])
+        self.cb_turn.SetSelection(0)
+        grid.Add(self.cb_turn, 1, wx.EXPAND)
+
+        # --- Zones ---
+        grid.Add(wx.StaticText(panel, label="Zones:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_zones = wx.Choice(panel, choices=["Refill each copy", "Fill once, replicate"])
+        self.cb_zones.SetSelection(0)
+        grid.Add(self.cb_zones, 1, wx.EXPAND)
+
+        # --- Fiducials / tooling holes on the frame ---
+        grid.Add(wx.StaticText(panel, label="Fiducials:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_fiducials = wx.Choice(panel, choices=[label for label, _ in FIXTURE_COUNTS])
+        self.cb_fiducials.SetSelection(0)
+        grid.Add(self.cb_fiducials, 1, wx.EXPAND)
+
+        grid.Add(wx.StaticText(panel, label="Tooling holes:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_tooling = wx.Choice(panel, choices=[label for label, _ in FIXTURE_COUNTS])
+        self.cb_tooling.SetSelection(0)
+        grid.Add(self.cb_tooling, 1, wx.EXPAND)
+
+        grid.Add(wx.StaticText(panel, label="Rail thieving:"), 0, wx.ALIGN_CENTER_VERTICAL)
+        self.cb_thieving = wx.Choice(panel, choices=[label for label, _ in THIEVING_CHOICES])
+        self.cb_thieving.SetSelection(0)
+        grid.Add(self.cb_thieving, 1, wx.EXPAND)
+
         vbox.Add(grid, 1, wx.ALL | wx.EXPAND, 15)
 
+        self.chk_nets = wx.CheckBox(panel, label="Separate nets per board")
+        vbox.Add(self.chk_nets, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 15)
+
+        self.chk_validate = wx.CheckBox(panel, label="Validate before building")
+        self.chk_validate.SetValue(True)
+        vbox.Add(self.chk_validate, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 15)
+
+        self.chk_profile = wx.CheckBox(panel, label="Write timing report")
+        vbox.Add(self.chk_profile, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 15)
+
+        self.chk_fab = wx.CheckBox(panel, label="Export fab files (zip)")
+        vbox.Add(self.chk_fab, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 15)
+
+        if board_rect is not None:
+            self.btn_autofit = wx.Button(panel, label="Auto-fit")
+            self.btn_autofit.Bind(wx.EVT_BUTTON, self.on_autofit)
+            vbox.Add(self.btn_autofit, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 15)
+            self.lbl_autofit = wx.StaticText(panel, label="")
+            vbox.Add(self.lbl_autofit, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM, 15)
+        hbox.Add(vbox, 0, wx.EXPAND)
 
+        self.preview = None
+        if board_rect is not None:
+            self.preview = PanelPreview(panel)
+            hbox.Add(self.preview, 1, wx.ALL | wx.EXPAND, 15)
+            for ctrl in (self.txt_width, self.txt_height):
+                ctrl.Bind(wx.EVT_TEXT, self.on_settings_changed)
+            for ctrl in (self.txt_cols, self.txt_rows):
+                ctrl.Bind(wx.EVT_TEXT, self.on_grid_changed)
+            for ctrl in (self.cb_method, self.cb_gap, self.cb_tabs, self.cb_fiducials, self.cb_tooling,
+                         self.cb_thieving):
+                ctrl.Bind(wx.EVT_CHOICE, self.on_settings_changed)
+            for ctrl in (self.cb_alternate, self.cb_turn):
+                ctrl.Bind(wx.EVT_CHOICE, self.on_grid_changed)
 
-        panel.SetSizer(vbox)
+        panel.SetSizer(hbox)
 
         main_sizer = wx.BoxSizer(wx.VERTICAL)
         main_sizer.Add(panel, 1, wx.EXPAND)
@@ -62,19 +318,202 @@ class PanelizerDialog(wx.Dialog):
         main_sizer.Fit(self)
         self.Layout()
         self.Center()
+        if self.preview is not None:
+            self.update_preview()
 
     def on_close(self, event):
         self.EndModal(wx.ID_CANCEL)
 
+    def on_destroy(self, event):
+        if self._preview_timer is not None:
+            self._preview_timer.Stop()
+        event.Skip()
+
+    def on_settings_changed(self, event):
+        # Restart the timer on every keystroke; recompute once typing pauses
+        if self._preview_timer is not None and self._preview_timer.IsRunning():
+            self._preview_timer.Restart(PREVIEW_DELAY_MS)
+        else:
+            self._preview_timer = wx.CallLater(PREVIEW_DELAY_MS, self.update_preview)
+        event.Skip()
+
+    def on_grid_changed(self, event):
+        if not self._autofitting:
+            self.blocks = None
+        self.on_settings_changed(event)
+
+    def on_autofit(self, event):
+        """
+        Sets cols/rows to the grid that puts the most boards on the panel, or
+        picks a mixed-orientation layout when that fits more and the method
+        can cut it.
+        """
+        try:
+            gap = from_mm(float(self.cb_gap.GetString(self.cb_gap.GetSelection())))
+            panel_w = from_mm(float(self.txt_width.GetValue()))
+            panel_h = from_mm(float(self.txt_height.GetValue()))
+        except ValueError:
+            self.lbl_autofit.SetLabel("Enter the panel size first")
+            return
+        w, h = int(self.board_rect[2]), int(self.board_rect[3])
+        base = {
+            "cols": 1, "rows": 1, "gap_mm": to_mm(gap),
+            "method": self.cb_method.GetString(self.cb_method.GetSelection()),
+            "panel_w_mm": to_mm(panel_w), "panel_h_mm": to_mm(panel_h),
+        }
+        rail = routing.slot_width(base)
+        layouts = [layout for layout in best_layouts(w, h, panel_w, panel_h, gap, False, rail=rail)
+                   if buildable(plan_panel(self.board_rect, layout_settings(layout, base)), base)]
+        if not layouts:
+            self.lbl_autofit.SetLabel("The board does not fit on the panel")
+            return
+        best = layouts[0]
+        block = best.blocks[0]
+        blocks = None
+        text = describe(best)
+        rotated = best_layouts(w, h, panel_w, panel_h, gap, True, rail=rail)
+        if rotated and rotated[0].count > best.count:
+            settings = layout_settings(rotated[0], base)
+            if not buildable(plan_panel(self.board_rect, settings), settings):
+                text += "\nWith rotated boards (Mousebites only): " + describe(rotated[0])
+            else:
+                blocks = settings.get("blocks")
+                block = rotated[0].blocks[0]
+                text = describe(rotated[0])
+
+        self._autofitting = True
+        try:
+            self.txt_cols.SetValue(str(block.cols))
+            self.txt_rows.SetValue(str(block.rows))
+            self.cb_alternate.SetSelection(0)
+        finally:
+            self._autofitting = False
+        self.blocks = blocks
+        self.lbl_autofit.SetLabel(text)
+        self.Layout()
+
+    def update_preview(self):
+        """
+        Plans the panel for the current fields and redraws the preview.
+        Plans are cached, so flipping back to an earlier layout is free.
+        """
+        settings = self.GetSettings()
+        if settings is None:
+            self.preview.set_plan(self.preview.plan, "Invalid number")
+            return
+        if settings["cols"] < 1 or settings["rows"] < 1:
+            self.preview.set_plan(None, "Columns and rows must be at least 1")
+            return
+        plan = plan_panel(self.board_rect, settings)
+        message = "" if plan.fits else "Panel size is too small"
+        if plan.fits and self.outline is not None:
+            try:
+                plan = self.placed(plan, settings)
+            except PanelizerError as e:
+                message = str(e).split("\n")[0]
+        self.preview.set_plan(plan, message)
+
+    def placed(self, plan, settings):
+        """
+        `plan` as PanelSession.update() places it before building: tabs,
+        fixtures, milled outlines and thieving.
+        """
+        outline = self.outline()
+        plan, _ = fixtures.place(plan, self.copper, settings, outline)
+        plan = routing.place(plan, settings, outline)
+        return thieving.place(plan, settings)
+
     def GetSettings(self):
         try:
-            return {
+            settings = {
                 "cols": int(self.txt_cols.GetValue()),
                 "rows": int(self.txt_rows.GetValue()),
                 "gap_mm": float(self.cb_gap.GetString(self.cb_gap.GetSelection())),
                 "method": self.cb_method.GetString(self.cb_method.GetSelection()),
                 "panel_w_mm": float(self.txt_width.GetValue()),
                 "panel_h_mm": float(self.txt_height.GetValue()),
+                "zone_fill": ZONE_MODES[self.cb_zones.GetSelection()],
+                "profile": self.chk_profile.GetValue(),
+                "fab_export": self.chk_fab.GetValue(),
+                "fiducials": FIXTURE_COUNTS[self.cb_fiducials.GetSelection()][1],
+                "tooling_holes": FIXTURE_COUNTS[self.cb_tooling.GetSelection()][1],
+                "tab_mode": TAB_CHOICES[self.cb_tabs.GetSelection()][1],
+                "net_mode": "per_cell" if self.chk_nets.GetValue() else "shared",
+                "thieving": THIEVING_CHOICES[self.cb_thieving.GetSelection()][1],
+                "validate": self.chk_validate.GetValue(),
             }
         except ValueError:
             return None
+        settings["alternate"] = ALTERNATE_CHOICES[self.cb_alternate.GetSelection()][1]
+        _, settings["alternate_rotation"], settings["alternate_flip"] = TURN_CHOICES[self.cb_turn.GetSelection()]
+        if self.blocks:
+            settings["blocks"] = self.blocks
+        return settings
+
+    def SetSettings(self, settings):
+        """
+        Fills the fields from `settings` (e.g. a saved recipe). Keys the
+        dialog has no field for are ignored; unknown values leave the field
+        as it is.
+        """
+        def choose(ctrl, choices, value):
+            values = [c[1] for c in choices]
+            if value in values:
+                ctrl.SetSelection(values.index(value))
+
+        for ctrl, key in ((self.txt_cols, "cols"), (self.txt_rows, "rows")):
+            if key in settings:
+                ctrl.SetValue(str(int(settings[key])))
+        for ctrl, key in ((self.txt_width, "panel_w_mm"), (self.txt_height, "panel_h_mm")):
+            if key in settings:
+                ctrl.SetValue("{:g}".format(float(settings[key])))
+        if "gap_mm" in settings:
+            self.cb_gap.SetStringSelection("{:.1f}".format(float(settings["gap_mm"])))
+        if "method" in settings:
+            self.cb_method.SetStringSelection(settings["method"])
+        if settings.get("zone_fill") in ZONE_MODES:
+            self.cb_zones.SetSelection(ZONE_MODES.index(settings["zone_fill"]))
+        choose(self.cb_fiducials, FIXTURE_COUNTS, settings.get("fiducials"))
+        choose(self.cb_tooling, FIXTURE_COUNTS, settings.get("tooling_holes"))
+        choose(self.cb_tabs, TAB_CHOICES, settings.get("tab_mode"))
+        choose(self.cb_thieving, THIEVING_CHOICES, settings.get("thieving"))
+        choose(self.cb_alternate, ALTERNATE_CHOICES, settings.get("alternate"))
+        turn = (settings.get("alternate_rotation"), settings.get("alternate_flip"))
+        for i, (_, rotation, flip) in enumerate(TURN_CHOICES):
+            if (rotation, flip) == turn:
+                self.cb_turn.SetSelection(i)
+        self.chk_nets.SetValue(settings.get("net_mode") == "per_cell")
+        self.chk_validate.SetValue(bool(settings.get("validate", True)))
+        self.chk_profile.SetValue(bool(settings.get("profile")))
+        self.chk_fab.SetValue(bool(settings.get("fab_export")))
+        self.blocks = settings.get("blocks")
+        if self.preview is not None:
+            self.update_preview()
+
+
+class PanelizeProgress(object):
+    """
+    progress(done, total) callback for panelize_board() that shows a
+    cancellable wx.ProgressDialog. The dialog only opens once there are
+    cells to replicate; call Destroy() when the run is over.
+    """
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.dialog = None
+
+    def __call__(self, done, total):
+        if self.dialog is None:
+            self.dialog = wx.ProgressDialog(
+                "PCB Panelizer",
+                "Replicating cells...",
+                maximum=max(total, 1),
+                parent=self.parent,
+                style=wx.PD_APP_MODAL | wx.PD_CAN_ABORT | wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME,
+            )
+        keep_going, _ = self.dialog.Update(done, "Replicating cell {} of {}".format(done, total))
+        return keep_going
+
+    def Destroy(self):
+        if self.dialog is not None:
+            self.dialog.Destroy()
+            self.dialog = None
@@ -0,0 +1,199 @@
+"""
+What the action plugin does once it is run: the dialog, panelizing and the
+fab export. PanelizerAction.Run() imports this module on first use, so wx,
+the dialog, the geometry engine and NumPy stay out of pcbnew's startup.
+"""
+import os
+import shutil
+import tempfile
+
+import pcbnew
+import wx
+from .panelizer_gui import PanelizerDialog, PanelizeProgress
+from .plan import PanelizerError, PanelizerCancelled
+from .core import panelize_board, write_profile
+from .session import BatchCommit, PanelSession
+from . import multi
+from .fab_export import export_fab, fab_zip_path
+from .recipe import OutputCache, load_recipe, merge_recipe, recipe_path, save_recipe, settings_digest
+
+
+class PanelizerRunner(object):
+    def __init__(self):
+        # Board file name -> PanelSession, so re-running the dialog on a
+        # panel only adds/removes the cells that changed
+        self.sessions = {}
+        # Board file name -> (settings_digest(), source_digest()) of the panel
+        # the session built
+        self.built = {}
+        self.cache = OutputCache()
+        # Source boards of mixed panels, loaded once per file
+        self.designs = multi.DesignCache()
+
+    def run(self):
+        board = pcbnew.GetBoard()
+        session = self.source_session(board)
+        if session is None:
+            dialog = PanelizerDialog()
+        else:
+            dialog = PanelizerDialog(board_rect=session.board_rect, outline=session.snapshot.outline,
+                                     copper=session.copper_index)
+        recipe = self.load_recipe(board)
+        if recipe:
+            dialog.SetSettings(recipe)
+
+        if dialog.ShowModal() == wx.ID_OK:
+            settings = dialog.GetSettings()
+            if settings:
+                settings = merge_recipe(recipe, settings)
+                self.save_recipe(board, settings)
+                self.panelize(board, settings, session)
+
+        dialog.Destroy()
+
+    def load_recipe(self, board):
+        """
+        The recipe saved next to the board, or None.
+        """
+        filename = board.GetFileName()
+        if not filename or not os.path.exists(recipe_path(filename)):
+            return None
+        try:
+            return load_recipe(recipe_path(filename))
+        except ValueError as e:
+            wx.MessageBox(str(e), "Panel Recipe", wx.OK | wx.ICON_WARNING)
+            return None
+
+    def save_recipe(self, board, settings):
+        filename = board.GetFileName()
+        if not filename:
+            return
+        try:
+            save_recipe(recipe_path(filename), settings)
+        except OSError as e:
+            wx.MessageBox("Could not save the panel recipe: {}".format(e), "Panel Recipe", wx.OK | wx.ICON_WARNING)
+
+    def live_session(self, board):
+        session = self.sessions.get(board.GetFileName())
+        if session is not None and not session.is_alive():
+            return None
+        return session
+
+    def source_session(self, board):
+        """
+        The PanelSession the dialog previews and panelize() builds with:
+        the live one, whose source is the original cell rather than the
+        panel, or a new one on the board, which takes nothing from the board
+        until it is updated. None when the board has no Edge.Cuts.
+        """
+        session = self.live_session(board)
+        if session is not None:
+            session.refresh_source()
+            return session
+        try:
+            return PanelSession(board)
+        except PanelizerError:
+            return None
+
+    def panelize(self, board, settings, session=None):
+        if multi.wanted(settings):
+            self.panelize_mixed(board, settings)
+            return
+        key = board.GetFileName()
+        digest = settings_digest(settings)
+        if session is not None:
+            # The recipe alone says nothing about edits to the source cell
+            session.refresh_source()
+            digest = (digest, session.source_digest())
+        if session is not None and session.plan is not None and self.built.get(key) == digest:
+            # Same recipe on the panel it already built: nothing to redo
+            if settings.get("fab_export"):
+                self.export_fab(board, session, settings)
+            return
+        progress = PanelizeProgress()
+        try:
+            session = panelize_board(board, settings, session, progress)
+        except PanelizerCancelled:
+            pcbnew.Refresh()
+            return
+        except PanelizerError as e:
+            wx.MessageBox(str(e), e.title, wx.OK | wx.ICON_ERROR)
+            return
+        finally:
+            progress.Destroy()
+        self.sessions[key] = session
+        self.built[key] = digest
+
+        if session.zone_report:
+            wx.MessageBox("\n".join(session.zone_report), "Zones Refilled", wx.OK | wx.ICON_INFORMATION)
+        if session.placement_report:
+            wx.MessageBox("\n".join(session.placement_report), "Placement", wx.OK | wx.ICON_WARNING)
+
+        with session.profile.phase("refresh"):
+            pcbnew.Refresh()
+
+        paths = write_profile(session, board, settings)
+        if paths:
+            wx.MessageBox("{}\n\nReport: {}\nLog: {}".format(session.profile.summary(), *paths),
+                          "Panelize Timing", wx.OK | wx.ICON_INFORMATION)
+
+        if settings.get("fab_export"):
+            self.export_fab(board, session, settings)
+
+    def panelize_mixed(self, board, settings):
+        """
+        Builds the recipe's mixed-design panel on the open board, which must
+        be empty. Design paths are relative to the board's directory.
+        """
+        if board.Tracks() or board.Footprints() or board.Drawings() or board.Zones():
+            wx.MessageBox("Mixed-design panels are built on an empty board. Create a new board next to "
+                          "the recipe and run the panelizer there.", "Mixed Panel", wx.OK | wx.ICON_ERROR)
+            return
+        commit = BatchCommit(board)
+        progress = PanelizeProgress()
+        try:
+            multi.panelize_mixed(board, settings, self.designs, os.path.dirname(board.GetFileName()),
+                                 commit.Add, progress=progress)
+        except PanelizerCancelled:
+            commit.Revert()
+            return
+        except PanelizerError as e:
+            commit.Revert()
+            wx.MessageBox(str(e), e.title, wx.OK | wx.ICON_ERROR)
+            return
+        finally:
+            progress.Destroy()
+        commit.Push()
+        pcbnew.Refresh()
+
+    def export_fab(self, board, session, settings):
+        """
+        Saves a copy of the panel for the plot workers to load and writes
+        <board>_fab.zip next to the board. The board itself is not saved.
+        The zip is cached by the recipe and the saved copy, so exporting an
+        unchanged panel again only copies the cached zip.
+        """
+        filename = board.GetFileName()
+        if not filename:
+            wx.MessageBox("Save the board once before exporting fab files.", "Fab Output",
+                          wx.OK | wx.ICON_ERROR)
+            return
+        tmp = tempfile.mkdtemp(prefix="panel_")
+        copy = os.path.join(tmp, os.path.basename(filename))
+        wx.BeginBusyCursor()
+        try:
+            pcbnew.SaveBoard(copy, board)
+            # SaveBoard may point the board at the copy
+            board.SetFileName(filename)
+            zip_path = fab_zip_path(filename)
+            key = self.cache.key(settings, "fab", copy)
+            if not self.cache.restore(key, "fab", zip_path):
+                export_fab(copy, zip_path, plan=session.plan)
+                self.cache.store(key, "fab", zip_path)
+        except PanelizerError as e:
+            wx.MessageBox(str(e), e.title, wx.OK | wx.ICON_ERROR)
+            return
+        finally:
+            wx.EndBusyCursor()
+            shutil.rmtree(tmp, ignore_errors=True)
+        wx.MessageBox("Fab files written to\n{}".format(zip_path), "Fab Output", wx.OK | wx.ICON_INFORMATION)
@@ -0,0 +1,512 @@
+"""
+Pure-Python panel planning.
+
+plan_panel() turns the source board's Edge.Cuts bounding box and the dialog
+settings into a PanelPlan: where every cell copy goes, where the frame sits,
+and which V-Cut segments and labels to draw. Nothing here touches pcbnew, so
+layouts can be computed, compared and cached without KiCad; applier.py writes
+a finished plan to a board.
+
+All coordinates are KiCad internal units (nm).
+"""
+import functools
+import math
+from collections import namedtuple
+
+IU_PER_MM = 1000000
+
+# V-Cut segments shorter than this are dropped (they only appear when a cut
+# coincides with the frame edge).
+MIN_SEGMENT = 100
+
+Rect = namedtuple("Rect", "x y w h")
+# dx/dy move the source board's bbox onto the cell's; rotation (degrees,
+# counter-clockwise as KiCad draws it) and flip (to the bottom side, mirrored
+# left-right) are applied about the source board's centre first.
+Cell = namedtuple("Cell", "row col dx dy rotation flip", defaults=(0, False))
+Segment = namedtuple("Segment", "x1 y1 x2 y2 width")
+Label = namedtuple("Label", "text x y angle")
+# Mousebite tabs along one side of a cell: `points` are the tab centres
+# (x, y) on the middle of the gap; angle 0 for a horizontal gap (the cell
+# below, or the rail above or below), 90 for a vertical one (the cell to
+# the right, or a rail). start/end bound the stretch of the gap the tabs
+# may slide along.
+TabEdge = namedtuple("TabEdge", "row col angle points start end", defaults=(0, 0))
+# A fiducial or tooling hole on the frame: kind "fiducial" or "tooling",
+# centre (x, y), copper dot or drill diameter `size`.
+Fixture = namedtuple("Fixture", "kind x y size")
+# A grid of cols x rows cells turned by `rotation`, its top left corner at
+# (x, y) relative to the first block (see autofit.Block).
+GridBlock = namedtuple("GridBlock", "x y cols rows rotation")
+
+DEFAULT_TAB_SPACING_MM = 25.0
+
+ALTERNATE_PATTERNS = ("none", "rows", "columns", "checker")
+ROTATIONS = (0, 90, 180, 270)
+
+
+class PanelizerError(Exception):
+    """
+    Raised when a panel cannot be generated. `title` is a short caption
+    suitable for a message box.
+    """
+    def __init__(self, message, title="Error"):
+        super(PanelizerError, self).__init__(message)
+        self.title = title
+
+
+class PanelizerCancelled(PanelizerError):
+    """
+    Raised when the user cancelled a panelize; the board is left unchanged.
+    """
+    def __init__(self):
+        super(PanelizerCancelled, self).__init__("Panelize cancelled.", "Cancelled")
+
+
+def from_mm(mm):
+    return int(round(mm * IU_PER_MM))
+
+
+def to_mm(iu):
+    return iu / IU_PER_MM
+
+
+class PanelPlan(object):
+    """
+    Everything needed to build a panel, as plain data.
+
+    cells   -- Cell(row, col, dx, dy, rotation, flip) for every array
+               position, the source cell included.
+    source  -- (row, col) of the cell that is the source board itself.
+    frame   -- Rect of the panel outline, drawn on Edge.Cuts with `frame_width`.
+    cuts    -- V-Cut Segments (F.Fab), already split at every intersection.
+    labels  -- "VSCORE" Labels, one per cut line, outside the frame.
+    tabs    -- Mousebite TabEdges, one per pair of facing cell sides and
+               one per cell side facing the frame.
+    outline_tabs -- outline_tabs.OutlineTabs in source coordinates, when
+               tabs follow the board outline instead; set at placement.
+    fixtures -- Fiducials and tooling holes (see fixtures.py); placing them
+               needs the board, so the planner leaves this empty.
+    thieving -- thieving.Thieving copper pattern for the rails, or None; set
+               after placement.
+    routing -- routing.Routing outlines and tabs of a "Routed Tabs" panel,
+               or None; set after placement.
+    """
+    def __init__(self, board, cols, rows, gap, method, panel_w, panel_h, tab_spacing=0):
+        self.board = board
+        self.cols = cols
+        self.rows = rows
+        self.gap = gap
+        self.method = method
+        self.panel_w = panel_w
+        self.panel_h = panel_h
+        self.tab_spacing = tab_spacing
+
+        self.cells = ()
+        self.source = (0, 0)
+        self.array = None        # Rect around every cell
+        self.frame = None
+        self.frame_width = gap
+        self.cut_x = ()
+        self.cut_y = ()
+        self.cuts = ()
+        self.labels = ()
+        self.tabs = ()
+        self.outline_tabs = None
+        self.fixtures = ()
+        self.thieving = None
+        self.routing = None
+        self.problems = []       # reasons the plan cannot be built, besides size
+
+    @property
+    def array_w(self):
+        return self.array.w
+
+    @property
+    def array_h(self):
+        return self.array.h
+
+    @property
+    def fits(self):
+        return self.panel_w >= self.array_w and self.panel_h >= self.array_h
+
+    @property
+    def transformed(self):
+        """
+        True if any cell is rotated or flipped.
+        """
+        return any(c.rotation or c.flip for c in self.cells)
+
+    def copies(self):
+        """
+        Cells that need duplicated items; the source cell is the board itself.
+        """
+        return [c for c in self.cells if (c.row, c.col) != self.source]
+
+    def cell_rect(self, cell):
+        """
+        The board's bbox as placed in `cell`.
+        """
+        b = self.board
+        w, h = (b.w, b.h) if cell.rotation % 180 == 0 else (b.h, b.w)
+        return Rect(b.x + cell.dx, b.y + cell.dy, w, h)
+
+    def matrix(self, cell):
+        return cell_matrix(self.board, cell)
+
+
+def cell_matrix(board, cell):
+    """
+    The transform of `cell` as a 2x3 matrix (a, b, c, d, e, f): a source point
+    (x, y) lands on (a*x + b*y + e, c*x + d*y + f). Flip first, then rotate,
+    both about the source centre, then move, which is the order the applier
+    issues them in.
+    """
+    cx, cy = board.x + board.w / 2.0, board.y + board.h / 2.0
+    t = math.radians(cell.rotation)
+    cos, sin = round(math.cos(t), 12), round(math.sin(t), 12)
+    # Rotation on screen (y down): x' = x cos + y sin, y' = -x sin + y cos
+    a, b, c, d = cos, sin, -sin, cos
+    if cell.flip:
+        a, c = -a, -c
+    w, h = (board.w, board.h) if cell.rotation % 180 == 0 else (board.h, board.w)
+    px, py = board.x + cell.dx + w / 2.0, board.y + cell.dy + h / 2.0
+    return (a, b, c, d, px - (a * cx + b * cy), py - (c * cx + d * cy))
+
+
+def transform_rect(matrix, rect):
+    """
+    Bounding box (x0, y0, x1, y1) of an (x0, y0, x1, y1) rectangle after
+    `matrix`.
+    """
+    a, b, c, d, e, f = matrix
+    xs, ys = [], []
+    for x, y in ((rect[0], rect[1]), (rect[2], rect[1]), (rect[2], rect[3]), (rect[0], rect[3])):
+        xs.append(a * x + b * y + e)
+        ys.append(c * x + d * y + f)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def frame_obstacles(plan):
+    """
+    The four frame sides as (x0, y0, x1, y1), stroke width included.
+    """
+    f, half = plan.frame, plan.frame_width / 2.0
+    x0, y0, x1, y1 = f.x, f.y, f.x + f.w, f.y + f.h
+    return [
+        (x0 - half, y0 - half, x1 + half, y0 + half),
+        (x1 - half, y0 - half, x1 + half, y1 + half),
+        (x0 - half, y1 - half, x1 + half, y1 + half),
+        (x0 - half, y0 - half, x0 + half, y1 + half),
+    ]
+
+
+def check_plan(plan):
+    """
+    Raises PanelizerError if `plan` cannot be built.
+    """
+    if not plan.fits:
+        msg = "Error: Panel size is too small!\n\n" \
+              "Required: {:.2f} mm x {:.2f} mm\n" \
+              "Specified: {:.2f} mm x {:.2f} mm".format(
+                  to_mm(plan.array_w), to_mm(plan.array_h),
+                  to_mm(plan.panel_w), to_mm(plan.panel_h)
+              )
+        raise PanelizerError(msg, "Panel Too Small")
+    if plan.problems:
+        raise PanelizerError("\n\n".join(plan.problems), "Cannot Build Panel")
+
+
+def _blocks_key(blocks):
+    if not blocks:
+        return None
+    return tuple(GridBlock(from_mm(b.get("x_mm", 0)), from_mm(b.get("y_mm", 0)),
+                           int(b["cols"]), int(b["rows"]), int(b.get("rotation", 0)) % 360)
+                 for b in blocks)
+
+
+def plan_panel(board_rect, settings):
+    """
+    Builds a PanelPlan for a source board whose Edge.Cuts bounding box is
+    `board_rect` (x, y, w, h in IU). Plans are cached, so callers must not
+    modify the returned object.
+
+    Besides a cols x rows grid, settings may alternate every other row,
+    column or checkerboard square ("alternate") with a rotation and/or
+    bottom-side flip, or give explicit "blocks" of differently rotated grids
+    (as produced by autofit.py), which replace cols/rows.
+    """
+    return _plan(
+        Rect(*board_rect),
+        int(settings["cols"]),
+        int(settings["rows"]),
+        from_mm(settings["gap_mm"]),
+        settings.get("method", "V-Cut"),
+        from_mm(settings["panel_w_mm"]),
+        from_mm(settings["panel_h_mm"]),
+        from_mm(settings.get("tab_spacing_mm", DEFAULT_TAB_SPACING_MM)),
+        settings.get("alternate", "none"),
+        int(settings.get("alternate_rotation", 0)) % 360,
+        bool(settings.get("alternate_flip", False)),
+        _blocks_key(settings.get("blocks")),
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _plan(board, cols, rows, gap, method, panel_w, panel_h, tab_spacing,
+          alternate="none", alt_rotation=0, alt_flip=False, blocks=None):
+    plan = PanelPlan(board, cols, rows, gap, method, panel_w, panel_h, tab_spacing)
+
+    if blocks:
+        placed = _place_blocks(board, blocks, gap)
+    else:
+        placed = _place_grid(board, cols, rows, gap, alternate, alt_rotation, alt_flip, plan.problems)
+    _anchor(plan, placed)
+
+    # Frame is centered on the array
+    a = plan.array
+    margin_x = (panel_w - a.w) / 2
+    margin_y = (panel_h - a.h) / 2
+    plan.frame = Rect(a.x - margin_x, a.y - margin_y, panel_w, panel_h)
+
+    if method == "V-Cut":
+        _plan_vcuts(plan)
+    elif method == "Mousebites":
+        _plan_tabs(plan)
+
+    return plan
+
+
+def _alternates(pattern, row, col):
+    if pattern == "rows":
+        return row % 2 == 1
+    if pattern == "columns":
+        return col % 2 == 1
+    if pattern == "checker":
+        return (row + col) % 2 == 1
+    return False
+
+
+def _place_grid(board, cols, rows, gap, alternate, alt_rotation, alt_flip, problems):
+    """
+    (row, col, x, y, rotation, flip) for a cols x rows grid, relative to the
+    grid's top left corner. Cells of one column share a width and cells of
+    one row a height, so 180 degree turns and flips keep the plain grid.
+    """
+    if alternate not in ALTERNATE_PATTERNS or alt_rotation not in ROTATIONS:
+        problems.append("Unknown alternate pattern {!r} / rotation {}.".format(alternate, alt_rotation))
+        alternate = "none"
+    if alternate != "none" and alt_rotation % 180 and board.w != board.h:
+        problems.append("Turning every other cell by 90 degrees only works for square boards;\n"
+                        "use Auto-fit for mixed-orientation blocks instead.")
+        alternate = "none"
+
+    pitch_x, pitch_y = board.w + gap, board.h + gap
+    placed = []
+    for r in range(rows):
+        for c in range(cols):
+            if _alternates(alternate, r, c):
+                placed.append((r, c, c * pitch_x, r * pitch_y, alt_rotation, alt_flip))
+            else:
+                placed.append((r, c, c * pitch_x, r * pitch_y, 0, False))
+    return placed
+
+
+def _place_blocks(board, blocks, gap):
+    """
+    Cells for explicit GridBlocks. Rows and columns are numbered across the
+    whole panel by position, so (row, col) stays a unique cell key.
+    """
+    cells = []
+    for blk in blocks:
+        w, h = (board.w, board.h) if blk.rotation % 180 == 0 else (board.h, board.w)
+        for r in range(blk.rows):
+            for c in range(blk.cols):
+                cells.append((blk.x + c * (w + gap), blk.y + r * (h + gap), blk.rotation))
+    xs = sorted(set(x for x, _, _ in cells))
+    ys = sorted(set(y for _, y, _ in cells))
+    col_of = dict((x, i) for i, x in enumerate(xs))
+    row_of = dict((y, i) for i, y in enumerate(ys))
+    return [(row_of[y], col_of[x], x, y, rot, False) for x, y, rot in cells]
+
+
+def _anchor(plan, placed):
+    """
+    Turns relative placements into Cells, picking the first upright cell as
+    the source and shifting everything so it lands on the source board.
+    """
+    board = plan.board
+    upright = [p for p in placed if p[4] == 0 and not p[5]]
+    if not upright:
+        plan.problems.append("Every cell is rotated or flipped; at least one must match the source board.")
+        upright = placed
+    src = min(upright, key=lambda p: (p[3], p[2]))
+    ox, oy = board.x - src[2], board.y - src[3]
+
+    plan.source = (src[0], src[1])
+    plan.cells = tuple(sorted(
+        (Cell(r, c, x + ox - board.x, y + oy - board.y, rot, flip) for r, c, x, y, rot, flip in placed),
+        key=lambda cell: (cell.row, cell.col)))
+    plan.rows = max(c.row for c in plan.cells) + 1
+    plan.cols = max(c.col for c in plan.cells) + 1
+
+    rects = [plan.cell_rect(c) for c in plan.cells]
+    x0 = min(r.x for r in rects)
+    y0 = min(r.y for r in rects)
+    x1 = max(r.x + r.w for r in rects)
+    y1 = max(r.y + r.h for r in rects)
+    plan.array = Rect(x0, y0, x1 - x0, y1 - y0)
+
+
+def _tab_offsets(length, spacing):
+    """
+    Evenly spaced tab positions along an edge of `length`, at least one.
+    """
+    n = max(1, int(round(length / spacing))) if spacing > 0 else 1
+    return [length * (i + 0.5) / n for i in range(n)]
+
+
+def facing_pairs(plan):
+    """
+    (cell, neighbour, angle, start, end) for every two cells whose sides face
+    each other exactly one gap apart: angle 0 if the neighbour is below,
+    90 if it is to the right. start/end bound the shared stretch along the
+    side. Cells are looked up by edge coordinate, so this is linear in the
+    number of cells for grids.
+    """
+    gap = plan.gap
+    rects = [(cell, plan.cell_rect(cell)) for cell in plan.cells]
+    by_left, by_top = {}, {}
+    for cell, r in rects:
+        by_left.setdefault(r.x, []).append((cell, r))
+        by_top.setdefault(r.y, []).append((cell, r))
+
+    pairs = []
+    for cell, r in rects:
+        for other, o in by_top.get(r.y + r.h + gap, ()):
+            start, end = max(r.x, o.x), min(r.x + r.w, o.x + o.w)
+            if end > start:
+                pairs.append((cell, other, 0.0, start, end))
+        for other, o in by_left.get(r.x + r.w + gap, ()):
+            start, end = max(r.y, o.y), min(r.y + r.h, o.y + o.h)
+            if end > start:
+                pairs.append((cell, other, 90.0, start, end))
+    return pairs
+
+
+def frame_sides(plan, pairs=None, slot=None):
+    """
+    (cell, angle, position, start, end) for every cell side that faces the
+    frame with no cell in between and room for a rail behind its slot: the
+    `slot` in front of the side is milled (the gap by default), so the rail
+    starts one slot out and must end before the frame stroke. angle 0 for
+    top and bottom sides, 90 for left and right; `position` is the middle of
+    the gap in front of the side. `pairs` are facing_pairs(), whose sides
+    face a neighbour instead.
+    """
+    gap, f = plan.gap, plan.frame
+    room = (gap if slot is None else slot) + plan.frame_width / 2.0
+    facing = set()
+    for cell, other, angle, _, _ in facing_pairs(plan) if pairs is None else pairs:
+        facing.add((cell, "bottom" if angle == 0.0 else "right"))
+        facing.add((other, "top" if angle == 0.0 else "left"))
+    rects = [(cell, plan.cell_rect(cell)) for cell in plan.cells]
+    a = plan.array
+
+    sides = []
+    for cell, r in rects:
+        x1, y1 = r.x + r.w, r.y + r.h
+        for name, angle, pos, outer, depth, strip in (
+                ("top", 0.0, r.y - gap / 2.0, r.y == a.y, r.y - f.y, (r.x, f.y, x1, r.y)),
+                ("bottom", 0.0, y1 + gap / 2.0, y1 == a.y + a.h, f.y + f.h - y1, (r.x, y1, x1, f.y + f.h)),
+                ("left", 90.0, r.x - gap / 2.0, r.x == a.x, r.x - f.x, (f.x, r.y, r.x, y1)),
+                ("right", 90.0, x1 + gap / 2.0, x1 == a.x + a.w, f.x + f.w - x1, (x1, r.y, f.x + f.w, y1))):
+            if (cell, name) in facing or depth < room:
+                continue
+            if not outer:
+                # Off the array's edge (block layouts): clear if no cell
+                # lies between the side and the frame
+                sx0, sy0, sx1, sy1 = strip
+                if any(o.x < sx1 and sx0 < o.x + o.w and o.y < sy1 and sy0 < o.y + o.h
+                       for other, o in rects if other is not cell):
+                    continue
+            start, end = (r.x, x1) if angle == 0.0 else (r.y, y1)
+            sides.append((cell, angle, pos, start, end))
+    return sides
+
+
+def _plan_tabs(plan):
+    half = plan.gap / 2.0
+    tabs = []
+    pairs = facing_pairs(plan)
+    for cell, other, angle, start, end in pairs:
+        offsets = _tab_offsets(end - start, plan.tab_spacing)
+        r = plan.cell_rect(cell)
+        if angle == 0.0:
+            y = r.y + r.h + half
+            tabs.append(TabEdge(cell.row, cell.col, angle, tuple((start + t, y) for t in offsets), start, end))
+        else:
+            x = r.x + r.w + half
+            tabs.append(TabEdge(cell.row, cell.col, angle, tuple((x, start + t) for t in offsets), start, end))
+    # The outer sides hang on the rails
+    for cell, angle, pos, start, end in frame_sides(plan, pairs):
+        offsets = _tab_offsets(end - start, plan.tab_spacing)
+        if angle == 0.0:
+            tabs.append(TabEdge(cell.row, cell.col, angle, tuple((start + t, pos) for t in offsets), start, end))
+        else:
+            tabs.append(TabEdge(cell.row, cell.col, angle, tuple((pos, start + t) for t in offsets), start, end))
+    plan.tabs = tuple(tabs)
+
+
+def _cut_lines(spans, gap):
+    """
+    Positions of straight cuts along one axis: in the middle of the gap
+    before every cell and after the last one, kept only where no cell spans
+    across. `spans` are the cells' (start, end) along that axis. Returns
+    (cut positions, True if every cell side got a cut).
+    """
+    lines = set()
+    for start, end in spans:
+        lines.add(start - gap // 2)
+        lines.add(end + gap - gap // 2)
+    clear = sorted(x for x in lines if not any(s < x < e for s, e in spans))
+    return tuple(clear), len(clear) == len(lines)
+
+
+def _plan_vcuts(plan):
+    frame, gap = plan.frame, plan.gap
+    rects = [plan.cell_rect(c) for c in plan.cells]
+
+    # Cuts run down the middle of every gap, plus the outer edges of the array
+    plan.cut_x, ok_x = _cut_lines(set((r.x, r.x + r.w) for r in rects), gap)
+    plan.cut_y, ok_y = _cut_lines(set((r.y, r.y + r.h) for r in rects), gap)
+    if not (ok_x and ok_y):
+        plan.problems.append("V-Cuts must run straight across the whole panel, and this layout has\n"
+                             "cells that would be cut through. Use Mousebites for mixed orientations.")
+
+    # Vertical cuts run from the top to the bottom frame edge, horizontal cuts
+    # only between the outer vertical cuts. Both are split at every crossing.
+    y_points = sorted(set(y for y in (frame.y,) + plan.cut_y + (frame.y + frame.h,)
+                          if frame.y <= y <= frame.y + frame.h))
+    x_points = sorted(set(plan.cut_x))
+
+    cuts = []
+    labels = []
+    for x in plan.cut_x:
+        for y1, y2 in zip(y_points, y_points[1:]):
+            if abs(y2 - y1) < MIN_SEGMENT:
+                continue
+            cuts.append(Segment(x, y1, x, y2, gap))
+        # Once per column, above the frame
+        labels.append(Label("VSCORE", x, frame.y - from_mm(5), 90.0))
+
+    for y in plan.cut_y:
+        for x1, x2 in zip(x_points, x_points[1:]):
+            if abs(x2 - x1) < MIN_SEGMENT:
+                continue
+            cuts.append(Segment(x1, y, x2, y, gap))
+        # Once per row, left of the frame
+        labels.append(Label("VSCORE", frame.x - from_mm(5), y, 0.0))
+
+    plan.cuts = tuple(cuts)
+    plan.labels = tuple(labels)
@@ -0,0 +1,153 @@
+"""
+Optional instrumentation for a panelize run.
+
+A PanelizeProfile collects per-phase wall-clock time, item counts by type,
+counts of pcbnew calls and peak memory, and writes them as a JSON report plus
+a human-readable log. When profiling is off the same calls hit a disabled
+profile, so call sites stay unconditional.
+
+Peak RSS comes from getrusage() and costs nothing. Peak Python memory needs
+tracemalloc, which hooks every allocation and slows the timed phases down
+several times over, so it is only traced with `trace_memory`; time a run
+and measure its memory in two separate runs. The report records whether
+tracemalloc was on, since it may also have been started outside the profile
+(python -X tracemalloc).
+"""
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+REPORT_SUFFIX = "_panelize_profile"
+
+
+class PanelizeProfile(object):
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.phases = {}        # name -> seconds, in first-seen order
+        self.calls = {}         # pcbnew call -> count
+        self.source_items = {}  # GetClass() -> count on the source board
+        self.created_items = 0
+        self.python_peak = None
+        self.rss_peak_kb = None
+        self.traced = False     # tracemalloc was on while timing
+        self._t0 = None
+        self._total = None
+        self._tracing = False
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self.traced = tracemalloc.is_tracing()
+        self._t0 = time.perf_counter()
+
+    def stop(self):
+        if not self.enabled or self._t0 is None:
+            return
+        self._total = time.perf_counter() - self._t0
+        if tracemalloc.is_tracing():
+            self.python_peak = tracemalloc.get_traced_memory()[1]
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+        if resource is not None:
+            self.rss_peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self._t0 = None
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def add_time(self, name, seconds):
+        if self.enabled:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, call, n=1):
+        if self.enabled:
+            self.calls[call] = self.calls.get(call, 0) + n
+
+    def created(self, n):
+        if self.enabled:
+            self.created_items += n
+
+    def count_source(self, by_type):
+        if self.enabled:
+            for name, items in by_type.items():
+                self.source_items[name] = self.source_items.get(name, 0) + len(items)
+
+    def report(self):
+        return {
+            "total_s": self._total,
+            "phases_s": self.phases,
+            "pcbnew_calls": self.calls,
+            "source_items": self.source_items,
+            "created_items": self.created_items,
+            "python_peak_bytes": self.python_peak,
+            "tracemalloc": self.traced,
+            "rss_peak_kb": self.rss_peak_kb,
+        }
+
+    def summary(self):
+        lines = []
+        if self._total is not None:
+            lines.append("Total: {:.3f} s".format(self._total))
+        if self.traced:
+            lines.append("  (tracemalloc was on: times are inflated)")
+        for name, secs in self.phases.items():
+            lines.append("  {:<12} {:8.3f} s".format(name, secs))
+        if self.source_items:
+            lines.append("Source items: " + ", ".join(
+                "{} {}".format(n, name) for name, n in sorted(self.source_items.items())))
+        lines.append("Created items: {}".format(self.created_items))
+        if self.calls:
+            lines.append("pcbnew calls: " + ", ".join(
+                "{} {}".format(name, n) for name, n in sorted(self.calls.items())))
+        if self.python_peak is not None:
+            lines.append("Peak Python memory: {:.1f} MB".format(self.python_peak / 1e6))
+        if self.rss_peak_kb is not None:
+            lines.append("Peak RSS: {:.1f} MB".format(self.rss_peak_kb / 1024.0))
+        return "\n".join(lines)
+
+    def write(self, directory, stem):
+        """
+        Writes <stem>_panelize_profile.json and .log into `directory`.
+        Returns (json path, log path).
+        """
+        base = os.path.join(directory, stem + REPORT_SUFFIX)
+        json_path, log_path = base + ".json", base + ".log"
+        with open(json_path, "w") as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+        logger = logging.getLogger("panelizer.profile")
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            for line in self.summary().splitlines():
+                logger.info(line)
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        return json_path, log_path
+
+
+NULL_PROFILE = PanelizeProfile(enabled=False)
@@ -0,0 +1,181 @@
+"""
+Panel recipes and the cache of panels built from them.
+
+A recipe is every panelize option for one board, saved as JSON next to it
+(`<board>.panel.json`):
+
+    {"format": "panelizer-recipe", "version": 1, "settings": {...}}
+
+`settings` holds what PanelizerDialog.GetSettings() returns plus any key the
+dialog has no field for (tab anchors, thieving pitch, ...); merge_recipe()
+only overwrites the dialog's own fields, so such options survive a save. A
+bare settings dict, as the CLI has always read, is accepted as a recipe too.
+
+OutputCache keeps the files built from a recipe (the panel `.kicad_pcb`, the
+fab zip, a step-and-repeat Gerber directory) under a key that hashes the
+recipe's settings, the engine, the plugin version and the bytes of the input
+files. Running an unchanged recipe on an unchanged board copies the cached
+files out instead of building them again. Entries are written to a temporary
+name and renamed into place, so parallel CI jobs sharing a cache never see
+half an entry.
+
+The cache lives in $PANELIZER_CACHE, or the user cache directory.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+RECIPE_FORMAT = "panelizer-recipe"
+RECIPE_VERSION = 1
+RECIPE_SUFFIX = ".panel.json"
+CACHE_VERSION = 1
+
+# Settings that do not change what is built
+NON_OUTPUT_KEYS = ("profile", "profile_dir", "fab_export")
+CHUNK = 1 << 20
+
+
+def recipe_path(board_path):
+    return os.path.splitext(board_path)[0] + RECIPE_SUFFIX
+
+
+def load_recipe(path):
+    """
+    The settings of the recipe at `path`.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and data.get("format") == RECIPE_FORMAT:
+        if data.get("version", 1) > RECIPE_VERSION:
+            raise ValueError("{}: recipe version {} is newer than this plugin".format(path, data["version"]))
+        return dict(data.get("settings") or {})
+    if not isinstance(data, dict):
+        raise ValueError("{}: not a panel recipe".format(path))
+    return data
+
+
+def save_recipe(path, settings):
+    """
+    Writes `settings` as the recipe at `path`.
+    """
+    data = {"format": RECIPE_FORMAT, "version": RECIPE_VERSION, "settings": settings}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def merge_recipe(recipe, settings, owned=("blocks",)):
+    """
+    `settings` on top of a saved `recipe`, keeping the recipe's keys that
+    `settings` does not set. Keys in `owned` belong to whoever produced
+    `settings` and are dropped from the recipe even when `settings` leaves
+    them out.
+    """
+    merged = dict((k, v) for k, v in (recipe or {}).items() if k not in owned)
+    merged.update(settings)
+    return merged
+
+
+def plugin_version():
+    """
+    The plugin's version from metadata.json, so a new release does not
+    reuse panels built by the old one.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metadata.json")
+    try:
+        with open(path, "r") as f:
+            return json.load(f)["versions"][0]["version"]
+    except (OSError, ValueError, KeyError, IndexError):
+        return ""
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def settings_digest(settings):
+    """
+    Hash of the settings that change the output, independent of key order.
+    """
+    relevant = dict((k, v) for k, v in settings.items() if k not in NON_OUTPUT_KEYS)
+    text = json.dumps(relevant, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def default_cache_dir():
+    root = os.environ.get("PANELIZER_CACHE")
+    if root:
+        return root
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "kicad_panelizer")
+
+
+class OutputCache(object):
+    """
+    Built outputs by key(), each entry a directory of named files (or
+    directories): "panel", "fab", ...
+    """
+    def __init__(self, root=None):
+        self.root = root or default_cache_dir()
+
+    def key(self, settings, engine, *paths):
+        h = hashlib.sha256()
+        for part in (str(CACHE_VERSION), plugin_version(), engine, settings_digest(settings)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        for path in paths:
+            h.update(file_digest(path).encode("ascii"))
+        return h.hexdigest()
+
+    def _entry(self, key, name):
+        return os.path.join(self.root, key[:2], key, name)
+
+    def restore(self, key, name, dst):
+        """
+        Copies the cached `name` of `key` to `dst`. Returns False on a miss.
+        """
+        src = self._entry(key, name)
+        if not os.path.exists(src):
+            return False
+        parent = os.path.dirname(os.path.abspath(dst))
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        if os.path.isdir(src):
+            if os.path.isdir(dst):
+                shutil.rmtree(dst)
+            shutil.copytree(src, dst)
+        else:
+            shutil.copyfile(src, dst)
+        return True
+
+    def store(self, key, name, src):
+        """
+        Caches the file or directory `src` as `name` of `key`.
+        """
+        dst = self._entry(key, name)
+        parent = os.path.dirname(dst)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        tmp = tempfile.mkdtemp(prefix=".tmp_", dir=parent)
+        try:
+            staged = os.path.join(tmp, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, staged)
+            else:
+                shutil.copyfile(src, staged)
+            if os.path.isdir(dst):
+                shutil.rmtree(dst, ignore_errors=True)
+            os.replace(staged, dst)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,205 @@
+"""
+Milled panel outlines: routed panels with breakaway tabs ("Routed Tabs"),
+and the outlines of mousebite panels.
+
+The board outlines stay in place and a router mills a slot of `route_width`
+around each of them, except under the tabs. The panel's Edge.Cuts are the
+outline of what is left:
+
+    milled = inflate(cell outlines, route_width) - (cells + tabs)
+    panel  = frame rectangle - milled
+
+The applier does this with one Inflate and two BooleanSubtract calls on
+SHAPE_POLY_SETs holding the whole panel, whatever the cell count, instead of
+one boolean per cell.
+
+Everything that is per cell is computed once in source coordinates and moved
+into every cell with one NumPy pass over the cell transforms:
+
+- the outline rings (and cutouts) of the source board;
+- the tabs: on every side of the board's bbox, one per `tab_spacing_mm`,
+  each reaching from the outline (found by casting a ray in from the side)
+  out across the slot into the rail, the neighbour, or the web left between
+  two slots when the gap is wider than both.
+
+A mousebite panel is milled the same way with the slot as wide as the gap,
+so facing slots meet and the whole gap is cut out. Its tabs are the
+mousebite tabs, as wide as their holes: the planned TabEdges, already on
+the panel, or the outline tabs, moved into every cell like the outlines.
+
+settings keys:
+    route_width_mm  -- router bit diameter, the width of the milled slot
+    tab_width_mm    -- width of a tab along the board edge
+"""
+import copy
+from collections import namedtuple
+
+import numpy as np
+
+from .plan import PanelizerError, from_mm
+from . import mousebites
+from .outline_tabs import template_row
+
+METHOD = "Routed Tabs"
+ROUTE_WIDTH_MM = 2.0
+TAB_WIDTH_MM = 3.0
+TAB_OVERLAP_MM = 0.5         # how far a tab reaches past the outline into the board
+
+# rings -- per outer loop, a cells x N x 2 array; holes -- the same for the
+#          cutouts, drawn as they are
+# tabs  -- ... x 4 x 2 tab quadrilaterals on the panel; width -- the slot width
+Routing = namedtuple("Routing", "rings holes tabs width")
+
+
+def wanted(plan):
+    return plan.method in (METHOD, "Mousebites")
+
+
+def slot_width(settings):
+    """
+    Width of the slot milled around every board with `settings`, or 0 when
+    the method leaves the board outlines alone.
+    """
+    method = settings.get("method", "V-Cut")
+    if method == METHOD:
+        return from_mm(settings.get("route_width_mm", ROUTE_WIDTH_MM))
+    if method == "Mousebites":
+        return from_mm(settings["gap_mm"])
+    return 0
+
+
+def _segments(rings):
+    a = np.concatenate([np.asarray(r, dtype=np.float64) for r in rings])
+    b = np.concatenate([np.roll(np.asarray(r, dtype=np.float64), -1, axis=0) for r in rings])
+    return a, b
+
+
+def ray_depths(rings, origins, axis, sign):
+    """
+    Distance from each origin (P x 2) along +/- `axis` (0 = x, 1 = y) to
+    the first outline crossing, or inf when the ray misses.
+    """
+    a, b = _segments(rings)
+    u, v = 1 - axis, axis            # u: across the ray, v: along it
+    o = np.asarray(origins, dtype=np.float64)
+    ou, ov = o[:, u:u + 1], o[:, v:v + 1]
+    au, av, bu, bv = a[:, u][None, :], a[:, v][None, :], b[:, u][None, :], b[:, v][None, :]
+    spans = ((au - ou) * (bu - ou) <= 0) & (au != bu)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        at = av + (ou - au) * (bv - av) / (bu - au)
+    d = sign * (at - ov)
+    d = np.where(spans & (d >= 0), d, np.inf)
+    return d.min(axis=1) if d.shape[1] else np.full(len(o), np.inf)
+
+
+def source_tabs(rings, rect, spacing, width, reach, overlap):
+    """
+    Tab quadrilaterals (T x 4 x 2) around the source board. `rect` is its
+    Edge.Cuts bbox (x, y, w, h); a tab starts `overlap` inside the outline
+    and ends `reach` outside the bbox side. Where the outline lies more than
+    `reach` behind the side (a notch, a rounded corner) no tab is placed.
+    """
+    x, y, w, h = rect
+    half = width / 2.0
+    tabs = []
+    # (along axis, side position, side start, side length, outward sign)
+    for axis, pos, start, length, out in ((0, y, x, w, -1), (0, y + h, x, w, 1),
+                                          (1, x, y, h, -1), (1, x + w, y, h, 1)):
+        n = max(1, int(round(length / spacing))) if spacing > 0 else 1
+        centres = start + (np.arange(n) + 0.5) * length / n
+        centres = centres[(centres - half >= start) & (centres + half <= start + length)]
+        if not len(centres):
+            continue
+        # Rays in from the side, at the middle and both ends of each tab
+        along = np.concatenate((centres - half, centres, centres + half))
+        side = np.full(len(along), float(pos))
+        origins = np.column_stack((along, side)) if axis == 0 else np.column_stack((side, along))
+        depth = ray_depths(rings, origins, 1 - axis, -out).reshape(3, -1)
+        deepest = depth.max(axis=0)
+        hit = deepest <= reach
+        for c, d in zip(centres[hit], deepest[hit]):
+            inner = pos - out * (d + overlap)
+            outer = pos + out * reach
+            if axis == 0:
+                tabs.append(((c - half, inner), (c + half, inner), (c + half, outer), (c - half, outer)))
+            else:
+                tabs.append(((inner, c - half), (outer, c - half), (outer, c + half), (inner, c + half)))
+    return np.array(tabs, dtype=np.float64).reshape(-1, 4, 2)
+
+
+def cell_points(plan, points):
+    """
+    Source `points` (... x 2) moved into every cell: cells x ... x 2.
+    """
+    m = np.array([plan.matrix(c) for c in plan.cells], dtype=np.float64).reshape(-1, 6)
+    pts = np.asarray(points, dtype=np.float64)
+    x, y = pts[..., 0][None], pts[..., 1][None]
+    shape = (-1,) + (1,) * pts[..., 0].ndim
+    px = m[:, 0].reshape(shape) * x + m[:, 1].reshape(shape) * y + m[:, 4].reshape(shape)
+    py = m[:, 2].reshape(shape) * x + m[:, 3].reshape(shape) * y + m[:, 5].reshape(shape)
+    return np.stack((px, py), axis=-1)
+
+
+def _quads(x0, y0, x1, y1):
+    return np.stack((np.column_stack((x0, y0)), np.column_stack((x1, y0)),
+                     np.column_stack((x1, y1)), np.column_stack((x0, y1))), axis=1)
+
+
+def edge_tabs(plan, overlap):
+    """
+    Quadrilaterals (T x 4 x 2, panel coordinates) of the planned mousebite
+    tabs: as wide as their holes, across the gap plus `overlap` into the
+    board or rail on both sides.
+    """
+    hx, _ = mousebites.tab_extent(mousebites.load_template(plan.gap))
+    across = plan.gap / 2.0 + overlap
+    quads = []
+    for edge in plan.tabs:
+        p = np.asarray(edge.points, dtype=np.float64).reshape(-1, 2)
+        along, cross = (hx, across) if edge.angle == 0.0 else (across, hx)
+        quads.append(_quads(p[:, 0] - along, p[:, 1] - cross, p[:, 0] + along, p[:, 1] + cross))
+    return np.concatenate(quads) if quads else np.zeros((0, 4, 2))
+
+
+def outline_tab_quads(plan, tabs, overlap):
+    """
+    Quadrilaterals (T x 4 x 2, source coordinates) of outline.OutlineTabs
+    `tabs`: as wide as a tab's holes, from `overlap` inside the outline out
+    across the gap.
+    """
+    along, _, _, sizes = template_row(mousebites.load_template(plan.gap), plan.gap)
+    half = float(np.max(np.abs(along) + sizes / 2.0)) if len(along) else 0.0
+    p, n = np.asarray(tabs.points, dtype=np.float64), np.asarray(tabs.normals, dtype=np.float64)
+    t = np.column_stack((-n[:, 1], n[:, 0])) * half
+    inner, outer = p - n * overlap, p + n * (plan.gap + overlap)
+    return np.stack((inner - t, outer - t, outer + t, inner + t), axis=1).reshape(-1, 4, 2)
+
+
+def place(plan, settings, outline):
+    """
+    `plan` with its Routing set, or `plan` itself for other methods. The
+    cached plan is not modified. `outline` is the source outline.Outline.
+    Call it on the placed plan, after the tabs have found their spots.
+    """
+    if not wanted(plan):
+        return plan
+    if not outline:
+        raise PanelizerError("Milled panel outlines need a closed Edge.Cuts outline.", plan.method)
+    overlap = from_mm(TAB_OVERLAP_MM)
+    route = slot_width(settings)
+    outer = [loop.outline for loop in outline]
+    holes = [h for loop in outline for h in loop.holes]
+    if plan.method == METHOD:
+        width = from_mm(settings.get("tab_width_mm", TAB_WIDTH_MM))
+        b = plan.board
+        tabs = cell_points(plan, source_tabs(outer, (b.x, b.y, b.w, b.h), plan.tab_spacing, width,
+                                             route + overlap, overlap))
+    elif plan.outline_tabs is not None:
+        tabs = cell_points(plan, outline_tab_quads(plan, plan.outline_tabs, overlap))
+    else:
+        tabs = edge_tabs(plan, overlap)
+
+    placed = copy.copy(plan)
+    placed.routing = Routing([cell_points(plan, r) for r in outer], [cell_points(plan, h) for h in holes],
+                             tabs, route)
+    return placed
@@ -0,0 +1,417 @@
+import hashlib
+
+import pcbnew
+from .applier import replicate_steps, add_decorations
+from .plan import plan_panel, check_plan, PanelizerError
+from .snapshot import BoardSnapshot
+from .spatial import CopperIndex
+from . import fixtures, nets, routing, thieving, validate, zones
+from .profiling import NULL_PROFILE
+
+# Methods that draw the panel's own Edge.Cuts around the cells, so the
+# source outline is not copied
+OWN_OUTLINE_METHODS = ("V-Cut", "Mousebites", routing.METHOD)
+
+
+class BatchCommit(object):
+    """
+    Groups every board change of one panelize/update into a single step:
+    adds and removes are queued and applied together in Push(). Action
+    plugins need no more than that, since KiCad records a plugin's Run() as
+    a single undo step, and headless runs have no undo stack.
+    """
+    def __init__(self, board):
+        self.board = board
+        self.to_add = []
+        self.to_remove = []
+        self.flushed = []        # uuids of items added by Flush()
+        self.flushed_nets = []   # nets added by Flush(); they have no uuid lookup
+
+    def Add(self, item):
+        self.to_add.append(item)
+
+    def Remove(self, item):
+        self.to_remove.append(item)
+
+    def Flush(self, mark=(0, 0, 0, 0)):
+        """
+        Applies the queued adds now and forgets their wrappers, keeping only
+        uuids for Revert(). Lets long replications hand items to the board
+        chunk by chunk instead of holding the whole panel in Python. With a
+        `mark` from Mark(), only the adds queued after it are applied.
+        """
+        start = mark[0]
+        for item in self.to_add[start:]:
+            self.board.Add(item)
+            if isinstance(item, pcbnew.NETINFO_ITEM):
+                self.flushed_nets.append(item)
+            else:
+                self.flushed.append(_kiid(item))
+        del self.to_add[start:]
+
+    def Push(self):
+        for item in self.to_remove:
+            self.board.Remove(item)
+        for item in self.to_add:
+            self.board.Add(item)
+        self.to_add = []
+        self.to_remove = []
+        self.flushed = []
+        self.flushed_nets = []
+
+    def Mark(self):
+        """
+        A point Revert() can go back to, keeping what was queued before it.
+        """
+        return len(self.to_add), len(self.to_remove), len(self.flushed), len(self.flushed_nets)
+
+    def Revert(self, mark=(0, 0, 0, 0)):
+        """
+        Drops everything queued and takes flushed items back off the board;
+        with a `mark` from Mark(), only what came after it.
+        """
+        to_add, to_remove, flushed, flushed_nets = mark
+        for item in resolve(self.board, self.flushed[flushed:]):
+            self.board.Remove(item)
+        for net in self.flushed_nets[flushed_nets:]:
+            self.board.Remove(net)
+        del self.to_add[to_add:]
+        del self.to_remove[to_remove:]
+        del self.flushed[flushed:]
+        del self.flushed_nets[flushed_nets:]
+
+
+def _kiid(item):
+    return item.m_Uuid.AsString()
+
+
+def _fingerprint(item):
+    """
+    What an edit or a move of a source item changes: its class and bbox.
+    """
+    box = item.GetBoundingBox()
+    return (item.GetClass(), box.GetX(), box.GetY(), box.GetWidth(), box.GetHeight())
+
+
+def resolve(board, kiids):
+    """
+    The live board items for a list of uuid strings; deleted ones are skipped.
+    """
+    items = []
+    for kiid in kiids:
+        item = board.GetItem(pcbnew.KIID(kiid))
+        if item is not None and item.GetClass() != "DELETED_BOARD_ITEM":
+            items.append(item.Cast())
+    return items
+
+
+class PanelSession(object):
+    """
+    A panel built on `board` that remembers which items belong to which cell.
+
+    update() diffs the new plan against the current one: cells that left the
+    grid are removed, cells that stayed are moved if the pitch changed, only
+    new cells are duplicated, and the frame and V-Cuts are redrawn. Growing a
+    5x5 panel to 5x6 costs one row of copies.
+
+    Cells are remembered by uuid rather than by wrapper, so the memory a
+    session holds does not grow with the number of items in the panel.
+
+    The source cell is checked by uuid before every update; when one of its
+    items was edited, moved or deleted it is snapshotted again and every
+    copy is rebuilt.
+    """
+    def __init__(self, board):
+        self.board = board
+        self._take_snapshot(BoardSnapshot(board))
+
+        self.plan = None
+        self.cells = {}          # (row, col) -> uuids of the duplicated items, copies only
+        self.decorations = []    # frame, V-Cut segments and labels
+        self.outline_removed = False
+        self.zone_mode = "refill"
+        self.zones_filled = False
+        self.zone_report = []
+        self.placement_report = []
+        self.per_cell_nets = False
+        self._markers = []
+        # True from a new snapshot of the source until every copy is rebuilt
+        self._source_stale = False
+
+    def is_alive(self):
+        """
+        False once the panel items are gone from the board (e.g. after the
+        user undid the panelize); the session must not be reused then.
+        Checks the frame plus the first item of every cell by uuid, so no
+        wrapper of a deleted item is ever touched.
+        """
+        if self.plan is None:
+            return True
+        return len(resolve(self.board, self._markers)) == len(self._markers)
+
+    def update(self, settings, commit=None, profile=NULL_PROFILE):
+        """
+        Brings the panel in line with `settings`. Changes are batched into
+        `commit` (a BatchCommit of our own is pushed if none is given; a
+        caller passing its own commit must call refill_zones() after pushing
+        it). Returns the new PanelPlan.
+        """
+        steps = self.update_steps(settings, commit, profile)
+        for _ in steps:
+            pass
+        return self.plan
+
+    def update_steps(self, settings, commit=None, profile=NULL_PROFILE):
+        """
+        update() as a generator that yields (cells done, cells to do) after
+        each replicated cell, so a caller can show progress and stay
+        responsive. Every cell is flushed to the board as soon as it is
+        built. Closing the generator before it finishes cancels the update:
+        the copies made so far are taken off the board and the session and
+        board are left as they were.
+        """
+        with profile.phase("source check"):
+            self.refresh_source()
+        with profile.phase("plan"):
+            plan = plan_panel(self.board_rect, settings)
+            check_plan(plan)
+        # Tabs and fixtures only depend on the source board, so the placed
+        # plan can be validated before the board is touched
+        with profile.phase("placement"):
+            plan, self.placement_report = fixtures.place(plan, self.copper_index, settings, self.snapshot.outline())
+        with profile.phase("validate"):
+            validate.check(plan, settings, self.copper_index, self.snapshot.outline())
+        with profile.phase("routing"):
+            plan = routing.place(plan, settings, self.snapshot.outline())
+        with profile.phase("thieving"):
+            plan = thieving.place(plan, settings)
+        profile.count_source(self.snapshot.by_type)
+
+        own_commit = commit is None
+        if own_commit:
+            commit = BatchCommit(self.board)
+        # A cancel takes back only this update's changes, not what a
+        # caller's commit held before
+        mark = commit.Mark()
+
+        zone_mode = settings.get("zone_fill", "refill")
+        if zone_mode == "replicate" and not self.zones_filled:
+            # Fill while the source outline is still on the board, so the
+            # fill (and every copy of it) keeps its edge clearance
+            with profile.phase("zone fill"):
+                zones.fill_zones(self.board, self.snapshot.zones)
+            profile.count("ZONE_FILLER.Fill")
+            self.zones_filled = True
+
+        # Nothing below touches the session until every cell is built;
+        # removals stay queued in the commit and moves come last, so a
+        # cancel only has to revert the commit.
+        old = self.plan
+        per_cell_nets = nets.wanted(settings)
+        wanted = dict(((c.row, c.col), c) for c in plan.copies())
+        if old is not None and (old.method != plan.method or per_cell_nets != self.per_cell_nets
+                                or self._source_stale or old.source != plan.source):
+            # Cell contents differ between methods (Edge.Cuts or not) and
+            # net modes, and after the source changed. A new source cell
+            # (block layouts) makes the old source key a copy and a copy
+            # key the source, so nothing can be kept.
+            gone = list(self.cells)
+            old = None
+        else:
+            # A cell whose rotation or flip changed is rebuilt, not moved
+            before = dict(((c.row, c.col), c) for c in old.cells) if old is not None else {}
+            gone = [k for k in self.cells
+                    if k not in wanted or (wanted[k].rotation, wanted[k].flip) != (before[k].rotation, before[k].flip)]
+        kept = [k for k in self.cells if k not in gone]
+        self._remove_cells(gone, commit)
+
+        missing = [cell for key, cell in wanted.items() if key not in kept]
+        skip_edges = plan.method in OWN_OUTLINE_METHODS
+        source = self.snapshot.source_items(skip_edge_cuts=skip_edges)
+        remap = codes = None
+        if per_cell_nets and missing:
+            with profile.phase("nets"):
+                codes, remap = self.net_remap(source, skip_edges)
+        added = {}
+        try:
+            for cell, items in replicate_steps(self.board, missing, source, commit.Add, profile, self.board_rect):
+                if remap is not None:
+                    with profile.phase("nets"):
+                        profile.count("SetNet", nets.assign(items, codes, remap.table((cell.row, cell.col), commit.Add)))
+                if zone_mode == "replicate":
+                    zones.mark_filled([i for i in items if i.GetClass() == "ZONE"])
+                added[(cell.row, cell.col)] = [_kiid(i) for i in items]
+                del items
+                commit.Flush(mark)
+                yield len(added), len(missing)
+        except GeneratorExit:
+            commit.Revert(mark)
+            # The reverted nets may be cached in the remap tables
+            self._net_remap = None
+            raise
+
+        for key in gone:
+            del self.cells[key]
+        if old is not None:
+            with profile.phase("move"):
+                self._move_cells(old, plan)
+        self._set_outline_removed(plan.method in OWN_OUTLINE_METHODS, commit)
+        self.cells.update(added)
+        self.zone_mode = zone_mode
+        self.per_cell_nets = per_cell_nets
+        self._source_stale = False
+
+        for item in self.decorations:
+            commit.Remove(item)
+        profile.count("Remove", len(self.decorations))
+        self.decorations = add_decorations(self.board, plan, commit.Add, profile)
+
+        self.plan = plan
+        self._markers = [_kiid(i) for i in self.decorations[:1]]
+        self._markers.extend(kiids[0] for kiids in self.cells.values() if kiids)
+
+        if own_commit:
+            with profile.phase("commit"):
+                commit.Push()
+            with profile.phase("zone refill"):
+                self.refill_zones()
+
+    def refresh_source(self):
+        """
+        Snapshots the source cell again if it changed since the last
+        snapshot; the next update then rebuilds every copy. Returns True if
+        it did.
+        """
+        if self.plan is None or not self._source_changed():
+            return False
+        self._take_snapshot(self._source_snapshot())
+        self._source_stale = True
+        return True
+
+    def _take_snapshot(self, snapshot):
+        """
+        Makes `snapshot` the source and drops everything derived from the
+        previous one.
+        """
+        if snapshot.bbox is None:
+            raise PanelizerError("No Edge.Cuts found!", "Error")
+        self.snapshot = snapshot
+        self.board_rect = snapshot.board_rect
+        self.zones_filled = False
+        self._net_remap = None
+        self._net_codes = {}     # skip_edge_cuts -> nets.source_codes()
+        self._copper = None
+        # uuid -> _fingerprint() of every source item
+        self._source_state = dict((_kiid(i), _fingerprint(i)) for i in snapshot.items)
+
+    def source_digest(self):
+        """
+        Hash of the source cell the session last snapshotted: the uuid and
+        _fingerprint() of every item. Call refresh_source() first to pick
+        up edits made since.
+        """
+        h = hashlib.sha256()
+        for kiid, fingerprint in sorted(self._source_state.items()):
+            h.update(repr((kiid, fingerprint)).encode("utf-8"))
+        return h.hexdigest()
+
+    def _source_changed(self):
+        """
+        True if an item of the source cell was edited, moved or deleted, or
+        an item was added to the board, since the snapshot. Items are looked
+        up by uuid, so no wrapper of a deleted item is touched; the outline
+        the session took off the board is left out.
+        """
+        state = self._source_state
+        if self.outline_removed:
+            off = set(_kiid(d) for d in self.snapshot.edge_cuts)
+            state = dict((k, v) for k, v in state.items() if k not in off)
+        # Anything on the board that is neither source nor panel is new
+        board = self.board
+        panel = len(self.decorations) + sum(len(kiids) for kiids in self.cells.values())
+        total = len(board.Tracks()) + len(board.Footprints()) + len(board.Zones()) + len(board.Drawings())
+        if total != len(state) + panel:
+            return True
+        items = resolve(board, list(state))
+        return len(items) != len(state) or any(_fingerprint(i) != state[_kiid(i)] for i in items)
+
+    def _source_snapshot(self):
+        """
+        A new snapshot of the source cell: every board item except the
+        panel's copies and decorations, plus the outline the session took
+        off the board.
+        """
+        panel = set(_kiid(d) for d in self.decorations)
+        for kiids in self.cells.values():
+            panel.update(kiids)
+        snapshot = BoardSnapshot(self.board, skip=panel)
+        if self.outline_removed:
+            snapshot.add_drawings(self.snapshot.edge_cuts)
+        return snapshot
+
+    def net_remap(self, source, skip_edges):
+        """
+        (net codes of `source`, nets.NetRemap of the source board), both
+        computed on first use; later updates reuse the codes and the
+        per-cell nets already created.
+        """
+        codes = self._net_codes.get(skip_edges)
+        if codes is None:
+            codes = self._net_codes[skip_edges] = nets.source_codes(source)
+        if self._net_remap is None:
+            self._net_remap = nets.NetRemap(self.board, codes)
+        return codes, self._net_remap
+
+    def copper_index(self):
+        """
+        spatial.CopperIndex of the source board, built on first use and
+        shared by every later update.
+        """
+        if self._copper is None:
+            self._copper = CopperIndex(self.snapshot)
+        return self._copper
+
+    def refill_zones(self):
+        """
+        In "replicate" mode, refills only the zone copies whose surroundings
+        differ from the source (see zones.stale_cells()). The report lines are
+        kept in `zone_report`.
+        """
+        self.zone_report = []
+        if self.zone_mode != "replicate" or not self.snapshot.zones:
+            return
+        copies = {self.plan.source: self.snapshot.zones}
+        for key, kiids in self.cells.items():
+            copies[key] = [i for i in resolve(self.board, kiids) if i.GetClass() == "ZONE"]
+        self.zone_report = zones.refill_stale(self.board, self.plan, self.snapshot.zones, copies)
+
+    def _remove_cells(self, keys, commit):
+        for key in keys:
+            for item in resolve(self.board, self.cells[key]):
+                commit.Remove(item)
+
+    def _move_cells(self, old, plan):
+        """
+        Shifts kept cells whose position changed (e.g. a new gap). Their
+        rotation and flip are unchanged, so a translation is enough.
+        """
+        before = dict(((c.row, c.col), c) for c in old.cells)
+        after = dict(((c.row, c.col), c) for c in plan.cells)
+        for key, kiids in self.cells.items():
+            dx = int(after[key].dx) - int(before[key].dx)
+            dy = int(after[key].dy) - int(before[key].dy)
+            if not dx and not dy:
+                continue
+            vec = pcbnew.VECTOR2I(dx, dy)
+            for item in resolve(self.board, kiids):
+                item.Move(vec)
+
+    def _set_outline_removed(self, removed, commit):
+        if removed == self.outline_removed:
+            return
+        for d in self.snapshot.edge_cuts:
+            if removed:
+                commit.Remove(d)
+            else:
+                commit.Add(d)
+        self.outline_removed = removed
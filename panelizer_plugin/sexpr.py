@@ -0,0 +1,123 @@
+"""
+Minimal S-expression reader for KiCad files (.kicad_pcb, .kicad_mod).
+
+The parser keeps the source offsets of every list and atom, so callers can
+copy untouched items verbatim and rewrite only the tokens they care about.
+"""
+import re
+
+_TOKEN_RE = re.compile(r'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+
+
+class Atom(object):
+    __slots__ = ("value", "start", "end")
+
+    def __init__(self, value, start, end):
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return "Atom({!r})".format(self.value)
+
+
+class Node(object):
+    """
+    A parenthesized list. `head` is the first atom's text (e.g. "footprint"),
+    `items` the remaining children, `start`/`end` the offsets of the parens.
+    """
+    __slots__ = ("head", "items", "start", "end")
+
+    def __init__(self, start):
+        self.head = None
+        self.items = []
+        self.start = start
+        self.end = None
+
+    def __repr__(self):
+        return "Node({!r}, {} items)".format(self.head, len(self.items))
+
+    def find(self, head):
+        """
+        First direct child list named `head`, or None.
+        """
+        for item in self.items:
+            if isinstance(item, Node) and item.head == head:
+                return item
+        return None
+
+    def find_all(self, head):
+        return [i for i in self.items if isinstance(i, Node) and i.head == head]
+
+    def atoms(self):
+        return [i.value for i in self.items if isinstance(i, Atom)]
+
+    def walk(self):
+        """
+        Depth-first iteration over this node and every nested list.
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed([i for i in node.items if isinstance(i, Node)]))
+
+
+def parse(text):
+    """
+    Parses `text` and returns the top-level Node.
+    """
+    stack = []
+    root = None
+    for m in _TOKEN_RE.finditer(text):
+        tok = m.group(0)
+        if tok == "(":
+            node = Node(m.start())
+            if stack:
+                stack[-1].items.append(node)
+            stack.append(node)
+        elif tok == ")":
+            if not stack:
+                raise ValueError("Unbalanced ')' at offset {}".format(m.start()))
+            node = stack.pop()
+            node.end = m.end()
+            if not stack:
+                root = node
+                break
+        else:
+            if not stack:
+                raise ValueError("Atom outside of list at offset {}".format(m.start()))
+            node = stack[-1]
+            if node.head is None and not node.items:
+                node.head = tok
+            else:
+                node.items.append(Atom(tok, m.start(), m.end()))
+    if root is None:
+        raise ValueError("Unterminated S-expression")
+    return root
+
+
+def unquote(value):
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def to_iu(value):
+    """
+    Converts a millimetre token to integer internal units (nm).
+    """
+    return int(round(float(value) * 1000000))
+
+
+def fmt_mm(iu):
+    """
+    Formats internal units as millimetres the way KiCad writes them: no
+    exponent, at most 6 decimals, no trailing zeros.
+    """
+    iu = int(round(iu))
+    sign = "-" if iu < 0 else ""
+    whole, frac = divmod(abs(iu), 1000000)
+    if not frac:
+        return "{}{}".format(sign, whole)
+    return "{}{}.{}".format(sign, whole, "{:06d}".format(frac).rstrip("0"))
@@ -0,0 +1,97 @@
+import pcbnew
+
+
+class BoardSnapshot(object):
+    """
+    One pass over a board's tracks, footprints, zones and drawings.
+
+    Every board.Tracks()/Drawings()/... call builds a fresh list of SWIG
+    wrappers, so the panelizer takes a single snapshot up front and reads
+    everything from its indexes:
+
+    items     -- all items, in board order (tracks, footprints, zones, drawings)
+    by_layer  -- GetLayer() id -> [items]
+    by_type   -- GetClass() name ("PCB_TRACK", "FOOTPRINT", ...) -> [items]
+    edge_cuts -- Edge.Cuts drawings, the by_layer list of that layer
+    bbox      -- merged BOX2I of edge_cuts, or None
+
+    `skip` is a set of uuid strings of items to leave out, e.g. the copies
+    and decorations of a panel built on the board.
+    """
+    def __init__(self, board, skip=None):
+        self.board = board
+        self.tracks = []
+        self.footprints = []
+        self.zones = []
+        self.drawings = []
+        self.by_layer = {}
+        self.by_type = {}
+        self.edge_cuts = self.by_layer.setdefault(pcbnew.Edge_Cuts, [])
+        self.bbox = None
+        self._outline = None
+
+        for bucket, items in (
+            (self.tracks, board.Tracks()),
+            (self.footprints, board.Footprints()),
+            (self.zones, board.Zones()),
+            (self.drawings, board.Drawings()),
+        ):
+            for item in items:
+                if skip and item.m_Uuid.AsString() in skip:
+                    continue
+                bucket.append(item)
+                self._index(item)
+
+        self.items = self.tracks + self.footprints + self.zones + self.drawings
+
+    def add_drawings(self, drawings):
+        """
+        Indexes `drawings` that are not on the board (e.g. a source outline
+        a panel took off it) as if they were.
+        """
+        for item in drawings:
+            self.drawings.append(item)
+            self._index(item)
+        self.items = self.tracks + self.footprints + self.zones + self.drawings
+        self._outline = None
+
+    def _index(self, item):
+        layer = item.GetLayer()
+        self.by_layer.setdefault(layer, []).append(item)
+        self.by_type.setdefault(item.GetClass(), []).append(item)
+
+        if layer == pcbnew.Edge_Cuts:
+            if self.bbox is None:
+                self.bbox = item.GetBoundingBox()
+            else:
+                self.bbox.Merge(item.GetBoundingBox())
+
+    @property
+    def board_rect(self):
+        """
+        Edge.Cuts bbox as a plain (x, y, w, h) tuple, or None.
+        """
+        if self.bbox is None:
+            return None
+        return (self.bbox.GetX(), self.bbox.GetY(), self.bbox.GetWidth(), self.bbox.GetHeight())
+
+    def layer(self, layer):
+        return self.by_layer.get(layer, [])
+
+    def source_items(self, skip_edge_cuts=False):
+        """
+        Items to replicate into every panel cell.
+        """
+        if not skip_edge_cuts:
+            return list(self.items)
+        edges = set(id(e) for e in self.edge_cuts)
+        return [i for i in self.items if id(i) not in edges]
+
+    def outline(self):
+        """
+        Chained Edge.Cuts outline (outline.Outline), computed on first use.
+        """
+        if self._outline is None:
+            from .utils import extract_outline
+            self._outline = extract_outline(self)
+        return self._outline
@@ -0,0 +1,253 @@
+"""
+Clearance queries against the copper of a panel.
+
+CopperIndex is built once from the source board's pads, tracks, copper
+drawings and zones:
+their bounding boxes go into a uniform grid, so a query only looks at the
+buckets it overlaps instead of every item. Zones usually span the whole
+board, so they are kept out of the grid and tested exactly against their
+outline polygons.
+
+Cell copies are never indexed. PanelIndex finds the cells a query rectangle
+touches (through a second grid over the cell rects) and maps the rectangle
+back into source coordinates with the inverse of each cell's transform, so
+one source index answers for the whole panel.
+
+Rectangles are (x0, y0, x1, y1) in KiCad internal units (nm).
+"""
+import math
+
+import numpy as np
+import pcbnew
+
+from .plan import transform_rect
+
+# Items whose bbox spans more buckets than this are scanned on every query
+MAX_BUCKETS_PER_ITEM = 64
+# Classes that sit on a copper layer but are indexed through their pads or
+# fill outline instead of their bbox
+NOT_COPPER = ("FOOTPRINT", "ZONE")
+
+
+def _hits(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _inflate(rect, d):
+    return (rect[0] - d, rect[1] - d, rect[2] + d, rect[3] + d)
+
+
+def _box_rect(box):
+    return (box.GetLeft(), box.GetTop(), box.GetRight(), box.GetBottom())
+
+
+class GridIndex(object):
+    """
+    Uniform grid over N rectangles. `cell_size` defaults to twice the median
+    rectangle size, which keeps most items in one to four buckets.
+    """
+    def __init__(self, rects, cell_size=None):
+        self.rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        if cell_size is None:
+            if len(self.rects):
+                extent = np.maximum(self.rects[:, 2] - self.rects[:, 0], self.rects[:, 3] - self.rects[:, 1])
+                cell_size = 2 * float(np.median(extent))
+            cell_size = cell_size or 1.0
+        self.cell_size = max(float(cell_size), 1.0)
+        self.buckets = {}
+        self.large = []
+
+        lo = np.floor(self.rects[:, :2] / self.cell_size).astype(np.int64)
+        hi = np.floor(self.rects[:, 2:] / self.cell_size).astype(np.int64)
+        span = (hi - lo + 1).prod(axis=1) if len(self.rects) else ()
+        for i, n in enumerate(span):
+            if n > MAX_BUCKETS_PER_ITEM:
+                self.large.append(i)
+                continue
+            for gx in range(lo[i, 0], hi[i, 0] + 1):
+                for gy in range(lo[i, 1], hi[i, 1] + 1):
+                    self.buckets.setdefault((gx, gy), []).append(i)
+
+    def query(self, rect):
+        """
+        Indices of the rectangles overlapping `rect`.
+        """
+        if not len(self.rects):
+            return []
+        s = self.cell_size
+        gx0, gx1 = int(math.floor(rect[0] / s)), int(math.floor(rect[2] / s))
+        gy0, gy1 = int(math.floor(rect[1] / s)), int(math.floor(rect[3] / s))
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(self.buckets):
+            # Long queries (cut lines) cover more buckets than are filled
+            idx = np.arange(len(self.rects))
+        else:
+            found = set(self.large)
+            for gx in range(gx0, gx1 + 1):
+                for gy in range(gy0, gy1 + 1):
+                    found.update(self.buckets.get((gx, gy), ()))
+            if not found:
+                return []
+            idx = np.fromiter(found, dtype=np.int64, count=len(found))
+        r = self.rects[idx]
+        keep = (r[:, 0] <= rect[2]) & (rect[0] <= r[:, 2]) & (r[:, 1] <= rect[3]) & (rect[1] <= r[:, 3])
+        return idx[keep].tolist()
+
+
+def _segments_hit_rect(pts, rect):
+    """
+    True if any edge of the closed polygon `pts` (N x 2) touches `rect`
+    (Liang-Barsky clipping, all edges at once).
+    """
+    a = pts
+    b = np.roll(pts, -1, axis=0)
+    d = b - a
+    t0 = np.zeros(len(a))
+    t1 = np.ones(len(a))
+    outside = np.zeros(len(a), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-d[:, 0], a[:, 0] - rect[0]), (d[:, 0], rect[2] - a[:, 0]),
+                     (-d[:, 1], a[:, 1] - rect[1]), (d[:, 1], rect[3] - a[:, 1])):
+            t = q / p
+            t0 = np.where(p < 0, np.maximum(t0, t), t0)
+            t1 = np.where(p > 0, np.minimum(t1, t), t1)
+            outside |= (p == 0) & (q < 0)
+    return bool(np.any(~outside & (t0 <= t1)))
+
+
+def _point_in_polygon(pts, x, y):
+    a = pts
+    b = np.roll(pts, -1, axis=0)
+    crosses = (a[:, 1] > y) != (b[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xs = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return bool(np.count_nonzero(crosses & (x < xs)) % 2)
+
+
+def polygon_hits_rect(pts, rect):
+    """
+    True if the polygon `pts` (N x 2) overlaps `rect`.
+    """
+    if _segments_hit_rect(pts, rect):
+        return True
+    # No edge crosses the rectangle: it is either wholly inside or outside
+    return _point_in_polygon(pts, rect[0], rect[1])
+
+
+def _outlines(zone):
+    poly = zone.Outline()
+    out = []
+    for i in range(poly.OutlineCount()):
+        chain = poly.Outline(i)
+        pts = [chain.CPoint(j) for j in range(chain.PointCount())]
+        if len(pts) >= 3:
+            out.append(np.array([(p.x, p.y) for p in pts], dtype=np.float64))
+    return out
+
+
+def _courtyard(fp):
+    """
+    Bounding rect of a footprint's courtyard, or None if it has none. The
+    footprint's own bbox also covers silkscreen and fab graphics, which may
+    reach well past the part.
+    """
+    box = None
+    for item in fp.GraphicalItems():
+        if item.GetLayer() in (pcbnew.F_CrtYd, pcbnew.B_CrtYd):
+            if box is None:
+                box = item.GetBoundingBox()
+            else:
+                box.Merge(item.GetBoundingBox())
+    return None if box is None else _box_rect(box)
+
+
+class CopperIndex(object):
+    """
+    Copper of the source board: pads, tracks (vias included) and drawings on
+    copper layers by bounding box in a GridIndex, zones by outline. Footprint
+    courtyards are kept in a second grid, `parts`. Build it from a
+    BoardSnapshot.
+    """
+    def __init__(self, snapshot):
+        rects = []
+        for fp in snapshot.footprints:
+            rects.extend(_box_rect(p.GetBoundingBox()) for p in fp.Pads())
+        for layer, items in snapshot.by_layer.items():
+            if pcbnew.IsCopperLayer(layer):
+                rects.extend(_box_rect(i.GetBoundingBox()) for i in items if i.GetClass() not in NOT_COPPER)
+        self.grid = GridIndex(rects)
+        self.parts = GridIndex([r for r in (_courtyard(fp) for fp in snapshot.footprints) if r is not None])
+        self.zones = []
+        for zone in snapshot.zones:
+            outlines = _outlines(zone)
+            if outlines:
+                self.zones.append((_box_rect(zone.GetBoundingBox()), outlines))
+
+    def hits(self, rect, clearance=0, parts=False, zones=True):
+        """
+        True if any copper (or, with `parts`, any courtyard) lies within
+        `clearance` of `rect`. Zones are skipped with `zones=False`; their
+        fill keeps its own clearance from the board edge.
+        """
+        reach = _inflate(rect, clearance)
+        if self.grid.query(reach):
+            return True
+        if parts and self.parts.query(reach):
+            return True
+        for box, outlines in (self.zones if zones else ()):
+            if _hits(box, reach) and any(polygon_hits_rect(pts, reach) for pts in outlines):
+                return True
+        return False
+
+
+def invert_matrix(m):
+    a, b, c, d, e, f = m
+    det = a * d - b * c
+    ia, ib, ic, id_ = d / det, -b / det, -c / det, a / det
+    return (ia, ib, ic, id_, -(ia * e + ib * f), -(ic * e + id_ * f))
+
+
+class PanelIndex(object):
+    """
+    Clearance queries in panel coordinates for `plan`, answered by one
+    CopperIndex of the source board. Cells are rotated by multiples of 90
+    degrees, so a rectangle maps back to a rectangle.
+    """
+    def __init__(self, plan, copper):
+        self.plan = plan
+        self.copper = copper
+        self.cells = list(plan.cells)
+        self.cell_rects = []
+        for cell in self.cells:
+            r = plan.cell_rect(cell)
+            self.cell_rects.append((r.x, r.y, r.x + r.w, r.y + r.h))
+        self.grid = GridIndex(self.cell_rects)
+        self.inverse = [invert_matrix(plan.matrix(c)) for c in self.cells]
+
+    def on_board(self, rect, clearance=0):
+        """
+        True if `rect` comes within `clearance` of any cell's bbox.
+        """
+        return bool(self.grid.query(_inflate(rect, clearance)))
+
+    def hits(self, rect, clearance=0, parts=False, zones=True):
+        """
+        True if any copper (or courtyard, with `parts`) of any cell lies
+        within `clearance` of `rect`.
+        """
+        return bool(self.hits_cells(rect, clearance, parts, zones, first=True))
+
+    def hits_cells(self, rect, clearance=0, parts=False, zones=True, first=False):
+        """
+        Cells whose copper (or courtyards) lie within `clearance` of `rect`.
+        Long rectangles such as cut lines are clipped to each cell first, so
+        the source index only sees the part that lies on the board.
+        """
+        found = []
+        for i in self.grid.query(_inflate(rect, clearance)):
+            c = _inflate(self.cell_rects[i], clearance)
+            clipped = (max(rect[0], c[0]), max(rect[1], c[1]), min(rect[2], c[2]), min(rect[3], c[3]))
+            if self.copper.hits(transform_rect(self.inverse[i], clipped), clearance, parts, zones):
+                found.append(self.cells[i])
+                if first:
+                    break
+        return found
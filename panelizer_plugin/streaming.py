@@ -0,0 +1,327 @@
+"""
+Streaming panel writer that works on the .kicad_pcb text directly.
+
+The pcbnew path pays Duplicate() + Move() + board.Add() for every item in
+every cell. Here the source file is parsed once, every replicated item is
+compiled into a template whose coordinate and uuid tokens are slots, and each
+cell copy is rendered by filling those slots with shifted values and written
+straight to the output file.
+
+The result carries the same items as panelize_board() for the same settings:
+every cell copy, the Edge.Cuts frame, and the V-Cut segments and VSCORE
+labels. Only the uuids of new items differ, as they do between any two pcbnew
+runs. Mousebite and routed panels need their outline milled around the tabs,
+which takes polygon booleans, so they are left to the pcbnew engine.
+"""
+import math
+import uuid
+
+from .plan import plan_panel, check_plan, PanelizerError
+from .autofit import fit_settings
+from . import fixtures, outline_tabs, routing, thieving, validate
+from .sexpr import Atom, Node, parse, unquote, to_iu, fmt_mm
+
+# Top-level items that belong to the board layout and are copied per cell.
+REPLICATED = frozenset((
+    "footprint", "segment", "arc", "via", "zone",
+    "gr_line", "gr_arc", "gr_circle", "gr_rect", "gr_poly", "gr_curve",
+    "gr_text", "gr_text_box", "gr_vector", "dimension", "image", "target", "table",
+))
+
+# Lists whose first two atoms are an absolute X/Y position.
+COORD_HEADS = frozenset(("at", "start", "end", "mid", "center", "xy"))
+
+UUID_HEADS = frozenset(("uuid", "tstamp"))
+
+
+class _Template(object):
+    """
+    An item's source text cut at every token that changes between cells.
+    `pieces` has one more entry than `slots`; slots are ("x", iu), ("y", iu)
+    or ("uuid", quoted).
+    """
+    __slots__ = ("pieces", "slots")
+
+    def __init__(self, text, node, edits):
+        pieces = []
+        slots = []
+        pos = node.start
+        for start, end, kind, value in edits:
+            pieces.append(text[pos:start])
+            slots.append((kind, value))
+            pos = end
+        pieces.append(text[pos:node.end])
+        self.pieces = pieces
+        self.slots = slots
+
+    def render(self, dx, dy):
+        pieces = self.pieces
+        out = [pieces[0]]
+        for i, (kind, value) in enumerate(self.slots):
+            if kind == "x":
+                out.append(fmt_mm(value + dx))
+            elif kind == "y":
+                out.append(fmt_mm(value + dy))
+            elif value:
+                out.append('"{}"'.format(uuid.uuid4()))
+            else:
+                out.append(str(uuid.uuid4()))
+            out.append(pieces[i + 1])
+        return "".join(out)
+
+
+def _collect_edits(node, edits):
+    """
+    Records the coordinate and uuid tokens of `node` and its children.
+    Footprint children (pads, fp_* graphics, texts) are stored relative to the
+    footprint, so only the footprint's own position and its zones move.
+    """
+    for child in node.items:
+        if not isinstance(child, Node):
+            continue
+        head = child.head
+        if head in COORD_HEADS:
+            _add_xy(child, edits)
+        elif head in UUID_HEADS:
+            _add_uuid(child, edits)
+        elif node.head == "footprint" and head != "zone":
+            # Children keep their relative coordinates; uuids still change
+            for sub in child.walk():
+                if sub.head in UUID_HEADS:
+                    _add_uuid(sub, edits)
+        else:
+            _collect_edits(child, edits)
+
+
+def _add_xy(node, edits):
+    atoms = [i for i in node.items if isinstance(i, Atom)]
+    if len(atoms) < 2:
+        return
+    x, y = atoms[0], atoms[1]
+    try:
+        x_iu, y_iu = to_iu(x.value), to_iu(y.value)
+    except ValueError:
+        return
+    edits.append((x.start, x.end, "x", x_iu))
+    edits.append((y.start, y.end, "y", y_iu))
+
+
+def _add_uuid(node, edits):
+    atoms = [i for i in node.items if isinstance(i, Atom)]
+    if atoms:
+        a = atoms[0]
+        edits.append((a.start, a.end, "uuid", a.value.startswith('"')))
+
+
+def compile_item(text, node):
+    edits = []
+    _collect_edits(node, edits)
+    edits.sort()
+    return _Template(text, node, edits)
+
+
+def item_layer(node):
+    layer = node.find("layer")
+    if layer is None or not layer.items:
+        return None
+    return unquote(layer.items[0].value)
+
+
+def _stroke_width(node):
+    stroke = node.find("stroke")
+    width = (stroke or node).find("width")
+    if width is not None and width.items:
+        return to_iu(width.items[0].value)
+    return 0
+
+
+def _point(node, head):
+    p = node.find(head)
+    if p is None or len(p.items) < 2:
+        return None
+    return (to_iu(p.items[0].value), to_iu(p.items[1].value))
+
+
+def _arc_extent_points(s, m, e):
+    """
+    Start, end and every axis extreme the arc s -> m -> e passes through.
+    """
+    ax, ay = s
+    bx, by = m
+    cx, cy = e
+    d = 2.0 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if d == 0:
+        return [s, m, e]
+    ux = ((ax * ax + ay * ay) * (by - cy) + (bx * bx + by * by) * (cy - ay) + (cx * cx + cy * cy) * (ay - by)) / d
+    uy = ((ax * ax + ay * ay) * (cx - bx) + (bx * bx + by * by) * (ax - cx) + (cx * cx + cy * cy) * (bx - ax)) / d
+    r = math.hypot(ax - ux, ay - uy)
+
+    a0 = math.atan2(ay - uy, ax - ux)
+    am = (math.atan2(by - uy, bx - ux) - a0) % (2 * math.pi)
+    ae = (math.atan2(cy - uy, cx - ux) - a0) % (2 * math.pi)
+    # Sweep direction is whichever way reaches the midpoint before the end
+    ccw = am < ae
+    sweep = ae if ccw else 2 * math.pi - ae
+
+    pts = [s, e]
+    for k in range(4):
+        rel = ((k * math.pi / 2) - a0) % (2 * math.pi)
+        if not ccw:
+            rel = (2 * math.pi - rel) % (2 * math.pi)
+        if rel <= sweep:
+            a = k * math.pi / 2
+            pts.append((ux + r * math.cos(a), uy + r * math.sin(a)))
+    return pts
+
+
+def shape_points(node):
+    """
+    Points whose bounding box equals the bounding box of a gr_* shape's
+    centre line.
+    """
+    head = node.head
+    if head in ("gr_line", "gr_rect"):
+        return [p for p in (_point(node, "start"), _point(node, "end")) if p]
+    if head == "gr_circle":
+        c, e = _point(node, "center"), _point(node, "end")
+        r = math.hypot(e[0] - c[0], e[1] - c[1])
+        return [(c[0] - r, c[1] - r), (c[0] + r, c[1] + r)]
+    if head == "gr_arc":
+        s, m, e = _point(node, "start"), _point(node, "mid"), _point(node, "end")
+        if m is None:
+            return [p for p in (s, e) if p]
+        return _arc_extent_points(s, m, e)
+    pts = []
+    for sub in node.walk():
+        if sub.head == "xy" and len(sub.items) >= 2:
+            pts.append((to_iu(sub.items[0].value), to_iu(sub.items[1].value)))
+    return pts
+
+
+def edge_cuts_bbox(items):
+    """
+    Bounding box (x, y, w, h) of the Edge.Cuts shapes among `items`, inflated
+    by half the stroke width like PCB_SHAPE::GetBoundingBox().
+    """
+    box = None
+    for node in items:
+        pts = shape_points(node)
+        if not pts:
+            continue
+        half = _stroke_width(node) // 2
+        xs = [p[0] for p in pts]
+        ys = [p[1] for p in pts]
+        b = (int(min(xs)) - half, int(min(ys)) - half, int(math.ceil(max(xs))) + half, int(math.ceil(max(ys))) + half)
+        if box is None:
+            box = b
+        else:
+            box = (min(box[0], b[0]), min(box[1], b[1]), max(box[2], b[2]), max(box[3], b[3]))
+    if box is None:
+        return None
+    return (box[0], box[1], box[2] - box[0], box[3] - box[1])
+
+
+class _Formatter(object):
+    """
+    Writes new graphic items in the dialect of the source file.
+    """
+    def __init__(self, text, indent):
+        self.stroke = "(stroke" in text
+        self.uuid_head = "uuid" if "(uuid" in text else "tstamp"
+        self.indent = indent
+
+    def _id(self):
+        return '({} "{}")'.format(self.uuid_head, uuid.uuid4())
+
+    def line(self, x1, y1, x2, y2, width, layer):
+        if self.stroke:
+            w = "(stroke (width {}) (type solid))".format(fmt_mm(width))
+        else:
+            w = "(width {})".format(fmt_mm(width))
+        return '{}(gr_line (start {} {}) (end {} {}) {} (layer "{}") {})'.format(
+            self.indent, fmt_mm(x1), fmt_mm(y1), fmt_mm(x2), fmt_mm(y2), w, layer, self._id())
+
+    def text(self, label, layer):
+        return '{}(gr_text "{}" (at {} {} {}) (layer "{}") {} (effects (font (size 1 1) (thickness 0.25))))'.format(
+            self.indent, label.text, fmt_mm(label.x), fmt_mm(label.y), "{:g}".format(label.angle), layer, self._id())
+
+
+def panelize_file(src, dst, settings):
+    """
+    Panelizes the .kicad_pcb at `src` into `dst` without pcbnew.
+    Returns the PanelPlan used.
+    """
+    with open(src, "r", encoding="utf-8") as f:
+        text = f.read()
+    root = parse(text)
+    if root.head != "kicad_pcb":
+        raise PanelizerError("{} is not a KiCad board file".format(src))
+
+    items = [i for i in root.items if isinstance(i, Node)]
+    edges = [i for i in items if i.head.startswith("gr_") and item_layer(i) == "Edge.Cuts"]
+    board_rect = edge_cuts_bbox(edges)
+    if board_rect is None:
+        raise PanelizerError("No Edge.Cuts found!", "Error")
+
+    if settings.get("autofit"):
+        settings = fit_settings(board_rect, settings, allow_rotation=False)
+    plan = plan_panel(board_rect, settings)
+    check_plan(plan)
+    if plan.transformed:
+        raise PanelizerError("The sexpr engine only translates cells; use the pcbnew engine "
+                             "for rotated or flipped cells.", "Unsupported")
+    if settings.get("net_mode", "shared") != "shared":
+        raise PanelizerError("The sexpr engine keeps the source nets; use the pcbnew engine "
+                             "for per-cell nets.", "Unsupported")
+    if outline_tabs.wanted(settings, plan):
+        raise PanelizerError("The sexpr engine cannot place tabs along the outline; "
+                             "use the pcbnew engine.", "Unsupported")
+    if fixtures.requested(settings):
+        raise PanelizerError("The sexpr engine cannot place fiducials or tooling holes; "
+                             "use the pcbnew engine.", "Unsupported")
+    if thieving.requested(settings):
+        raise PanelizerError("The sexpr engine cannot add rail thieving; "
+                             "use the pcbnew engine.", "Unsupported")
+    if routing.wanted(plan):
+        raise PanelizerError("The sexpr engine cannot mill tabbed panel outlines "
+                             "(mousebites, routed tabs); "
+                             "use the pcbnew engine.", "Unsupported")
+    # No copper or outline index here: overlaps and the frame only
+    validate.check(plan, settings)
+    drop_edges = plan.method == "V-Cut"
+    dropped = set(id(e) for e in edges) if drop_edges else set()
+
+    replicated = [i for i in items if i.head in REPLICATED and id(i) not in dropped]
+    templates = [compile_item(text, i) for i in replicated]
+
+    # Indentation of the first top-level item, reused for everything we add
+    first = items[0] if items else root
+    line_start = text.rfind("\n", 0, first.start) + 1
+    indent = "\n" + text[line_start:first.start]
+    fmt = _Formatter(text, indent)
+
+    with open(dst, "w", encoding="utf-8") as out:
+        # Header and the source cell, minus any dropped outline
+        pos = root.start
+        for item in items:
+            if id(item) in dropped:
+                out.write(text[pos:item.start].rstrip())
+                pos = item.end
+        out.write(text[pos:root.end - 1].rstrip())
+
+        for cell in plan.copies():
+            dx, dy = int(cell.dx), int(cell.dy)
+            out.write("".join(indent + t.render(dx, dy) for t in templates))
+
+        f = plan.frame
+        corners = [(f.x, f.y), (f.x + f.w, f.y), (f.x + f.w, f.y + f.h), (f.x, f.y + f.h)]
+        for i in range(4):
+            (x1, y1), (x2, y2) = corners[i], corners[(i + 1) % 4]
+            out.write(fmt.line(int(x1), int(y1), int(x2), int(y2), plan.frame_width, "Edge.Cuts"))
+        for cut in plan.cuts:
+            out.write(fmt.line(int(cut.x1), int(cut.y1), int(cut.x2), int(cut.y2), cut.width, "F.Fab"))
+        for label in plan.labels:
+            out.write(fmt.text(label._replace(x=int(label.x), y=int(label.y)), "F.Fab"))
+        out.write("\n)\n")
+
+    return plan
@@ -0,0 +1,168 @@
+"""
+Copper thieving on the panel rails.
+
+The pattern is laid on a regular grid over the inside of the frame. Every
+keep-out (the cell array, V-Cut lines across the rails, the frame stroke,
+fiducials, tooling holes, mousebite holes) is a rectangle, which knocks out a block of
+grid positions with one slice of a NumPy mask, so the cost does not depend
+on how dense the pattern is. What is left becomes plain rectangles:
+
+- "dots":  a square of thieving_size_mm at every free grid node;
+- "hatch": lines of width thieving_size_mm along the grid rows and columns,
+           each row and column merged into runs between keep-outs.
+
+The applier turns the rectangles into one filled polygon (SHAPE_POLY_SET)
+per copper layer, so the number of board items is the number of copper
+layers however fine the pattern.
+
+settings keys:
+    thieving             -- "none" (default), "dots" or "hatch"
+    thieving_pitch_mm    -- grid pitch
+    thieving_size_mm     -- dot size or hatch line width
+    thieving_keepout_mm  -- distance kept from cells, V-Cuts, the frame
+                            and fixtures
+"""
+import copy
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .plan import from_mm, frame_obstacles
+from .fixtures import FIDUCIAL_MASK_MM, FIDUCIAL_KEEPOUT_MM, TOOLING_KEEPOUT_MM
+from . import mousebites
+
+PATTERNS = ("none", "dots", "hatch")
+DEFAULTS_MM = {
+    # pattern: (pitch, size)
+    "dots": (1.5, 0.8),
+    "hatch": (1.2, 0.3),
+}
+KEEPOUT_MM = 1.0
+
+# pattern -- "dots" or "hatch"; rects -- K x 4 array of (x0, y0, x1, y1)
+Thieving = namedtuple("Thieving", "pattern rects")
+
+
+def requested(settings):
+    return settings.get("thieving", "none") in DEFAULTS_MM
+
+
+def keepouts(plan, keepout, holes=None):
+    """
+    Every rectangle the pattern must stay out of, already grown by
+    `keepout`, as an E x 4 array.
+    """
+    # The rails end at the array: the gaps between cells are milled or
+    # scored, so every cell outline is behind the array's bbox
+    a, f = plan.array, plan.frame
+    # Routed slots run around the outer cells, outside the array
+    slot = plan.routing.width if plan.routing is not None else 0
+    out = [(a.x - slot, a.y - slot, a.x + a.w + slot, a.y + a.h + slot)]
+    half = plan.gap / 2.0
+    out.extend((x - half, f.y, x + half, f.y + f.h) for x in plan.cut_x)
+    out.extend((f.x, y - half, f.x + f.w, y + half) for y in plan.cut_y)
+    out.extend(frame_obstacles(plan))
+    box = np.array(out, dtype=np.float64).reshape(-1, 4)
+    box += (-keepout, -keepout, keepout, keepout)
+
+    extra = []
+    for fx in plan.fixtures:
+        if fx.kind == "fiducial":
+            r = max(fx.size, from_mm(FIDUCIAL_MASK_MM)) / 2.0 + from_mm(FIDUCIAL_KEEPOUT_MM)
+        else:
+            r = fx.size / 2.0 + from_mm(TOOLING_KEEPOUT_MM)
+        r = max(r, fx.size / 2.0 + keepout)
+        extra.append((fx.x - r, fx.y - r, fx.x + r, fx.y + r))
+    if holes is not None and len(holes[0]):
+        pos = holes[0].astype(np.float64)
+        r = holes[2].astype(np.float64) / 2.0 + keepout
+        extra.append(np.column_stack((pos[:, 0] - r, pos[:, 1] - r, pos[:, 0] + r, pos[:, 1] + r)))
+    for e in extra:
+        box = np.vstack((box, np.asarray(e, dtype=np.float64).reshape(-1, 4)))
+    return box
+
+
+def _clear(mask, origin, pitch, lo_reach, hi_reach, rects):
+    """
+    Clears mask[j, i] for every element (spanning node - lo_reach to
+    node + hi_reach on both axes, node = origin + index * pitch) that
+    overlaps one of `rects`.
+    """
+    ox, oy = origin
+    ny, nx = mask.shape
+    i0 = np.maximum(np.floor((rects[:, 0] - hi_reach[0] - ox) / pitch).astype(np.int64) + 1, 0)
+    i1 = np.minimum(np.ceil((rects[:, 2] + lo_reach[0] - ox) / pitch).astype(np.int64), nx)
+    j0 = np.maximum(np.floor((rects[:, 1] - hi_reach[1] - oy) / pitch).astype(np.int64) + 1, 0)
+    j1 = np.minimum(np.ceil((rects[:, 3] + lo_reach[1] - oy) / pitch).astype(np.int64), ny)
+    hit = (i0 < i1) & (j0 < j1)
+    for a, b, c, d in zip(j0[hit], j1[hit], i0[hit], i1[hit]):
+        mask[a:b, c:d] = False
+
+
+def _runs(mask):
+    """
+    (row, first, last) of every run of True in each row of `mask`.
+    """
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    d = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(d == 1)
+    _, ends = np.nonzero(d == -1)
+    return rows, starts, ends - 1
+
+
+def pattern_rects(plan, pattern, pitch, size, keepout, holes=None):
+    """
+    The rectangles of `pattern` inside the frame, clear of every keep-out.
+    """
+    f, half = plan.frame, plan.frame_width / 2.0
+    inner = (f.x + half + keepout, f.y + half + keepout, f.x + f.w - half - keepout, f.y + f.h - half - keepout)
+    if inner[2] - inner[0] < size or inner[3] - inner[1] < size or pitch <= 0:
+        return np.zeros((0, 4))
+    r = size / 2.0
+    x0, y0 = inner[0] + r, inner[1] + r
+    nx = int(math.floor((inner[2] - r - x0) / pitch)) + 1
+    ny = int(math.floor((inner[3] - r - y0) / pitch)) + 1
+    xs = x0 + np.arange(nx) * pitch
+    ys = y0 + np.arange(ny) * pitch
+    blocked = keepouts(plan, keepout, holes)
+
+    if pattern == "dots":
+        mask = np.ones((ny, nx), dtype=bool)
+        _clear(mask, (x0, y0), pitch, (r, r), (r, r), blocked)
+        j, i = np.nonzero(mask)
+        return np.column_stack((xs[i] - r, ys[j] - r, xs[i] + r, ys[j] + r))
+
+    # Hatch: the line piece from node i to node i + 1, per row and column
+    out = []
+    if nx > 1:
+        row = np.ones((ny, nx - 1), dtype=bool)
+        _clear(row, (x0, y0), pitch, (r, r), (pitch + r, r), blocked)
+        j, a, b = _runs(row)
+        out.append(np.column_stack((xs[a] - r, ys[j] - r, xs[b + 1] + r, ys[j] + r)))
+    if ny > 1:
+        col = np.ones((nx, ny - 1), dtype=bool)
+        _clear(col, (y0, x0), pitch, (r, r), (pitch + r, r), blocked[:, [1, 0, 3, 2]])
+        i, a, b = _runs(col)
+        out.append(np.column_stack((xs[i] - r, ys[a] - r, xs[i] + r, ys[b + 1] + r)))
+    return np.concatenate(out) if out else np.zeros((0, 4))
+
+
+def place(plan, settings):
+    """
+    `plan` with its Thieving set, or `plan` itself when none is wanted. Call
+    it on the placed plan, so the pattern keeps clear of the final tabs and
+    fixtures. The cached plan is not modified.
+    """
+    if not requested(settings):
+        return plan
+    pattern = settings["thieving"]
+    pitch_mm, size_mm = DEFAULTS_MM[pattern]
+    pitch = from_mm(settings.get("thieving_pitch_mm", pitch_mm))
+    size = from_mm(settings.get("thieving_size_mm", size_mm))
+    keepout = from_mm(settings.get("thieving_keepout_mm", KEEPOUT_MM))
+    placed = copy.copy(plan)
+    holes = mousebites.plan_holes(plan)
+    placed.thieving = Thieving(pattern, pattern_rects(plan, pattern, pitch, size, keepout, holes))
+    return placed
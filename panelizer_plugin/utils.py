@@ -1,5 +1,6 @@
 import pcbnew
-import math
+from . import outline
+from .snapshot import BoardSnapshot
 
 # Constants
 TOLERANCE = 100 # nm
@@ -8,6 +9,8 @@ def get_board_bbox(board):
     """
     Returns the bounding box of the board's Edge.Cuts outline.
     """
+    if isinstance(board, BoardSnapshot):
+        return board.bbox
     bbox = None
     for drawing in board.Drawings():
         if drawing.GetLayer() == pcbnew.Edge_Cuts:
@@ -23,11 +26,14 @@ def get_board_size_mm(board):
         return None
     return (pcbnew.ToMM(bbox.GetWidth()), pcbnew.ToMM(bbox.GetHeight()))
 
-def add_rect_edge_cuts(board, x, y, w, h, width=None):
+def add_rect_edge_cuts(board, x, y, w, h, width=None, add=None):
     """
-    Draws a rectangle on Edge.Cuts using 4 line segments.
+    Draws a rectangle on Edge.Cuts using 4 line segments and returns them.
+    `add` defaults to board.Add; pass a commit's Add to batch the change.
     """
     layer = pcbnew.Edge_Cuts
+    add = add or board.Add
+    segs = []
     if width is None:
         width = pcbnew.FromMM(0.1)
         
@@ -44,259 +50,90 @@ def add_rect_edge_cuts(board, x, y, w, h, width=None):
         seg.SetEnd(pcbnew.VECTOR2I(int(corners[(i + 1) % 4][0]), int(corners[(i + 1) % 4][1])))
         seg.SetLayer(layer)
         seg.SetWidth(int(width))
-        board.Add(seg)
+        add(seg)
+        segs.append(seg)
+    return segs
 
 # --- Geometric Operations with SHAPE_POLY_SET ---
 
-def extract_outline_polygon(board, tolerance_mm=0.01):
+def _xy(vec):
+    return (vec.x, vec.y)
+
+
+def edge_primitives(edges):
     """
-    Extracts the Edge.Cuts outline as a single SHAPE_POLY_SET.
-    Approximates Arcs/Circles with segments.
+    Converts Edge.Cuts PCB_SHAPEs into outline.py primitives.
     """
-    poly = pcbnew.SHAPE_POLY_SET()
-    
-    # We essentially want to boolean union all Edge.Cuts items to form the outline?
-    # Or assuming they form a chain.
-    # To be robust against disconnects, let's treat each item as a "Thick Segment" 
-    # and Union them? No, that gives a fat outline.
-    # We want the Enclosed Area.
-    
-    # 1. Chain Logic (Hard).
-    # 2. "Guess" Logic:
-    # Most board outlines are close loops.
-    # Let's use `SHAPE_POLY_SET`'s ability to add paths.
-    
-    # KiCad requires a "Closed Loop" for a valid outline.
-    # Let's try to convert each graphic item into a Chain.
-    # Actually, simpler: KiCad's Board usually has `GetBoardPolygonOutlines`?
-    # In KiCad 9, `board.GetBoardPolygonOutlines(layer, tolerance, outline)`? No.
-    # `board.GetShape()`?
-    
-    # Let's manually convert items to a polygon.
-    # Strategy:
-    # 1. Collect all Edge.Cut shapes.
-    # 2. Convert to linear paths (discretize arcs).
-    # 3. Use `pcbnew.Chain()` or manual chaining.
-    # 4. Construct Poly.
-    
-    # Simplified: Assuming the user has a closed outline.
-    # We iterate and find connections.
-    
-    # BUT, to skip complexity:
-    # Can we just Clone the items, Inflate them individually, and Union?
-    # A Line Inflated is a Capsule. 
-    # A Box Inflated is a Rounded Box.
-    # If we Union all these "Inflated Traces", we get a "Route Path" shape?
-    # No, that gives the wall, not the room.
-    
-    # User said: "If circle... draw concentric circle...".
-    # This implies we are operating on the Closed Shape.
-    
-    # Let's try to find a `SHAPE_POLY_SET` from board.
-    # `board.ConvertBBoxToPoly()`? No.
-    
-    # Let's assume standard behavior:
-    # Gather all segments/arcs.
-    # Find the Loop.
-    # Convert Loop to Poly.
-    # (Implementation detail omitted for brevity, using simple Box fallback if fail? No, user explicitly wants Circle support).
-    
-    # Let's implement robust chaining.
-    
-    edges = []
-    for d in board.Drawings():
-        if d.GetLayer() == pcbnew.Edge_Cuts:
-            edges.append(d)
-            
-    if not edges:
-        return None
-        
-    # Build Map of Endpoints
-    # Point -> [Items]
-    # ...
-    
-    # ALTERNATIVE: Use `SHAPE_POLY_SET`.
-    # Add each segment as a "Hole"? No.
-    # Add each segment as a path.
-    
-    # Let's try a simpler approach if the API supports it.
-    # `board.GetBoardEdges()` returns a chain?
-    
-    # Let's do the standard Chain Sort.
-    # Or...
-    # Just iterate and render all into a generic SHAPE_POLY_SET?
-    # SHAPE_POLY_SET needs closed outlines.
-    
-    # I will implement a "Chain Builder".
-    pass
+    prims = []
+    for e in edges:
+        shape = e.GetShape()
+        if shape == pcbnew.S_SEGMENT:
+            prims.append(outline.Segment(_xy(e.GetStart()), _xy(e.GetEnd())))
+        elif shape == pcbnew.S_ARC:
+            prims.append(outline.Arc(_xy(e.GetStart()), _xy(e.GetArcMid()), _xy(e.GetEnd())))
+        elif shape == pcbnew.S_CIRCLE:
+            prims.append(outline.Circle(_xy(e.GetCenter()), e.GetRadius()))
+        elif shape == pcbnew.S_RECT:
+            prims.append(outline.RectShape(_xy(e.GetStart()), _xy(e.GetEnd())))
+        elif shape == pcbnew.S_POLY:
+            poly = e.GetPolyShape()
+            for i in range(poly.OutlineCount()):
+                chain = poly.Outline(i)
+                prims.append(outline.Polygon([_xy(chain.CPoint(j)) for j in range(chain.PointCount())]))
+        elif shape == getattr(pcbnew, "S_BEZIER", getattr(pcbnew, "S_CURVE", None)):
+            prims.append(outline.Bezier(_xy(e.GetStart()), _xy(e.GetBezierC1()), _xy(e.GetBezierC2()), _xy(e.GetEnd())))
+    return prims
 
-    # For this iteration, let's implement a simple chain builder.
-    # If it fails, fallback to BBox.
-    
-    chain = []
-    # (Start, End, Object)
-    
-    # Helper to get start/end
-    def get_se(item):
-        if item.GetShape() == pcbnew.S_SEGMENT:
-            return (item.GetStart(), item.GetEnd())
-        elif item.GetShape() == pcbnew.S_ARC:
-            return (item.GetStart(), item.GetEnd()) # Start and End of Arc
-        elif item.GetShape() == pcbnew.S_CIRCLE:
-            return (None, None) # Special
-        elif item.GetShape() == pcbnew.S_RECT:
-             # Convert to 4 lines
-             return (None, None)
-        return (None, None)
-        
-    # Check for Circle/Rect primitive First
-    for item in edges:
-        if item.GetShape() == pcbnew.S_CIRCLE:
-            # It's a circle board.
-            poly.NewOutline()
-            # Discretize Circle
-            center = item.GetCenter()
-            radius = item.GetRadius()
-            steps = 72
-            for i in range(steps):
-                angle = 2 * math.pi * i / steps
-                px = center.x + radius * math.cos(angle)
-                py = center.y + radius * math.sin(angle)
-                poly.Append(int(px), int(py))
-            return poly
-            
-        if item.GetShape() == pcbnew.S_RECT:
-            poly.NewOutline()
-            r = item.GetBoundingBox() # Rect is aligned
-            poly.Append(r.GetLeft(), r.GetTop())
-            poly.Append(r.GetRight(), r.GetTop())
-            poly.Append(r.GetRight(), r.GetBottom())
-            poly.Append(r.GetLeft(), r.GetBottom())
-            return poly
 
-    # Chain Segments/Arcs
-    # Start with first item
-    used = set()
-    
-    # Find a start point (any)
-    # Simple recursive finder
-    
-    # Let's just dump all points into Poly and Convex Hull? No, Convex Hull kills concave boards.
-    
-    # Let's assume standard "One Loop".
-    # Pick first, find neighbor...
-    
-    # Note: Implementing a full topology solver in 1 step is risky.
-    # Most users use Lines/Arcs.
-    
-    # Let's create `ChainBuilder`.
-    
-    return None # Placeholder for now, will implement inside loop below if needed
+def extract_outline(board, tolerance_mm=0.01, max_error_mm=0.005):
+    """
+    Chains the board's Edge.Cuts into an outline.Outline (every closed loop,
+    cutouts attached to the outline that contains them).
+    `tolerance_mm` is how far apart two endpoints may be and still join;
+    `max_error_mm` is the maximum chord error when discretizing curves.
+    `board` may also be a BoardSnapshot, which already has Edge.Cuts indexed.
+    """
+    if isinstance(board, BoardSnapshot):
+        edges = board.edge_cuts
+    else:
+        edges = [d for d in board.Drawings() if d.GetLayer() == pcbnew.Edge_Cuts]
+    return outline.extract_loops(
+        edge_primitives(edges),
+        tolerance=pcbnew.FromMM(tolerance_mm),
+        max_error=pcbnew.FromMM(max_error_mm),
+    )
 
-def extract_poly(board):
+
+def outline_to_poly_set(result):
+    """
+    Builds a SHAPE_POLY_SET from an outline.Outline.
+    """
     poly = pcbnew.SHAPE_POLY_SET()
-    
-    # heuristic: Circle or Rect first
-    edges = [d for d in board.Drawings() if d.GetLayer() == pcbnew.Edge_Cuts]
-    if not edges: return poly
-    
-    # Check for single Circle
-    circles = [e for e in edges if e.GetShape() == pcbnew.S_CIRCLE]
-    if circles:
-        c = circles[0]
-        # Discretize
-        poly.NewOutline()
-        center = c.GetCenter()
-        radius = c.GetRadius()
-        segs = 64
-        for i in range(segs):
-             a = 2*math.pi*i/segs
-             poly.Append(int(center.x + radius*math.cos(a)), int(center.y + radius*math.sin(a)))
-        return poly
-        
-    # Check Loop
-    # Sort edges to chain?
-    # KiCad `SHAPE_POLY_SET` might be able to ingest a list of points if we sort them.
-    
-    # WORKAROUND: Expand Bounding Box for now if complex?
-    # User said "If Circle... If Square...".
-    # Let's support Circle (handled) and Square (Rectangle).
-    # If built from segments, we need to chain.
-    
-    # Simple Chainer
-    # endpoints dictionary: point -> list of edges
-    map_pt = {}
-    
-    def add_map(pt, edge_idx):
-        key = (pt.x, pt.y)
-        if key not in map_pt: map_pt[key] = []
-        map_pt[key].append(edge_idx)
+    for loop in result:
+        idx = poly.NewOutline()
+        for x, y in loop.outline:
+            poly.Append(int(round(x)), int(round(y)), idx)
+        for hole in loop.holes:
+            h = poly.NewHole(idx)
+            for x, y in hole:
+                poly.Append(int(round(x)), int(round(y)), idx, h)
+    return poly
 
-    for i, e in enumerate(edges):
-        if e.GetShape() == pcbnew.S_SEGMENT:
-            add_map(e.GetStart(), i)
-            add_map(e.GetEnd(), i)
-        elif e.GetShape() == pcbnew.S_ARC:
-            add_map(e.GetStart(), i)
-            add_map(e.GetEnd(), i)
 
-    # Walk
-    current_idx = 0
-    used = {0}
-    
-    # Start at edges[0].Start
-    if edges[0].GetShape() == pcbnew.S_ARC:
-        curr_pt = edges[0].GetStart() # Arcs are CCW?
-        # Arcs in KiCad: Start, End, Center.
-        # We need to walk edges[0] to its end.
-        end_pt = edges[0].GetEnd()
-    else:
-        curr_pt = edges[0].GetStart()
-        end_pt = edges[0].GetEnd()
-        
-    poly.NewOutline()
-    poly.Append(curr_pt.x, curr_pt.y)
-    
-    # Add intermediate points for Arc
-    if edges[0].GetShape() == pcbnew.S_ARC:
-        # Discretize Arc 0
-        pass # Todo simplified
-        
-    poly.Append(end_pt.x, end_pt.y)
-    curr_pt = end_pt
-    
-    # Look for neighbor
-    found = True
-    while found:
-        found = False
-        key = (curr_pt.x, curr_pt.y)
-        candidates = map_pt.get(key, [])
-        for idx in candidates:
-            if idx not in used:
-                used.add(idx)
-                # Determine direction
-                e = edges[idx]
-                s = e.GetStart()
-                en = e.GetEnd()
-                
-                next_p = None
-                # Check which end matches curr_pt
-                dist_s = math.hypot(s.x-curr_pt.x, s.y-curr_pt.y)
-                dist_en = math.hypot(en.x-curr_pt.x, en.y-curr_pt.y)
-                
-                if dist_s < 100: # Match Start
-                    next_p = en
-                elif dist_en < 100: # Match End
-                    next_p = s
-                
-                if next_p:
-                    # Append points (handle arcs?)
-                    poly.Append(next_p.x, next_p.y)
-                    curr_pt = next_p
-                    found = True
-                    break
-                    
-    return poly
+def extract_outline_polygon(board, tolerance_mm=0.01):
+    """
+    Extracts the Edge.Cuts outline as a SHAPE_POLY_SET, one outline per board
+    loop with its cutouts as holes. Returns None if there is no closed loop.
+    """
+    result = extract_outline(board, tolerance_mm)
+    if not result:
+        return None
+    return outline_to_poly_set(result)
+
+
+def extract_poly(board):
+    return extract_outline_polygon(board) or pcbnew.SHAPE_POLY_SET()
+
 
 def render_poly(board, poly, layer):
     # Iterate polygons in set
@@ -0,0 +1,240 @@
+"""
+Validation of a placed PanelPlan, before anything is added to the board.
+
+check_plan() only knows whether the array fits the panel. validate() looks
+for the problems that otherwise surface after a full replicate-and-DRC
+cycle:
+
+- cells that overlap each other (hand-written or stale "blocks"),
+- V-Cut lines within a keep-out of copper or component courtyards,
+- frame strokes that clip a board outline,
+- mousebite tabs on a part of the board edge that is not straight,
+- milled panels (mousebites, routed tabs) with no board side that has room
+  for a tab to the rails, whose slots would cut the array off the frame.
+
+Cell rectangles are tested as NumPy arrays, copper through a
+spatial.PanelIndex and outlines as polygons, so a large panel validates in
+milliseconds. Checks that need the source board (copper, outline) are
+skipped when it is not given.
+
+settings keys:
+    validate         -- False to skip validation (default True)
+    vcut_keepout_mm  -- copper keep-out on either side of a V-Cut line
+"""
+import numpy as np
+
+from .plan import PanelizerError, frame_obstacles, frame_sides, from_mm, to_mm
+from .spatial import PanelIndex, invert_matrix, polygon_hits_rect
+from . import mousebites
+from .routing import slot_width
+
+VCUT_KEEPOUT_MM = 0.5
+MAX_REPORTED = 10
+EDGE_TOLERANCE = 1000        # nm, how far an outline edge may sit off the bbox side
+EDGE_SAMPLES = 9             # points tested along each tab's span
+
+
+def _name(cell):
+    return "r{}c{}".format(cell.row + 1, cell.col + 1)
+
+
+def _cell_rects(plan):
+    rects = [plan.cell_rect(c) for c in plan.cells]
+    return np.array([(r.x, r.y, r.x + r.w, r.y + r.h) for r in rects], dtype=np.float64).reshape(-1, 4)
+
+
+def overlapping_cells(plan):
+    """
+    Pairs of cells whose rectangles overlap (touching is fine). Cells are
+    swept by left edge, so each one is only compared with the cells that
+    start before it ends.
+    """
+    rects = _cell_rects(plan)
+    order = np.argsort(rects[:, 0], kind="stable")
+    r = rects[order]
+    ends = np.searchsorted(r[:, 0], r[:, 2], side="left")
+    pairs = []
+    for i in range(len(r)):
+        j = np.arange(i + 1, ends[i])
+        if not len(j):
+            continue
+        o = r[j]
+        hit = (o[:, 0] < r[i, 2]) & (r[i, 0] < o[:, 2]) & (o[:, 1] < r[i, 3]) & (r[i, 1] < o[:, 3])
+        for k in j[hit]:
+            pairs.append((plan.cells[order[i]], plan.cells[order[k]]))
+    return pairs
+
+
+def cut_rects(plan):
+    """
+    (axis, position, rect) for every V-Cut line across the whole frame, the
+    line's drawn width included.
+    """
+    f, half = plan.frame, plan.gap / 2.0
+    out = [("x", x, (x - half, f.y, x + half, f.y + f.h)) for x in plan.cut_x]
+    out.extend(("y", y, (f.x, y - half, f.x + f.w, y + half)) for y in plan.cut_y)
+    return out
+
+
+def vcut_problems(plan, index, keepout):
+    problems = []
+    for axis, pos, rect in cut_rects(plan):
+        cells = index.hits_cells(rect, keepout, parts=True, zones=False)
+        if cells:
+            problems.append("V-Cut at {} = {:.2f} mm passes within {:g} mm of copper or a courtyard in {}".format(
+                axis, to_mm(pos), to_mm(keepout), ", ".join(_name(c) for c in cells)))
+    return problems
+
+
+def _transformed(points, matrix):
+    a, b, c, d, e, f = matrix
+    return np.column_stack((a * points[:, 0] + b * points[:, 1] + e, c * points[:, 0] + d * points[:, 1] + f))
+
+
+def frame_clips(plan, outlines=None):
+    """
+    Cells whose outline (or, without `outlines`, whose bbox) is touched by
+    a frame stroke. `outlines` are the source outline rings (N x 2 arrays).
+    """
+    rects = _cell_rects(plan)
+    clipped = []
+    for x0, y0, x1, y1 in frame_obstacles(plan):
+        hit = (rects[:, 0] < x1) & (x0 < rects[:, 2]) & (rects[:, 1] < y1) & (y0 < rects[:, 3])
+        for i in np.flatnonzero(hit):
+            cell = plan.cells[i]
+            if cell in clipped:
+                continue
+            if outlines is None or any(polygon_hits_rect(_transformed(ring, plan.matrix(cell)), (x0, y0, x1, y1))
+                                       for ring in outlines):
+                clipped.append(cell)
+    return clipped
+
+
+def _straight_edges(outlines):
+    """
+    Axis-aligned outline edges as (horizontal, vertical) arrays of
+    (position, start, end) rows.
+    """
+    h, v = [], []
+    for ring in outlines:
+        a = ring
+        b = np.roll(ring, -1, axis=0)
+        flat = np.abs(a[:, 1] - b[:, 1]) <= 1
+        h.append(np.column_stack((a[flat, 1], np.minimum(a[flat, 0], b[flat, 0]), np.maximum(a[flat, 0], b[flat, 0]))))
+        upright = np.abs(a[:, 0] - b[:, 0]) <= 1
+        v.append(np.column_stack((a[upright, 0], np.minimum(a[upright, 1], b[upright, 1]),
+                                  np.maximum(a[upright, 1], b[upright, 1]))))
+    empty = np.zeros((0, 3))
+    return (np.concatenate(h) if h else empty), (np.concatenate(v) if v else empty)
+
+
+def _covered(edges, pos, lo, hi):
+    """
+    True if every sample of [lo, hi] on the line at `pos` lies on one of
+    `edges` (position, start, end).
+    """
+    on_line = edges[np.abs(edges[:, 0] - pos) <= EDGE_TOLERANCE]
+    if not len(on_line):
+        return False
+    t = np.linspace(lo, hi, EDGE_SAMPLES)[:, None]
+    inside = (on_line[:, 1] - EDGE_TOLERANCE <= t) & (t <= on_line[:, 2] + EDGE_TOLERANCE)
+    return bool(inside.any(axis=1).all())
+
+
+def crooked_tabs(plan, outlines):
+    """
+    (x, y, cell) for every tab whose span along a cell side is not covered
+    by a straight outline edge of that cell, e.g. a tab on a rounded
+    corner or an arc.
+    """
+    if not plan.tabs:
+        return []
+    hx, _ = mousebites.tab_extent(mousebites.load_template(plan.gap))
+    h_edges, v_edges = _straight_edges(outlines)
+    half = plan.gap / 2.0
+    cells = list(plan.cells)
+    rects = _cell_rects(plan)
+    inverse = [invert_matrix(plan.matrix(c)) for c in cells]
+    # The board bbox includes the Edge.Cuts stroke; the outline itself sits
+    # half a stroke inside it
+    b = plan.board
+    points = np.concatenate(outlines)
+    (ox0, oy0), (ox1, oy1) = points.min(axis=0), points.max(axis=0)
+
+    found = []
+    for edge in plan.tabs:
+        horizontal = edge.angle == 0.0
+        for x, y in edge.points:
+            # The tab's span on each of the two cell sides it joins
+            if horizontal:
+                sides = [((x - hx, y - half), (x + hx, y - half)), ((x - hx, y + half), (x + hx, y + half))]
+                near = np.flatnonzero((np.abs(rects[:, 3] - (y - half)) <= 1) | (np.abs(rects[:, 1] - (y + half)) <= 1))
+                near = near[(rects[near, 0] < x + hx) & (x - hx < rects[near, 2])]
+            else:
+                sides = [((x - half, y - hx), (x - half, y + hx)), ((x + half, y - hx), (x + half, y + hx))]
+                near = np.flatnonzero((np.abs(rects[:, 2] - (x - half)) <= 1) | (np.abs(rects[:, 0] - (x + half)) <= 1))
+                near = near[(rects[near, 1] < y + hx) & (y - hx < rects[near, 3])]
+            for i in near:
+                r = rects[i]
+                if horizontal:
+                    span = sides[0] if abs(r[3] - (y - half)) <= 1 else sides[1]
+                else:
+                    span = sides[0] if abs(r[2] - (x - half)) <= 1 else sides[1]
+                (sx0, sy0), (sx1, sy1) = _transformed(np.array(span, dtype=np.float64), inverse[i])
+                if abs(sy0 - sy1) <= 1:
+                    pos = oy0 if abs(sy0 - b.y) < abs(sy0 - (b.y + b.h)) else oy1
+                    ok = _covered(h_edges, pos, min(sx0, sx1), max(sx0, sx1))
+                else:
+                    pos = ox0 if abs(sx0 - b.x) < abs(sx0 - (b.x + b.w)) else ox1
+                    ok = _covered(v_edges, pos, min(sy0, sy1), max(sy0, sy1))
+                if not ok:
+                    found.append((x, y, cells[i]))
+    return found
+
+
+def validate(plan, settings, copper=None, outline=None):
+    """
+    Problems of a placed `plan` as report lines. `copper` is a
+    spatial.CopperIndex of the source board (or a callable returning one)
+    and `outline` its outline.Outline; either may be None to skip the
+    checks that need it.
+    """
+    problems = ["Cells {} and {} overlap".format(_name(a), _name(b)) for a, b in overlapping_cells(plan)]
+
+    if plan.cuts and copper is not None:
+        if callable(copper):
+            copper = copper()
+        keepout = from_mm(settings.get("vcut_keepout_mm", VCUT_KEEPOUT_MM))
+        problems.extend(vcut_problems(plan, PanelIndex(plan, copper), keepout))
+
+    outlines = [loop.outline for loop in outline] if outline else None
+    problems.extend("Frame clips the outline of cell {}".format(_name(c)) for c in frame_clips(plan, outlines))
+
+    slot = slot_width(settings)
+    if slot and not frame_sides(plan, slot=slot):
+        problems.append("No board has room for a tab to the rails: the {:g} mm milled slot would cut the array "
+                        "off the frame. Leave {:.2f} mm between the boards and the panel edge.".format(
+                            to_mm(slot), to_mm(slot + plan.frame_width / 2.0)))
+
+    if outlines:
+        problems.extend("Mousebite tab at ({:.2f}, {:.2f}) mm is not on a straight edge of cell {}".format(
+            to_mm(x), to_mm(y), _name(c)) for x, y, c in crooked_tabs(plan, outlines))
+    return problems
+
+
+def check(plan, settings, copper=None, outline=None):
+    """
+    Raises PanelizerError listing the problems validate() finds, unless
+    settings["validate"] is False.
+    """
+    if not settings.get("validate", True):
+        return
+    problems = validate(plan, settings, copper, outline)
+    if not problems:
+        return
+    shown = problems[:MAX_REPORTED]
+    if len(problems) > MAX_REPORTED:
+        shown.append("... and {} more".format(len(problems) - MAX_REPORTED))
+    raise PanelizerError("The panel would have these problems:\n\n" + "\n".join(shown) +
+                         "\n\nFix the layout, or untick \"Validate before building\" (\"validate\": false in "
+                         "the recipe) to build it anyway.", "Panel Validation")
@@ -0,0 +1,116 @@
+"""
+Fill-once zone replication.
+
+Refilling a panel makes KiCad's zone filler redo the identical source fill
+for every cell copy. In "replicate" mode the source zones are filled once,
+before replication; Duplicate() carries the filled polygons along and Move()
+translates them, so copies only have to be marked as filled.
+
+A copy's fill is only valid if its surroundings match what the source saw
+when it was filled. stale_cells() reports the cells where something new
+(the panel frame, a neighbouring cell closer than the zone clearance) lands
+within reach of a zone, and only those zones are refilled.
+"""
+import pcbnew
+from .plan import facing_pairs, frame_obstacles, transform_rect
+
+ZONE_FILL_MODES = ("refill", "replicate")
+
+
+def _rect_hits(a, b):
+    """
+    Overlap test for (x0, y0, x1, y1) rectangles.
+    """
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def stale_cells(plan, zone_rect, clearance):
+    """
+    Cells (row, col) whose copy of a zone with bounding box `zone_rect`
+    (x0, y0, x1, y1, in source coordinates) has new obstacles within
+    `clearance`, and therefore cannot reuse the source fill. The source cell
+    is included: it was filled before the frame existed.
+    """
+    obstacles = frame_obstacles(plan)
+
+    # Neighbouring cells only matter when the gap is narrower than the
+    # clearance; otherwise the source outline already kept the fill away.
+    neighbours = {}
+    if plan.gap < clearance:
+        for cell, other, _, _, _ in facing_pairs(plan):
+            neighbours.setdefault(cell, []).append(other)
+            neighbours.setdefault(other, []).append(cell)
+
+    stale = []
+    for cell in plan.cells:
+        z = transform_rect(plan.matrix(cell), zone_rect)
+        reach = (z[0] - clearance, z[1] - clearance, z[2] + clearance, z[3] + clearance)
+        if any(_rect_hits(reach, o) for o in obstacles):
+            stale.append((cell.row, cell.col))
+            continue
+        for other in neighbours.get(cell, ()):
+            n = plan.cell_rect(other)
+            if _rect_hits(reach, (n.x, n.y, n.x + n.w, n.y + n.h)):
+                stale.append((cell.row, cell.col))
+                break
+    return stale
+
+
+def zone_clearance(board, zone):
+    """
+    Distance at which other objects still shape the zone's fill.
+    """
+    clearance = 0
+    try:
+        local = zone.GetLocalClearance()
+        clearance = max(clearance, int(local or 0))
+    except (AttributeError, TypeError):
+        pass
+    try:
+        clearance = max(clearance, board.GetDesignSettings().m_CopperEdgeClearance)
+    except AttributeError:
+        pass
+    return clearance
+
+
+def zone_name(zone):
+    try:
+        name = zone.GetZoneName()
+    except AttributeError:
+        name = ""
+    return name or zone.GetNetname() or "<no net>"
+
+
+def fill_zones(board, zones):
+    if zones:
+        pcbnew.ZONE_FILLER(board).Fill(list(zones))
+
+
+def mark_filled(zones):
+    for z in zones:
+        z.SetIsFilled(True)
+        z.SetNeedRefill(False)
+
+
+def refill_stale(board, plan, source_zones, copies):
+    """
+    Refills the zones whose surroundings differ from the source's.
+    `copies` maps (row, col) -> that cell's zone copies, in the same order as
+    `source_zones`; the source cell (plan.source) maps to `source_zones`
+    itself.
+    Returns a list of human-readable report lines, one per refilled zone.
+    """
+    to_fill = []
+    report = []
+    for i, zone in enumerate(source_zones):
+        box = zone.GetBoundingBox()
+        rect = (box.GetLeft(), box.GetTop(), box.GetRight(), box.GetBottom())
+        for row, col in stale_cells(plan, rect, zone_clearance(board, zone)):
+            cell_zones = copies.get((row, col))
+            if not cell_zones:
+                continue
+            to_fill.append(cell_zones[i])
+            report.append("Zone '{}' in cell r{}c{} refilled: frame or neighbouring cell within clearance".format(
+                zone_name(zone), row + 1, col + 1))
+    fill_zones(board, to_fill)
+    return report